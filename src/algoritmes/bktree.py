@@ -0,0 +1,215 @@
+"""
+BK-tree (Burkhard-Keller tree) over the developer names and the tag names, for the fuzzy lookups of these names.
+
+Every child of a node is stored under its Levenshtein distance to the node. Because of the triangle inequality,
+a search for the names within distance d of a query only has to visit the children with an edge between
+(distance to the node - d) and (distance to the node + d), instead of every name.
+"""
+import threading
+
+import src.database.models as models
+from src.algoritmes.cache import fuzzy_cache
+from src.algoritmes.fuzzy import levenshtein_distance, similarity_score, token_set, token_jaccard_similarity
+from src.database.events import table_version
+
+NEAREST_SEEDS = 5  # The amount of names with words in common with the target that give a first bound for the nearest search
+
+
+class BKTree:
+    """BK-tree over the (lowercase) names of the items, with the Levenshtein distance as metric."""
+
+    def __init__(self, items, key, version=None):
+        """
+        :param items: The items to search through, for example the rows of a query. Items without a name are skipped.
+        :param key: The attribute of the item with the name.
+        :param version: The version of the table the names are from, see table_version().
+        """
+        self.version = version
+        self.items = [item for item in items if getattr(item, key)]
+        self.key = key
+        self.root = None  # Node: [lowercase name, indexes of the items with this name, {distance: child node}]
+        self.tokens = []  # The set of words of every item, see token_set(), for the Jaccard similarity
+        self.words = {}  # word -> indexes of the items with that word in their name
+
+        for i, item in enumerate(self.items):
+            name = getattr(item, key).lower()
+            self.tokens.append(token_set(name))
+            for word in self.tokens[i]:
+                self.words.setdefault(word, []).append(i)
+            self._add(name, i)
+
+    def _add(self, name, i):
+        if self.root is None:
+            self.root = [name, [i], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = levenshtein_distance(name, node[0])
+            if distance == 0:
+                node[1].append(i)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [name, [i], {}]
+                return
+            node = child
+
+    def search(self, query, max_distance):
+        """Find the items with a name within the Levenshtein distance of the query. (Case insensitive)
+
+        :param query: The searched name.
+        :param max_distance: The maximum distance.
+        :return: List of (distance, index of the item in self.items).
+        """
+        query = query.lower()
+        found = []
+        stack = [self.root] if self.root else []
+
+        while stack:
+            name, indexes, children = stack.pop()
+            # Further than max_distance + the longest edge, then no child can be within max_distance
+            cutoff = max_distance + max(children, default=0)
+            distance = levenshtein_distance(query, name, cutoff)
+            if distance <= max_distance:
+                found.extend((distance, i) for i in indexes)
+            if distance <= cutoff:
+                stack.extend(child for edge, child in children.items() if distance - max_distance <= edge <= distance + max_distance)
+
+        return found
+
+    def nearest_distance(self, query, upper_bound=None):
+        """Find the smallest Levenshtein distance between the query and a name in the tree.
+
+        :param query: The searched name.
+        :param upper_bound: Optional distance of a name that is known to be in the tree, to skip more of the tree.
+        :return: The smallest distance, or None when the tree is empty.
+        """
+        query = query.lower()
+        best = upper_bound
+        stack = [self.root] if self.root else []
+
+        while stack:
+            name, _, children = stack.pop()
+            cutoff = None if best is None else best + max(children, default=0)
+            distance = levenshtein_distance(query, name, cutoff)
+            if best is None or distance < best:
+                best = distance
+            stack.extend(child for edge, child in children.items() if distance - best <= edge <= distance + best)
+
+        return best
+
+    def most_similar(self, target_name):
+        """Find the most similar item, with the same result as _most_similar(target_name, self.items, self.key).
+
+        The score of an item is the highest of the Levenshtein similarity and the Jaccard similarity.
+        Only items that share a word with the target have a Jaccard similarity. For the Levenshtein similarity only
+        the names within the distance that can still reach the best score found so far are searched in the tree.
+
+        :param target_name: The string name to compare.
+        :return: (item, score) The most similar item and its similarity score, or (None, None).
+        """
+        target_name = target_name.strip().lower()
+        if self.root is None:
+            return None, None
+
+        target_tokens = token_set(target_name)
+        word_candidates = {i for word in target_tokens for i in self.words.get(word, ())}
+        jaccard_scores = {i: token_jaccard_similarity(target_tokens, self.tokens[i]) for i in word_candidates}
+        best_score = max(jaccard_scores.values(), default=0)
+
+        # The names with the most words in common are usually also close in distance, which limits the nearest search
+        closest_words = sorted(jaccard_scores, key=jaccard_scores.get, reverse=True)[:NEAREST_SEEDS]
+        upper_bound = min(
+            (levenshtein_distance(target_name, getattr(self.items[i], self.key).lower()) for i in closest_words), default=None
+        )
+        nearest = self.nearest_distance(target_name, upper_bound)
+        if nearest < len(target_name):
+            # The real similarity of the nearest name is at least this, its length can only be longer
+            best_score = max(best_score, (1 - nearest / len(target_name)) * 100)
+
+        if best_score > 0:
+            # similarity_score >= best_score needs a distance <= t * max(len(target), len(name)), with t = 1 - best_score / 100.
+            # A name longer than the target has a distance of at least the difference in length,
+            # so the distance is at most t * len(target) / (1 - t).
+            remaining = 1 - best_score / 100
+            max_distance = int(remaining * len(target_name) / (1 - remaining) + 1e-9)
+            candidates = {i for i, score in jaccard_scores.items() if score >= best_score}
+            candidates.update(i for _, i in self.search(target_name, max_distance))
+        else:
+            candidates = range(len(self.items))
+
+        best_index, highest_similarity = None, 0
+        for i in sorted(candidates):
+            similarity = self._score(target_name, target_tokens, i)
+            if similarity > highest_similarity:
+                best_index, highest_similarity = i, similarity
+
+        if best_index is None:
+            return None, None
+        return self.items[best_index], round(highest_similarity, 2)
+
+    def _score(self, target_name, target_tokens, i):
+        name = getattr(self.items[i], self.key)
+        return max(similarity_score(target_name, name), token_jaccard_similarity(target_tokens, self.tokens[i]))
+
+    def __len__(self):
+        return len(self.items)
+
+
+_trees = {}  # "developers" or "tags" -> (table version, tree)
+_tree_lock = threading.Lock()
+
+
+def get_developer_tree(db):
+    """Get the BK-tree with the distinct developers, rebuilt when the apps table changed since the last build.
+
+    :param db: The database session.
+    :return: The BKTree with the rows of the developers, searched on the "developer" attribute.
+    """
+    with _tree_lock:
+        version = table_version(models.App.__tablename__)
+        built_version, tree = _trees.get("developers", (None, None))
+        if tree is None or built_version != version:
+            tree = BKTree(db.query(models.App).with_entities(models.App.developer).distinct().all(), "developer", version)
+            _trees["developers"] = (version, tree)
+
+        return tree
+
+
+def get_tag_tree(db):
+    """Get the BK-tree with the tag names, rebuilt when the tags table changed since the last build.
+
+    :param db: The database session.
+    :return: The BKTree with the rows of the tags, searched on the "name" attribute.
+    """
+    with _tree_lock:
+        version = table_version(models.Tags.__tablename__)
+        built_version, tree = _trees.get("tags", (None, None))
+        if tree is None or built_version != version:
+            tree = BKTree(db.query(models.Tags.name).all(), "name", version)
+            _trees["tags"] = (version, tree)
+
+        return tree
+
+
+def find_most_similar_developer(db, target_name):
+    """The most similar named developer, from the fuzzy cache when the same name was searched since the apps changed.
+
+    :param db: The database session.
+    :param target_name: The name to compare.
+    :return: (row, score) The row with the most similar developer and its similarity score, or (None, None).
+    """
+    tree = get_developer_tree(db)
+    return fuzzy_cache.get_or_set((target_name.strip().lower(), "developer", tree.version), lambda: tree.most_similar(target_name))
+
+
+def find_most_similar_tag(db, target_name):
+    """The most similar tag name, from the fuzzy cache when the same name was searched since the tags changed.
+
+    :param db: The database session.
+    :param target_name: The name to compare.
+    :return: (row, score) The row with the most similar tag name and its similarity score, or (None, None).
+    """
+    tree = get_tag_tree(db)
+    return fuzzy_cache.get_or_set((target_name.strip().lower(), "tag", tree.version), lambda: tree.most_similar(target_name))
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+import src.config as config
+from src.database.events import subscribe
+
+cache_hits_total = Counter("cache_hits_total", "Total cache hits", ["cache"])
+cache_misses_total = Counter("cache_misses_total", "Total cache misses", ["cache"])
+cache_evictions_total = Counter("cache_evictions_total", "Total evicted (full or expired) cache entries", ["cache"])
+
+
+class LRUCache:
+    """Bounded cache that forgets the least recently used entry when it is full, and entries older than the TTL.
+    The hits, misses and evictions are counted in Prometheus with the name of the cache as label.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None, tables=()):
+        """
+        :param name: The name of the cache, used as label of the Prometheus counters.
+        :param maxsize: The maximum amount of entries.
+        :param ttl: The time to live of an entry in seconds, None to keep entries until they are evicted.
+        :param tables: Names of database tables, the cache is cleared after every commit that changed one of them.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (time added, value)
+        self._lock = threading.Lock()
+        self.generation = 0  # Raised by every clear()
+
+        for tablename in tables:
+            subscribe(tablename, lambda primary_keys: self.clear())
+
+    def get(self, key):
+        """:return: The cached value, or None when the key is not (or no longer) in the cache."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                cache_evictions_total.labels(cache=self.name).inc()
+                entry = None
+
+            if entry is None:
+                cache_misses_total.labels(cache=self.name).inc()
+                return None
+
+            self._entries.move_to_end(key)
+            cache_hits_total.labels(cache=self.name).inc()
+            return entry[1]
+
+    def set(self, key, value, generation=None):
+        """Add a value to the cache.
+
+        :param generation: The generation of the cache when the calculation of the value started. The value is not
+            added when the cache was cleared in the meantime, because it can be calculated from the old data.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                cache_evictions_total.labels(cache=self.name).inc()
+
+    def get_or_set(self, key, calculate):
+        """Get the cached value, or calculate it and add it to the cache when the key is not in the cache.
+
+        :param key: The key of the value.
+        :param calculate: Function without arguments that calculates the value, it may not return None.
+        :return: The (cached) value.
+        """
+        value = self.get(key)
+        if value is None:
+            generation = self.generation
+            value = calculate()
+            self.set(key, value, generation)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared cache of the fuzzy name searches, with keys of (normalized search, kind of names, version of the names).
+# A new version of the names makes new keys, the entries of the old version are evicted by the LRU.
+fuzzy_cache = LRUCache("fuzzy", config.FUZZY_CACHE_SIZE)
@@ -1,29 +1,65 @@
 # All functions in this file are for the fuzzy algorithm to find the most similar item in a list based on a calculated similarity score.
+import numpy as np
 
+# From this amount of names the most similar name is found with batch_similarity_scores instead of one name at a time.
+# Measured on the trigram candidates of 50000 synthetic names: 0.57ms (loop) against 0.60ms (batch) for 200 names,
+# 1.08ms against 0.93ms for 400 and 2.95ms against 2.20ms for 1000.
+BATCH_THRESHOLD = 400
+BATCH_CHUNK_SIZE = 4096  # The amount of names in one NumPy array, more uses a lot of memory for long names
 
-def levenshtein_distance(input, reference):
-    """calculates levenshtein distance using the Levenshtein algorithm
+
+def levenshtein_distance(input, reference, max_distance=None):
+    """calculates levenshtein distance with the bit-parallel algorithm of Myers and Hyyrö
+    Every column of the Levenshtein matrix is stored as bit vectors (Python ints) of the vertical differences,
+    so one character of the shorter string is processed with a few integer operations.
     :param input: input string
     :param reference: reference string
-    :return: levenshtein distance
+    :param max_distance: optional upper bound, stop early when the distance gets larger than this
+    :return: levenshtein distance, or max_distance + 1 when the distance is larger than max_distance
     """
     if len(input) < len(reference):
-        return levenshtein_distance(reference, input)
+        input, reference = reference, input
+
+    if max_distance is not None and len(input) - len(reference) > max_distance:
+        return max_distance + 1
 
     if len(reference) == 0:
         return len(input)
 
-    previous_row = list(range(len(reference) + 1))
-    for i, c1 in enumerate(input):
-        current_row = [i + 1]
-        for j, c2 in enumerate(reference):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
+    # The longer string is the pattern of bits, the loop goes over the shorter string
+    pattern_masks = {}
+    for i, character in enumerate(input):
+        pattern_masks[character] = pattern_masks.get(character, 0) | (1 << i)
+
+    all_bits = (1 << len(input)) - 1
+    last_bit = 1 << (len(input) - 1)
+    positive_vertical, negative_vertical = all_bits, 0
+    distance = len(input)
+
+    for j, character in enumerate(reference):
+        matches = pattern_masks.get(character, 0)
+        x_vertical = matches | negative_vertical
+        x_horizontal = (((matches & positive_vertical) + positive_vertical) ^ positive_vertical) | matches
+        positive_horizontal = (negative_vertical | ~(x_horizontal | positive_vertical)) & all_bits
+        negative_horizontal = positive_vertical & x_horizontal
+
+        if positive_horizontal & last_bit:
+            distance += 1
+        elif negative_horizontal & last_bit:
+            distance -= 1
 
-    return previous_row[-1]
+        # Every remaining character can lower the distance by at most 1
+        if max_distance is not None and distance - (len(reference) - j - 1) > max_distance:
+            return max_distance + 1
+
+        positive_horizontal = (positive_horizontal << 1) | 1
+        negative_horizontal <<= 1
+        positive_vertical = (negative_horizontal | ~(x_vertical | positive_horizontal)) & all_bits
+        negative_vertical = positive_horizontal & x_vertical
+
+    if max_distance is not None and distance > max_distance:
+        return max_distance + 1
+    return distance
 
 
 def jaccard_similarity(input, reference):
@@ -32,25 +68,140 @@ def jaccard_similarity(input, reference):
     :param reference: reference string
     :return: percentage of words that match
     """
-    set1, set2 = set(input.lower().split()), set(reference.lower().split())
-    intersection = set1 & set2
-    union = set1 | set2
-    return len(intersection) / len(union) * 100 if union else 0
+    return token_jaccard_similarity(token_set(input), token_set(reference))
 
-def similarity_score(input, reference):
+
+def token_set(text):
+    """splits a string in its lowercase words, for token_jaccard_similarity
+    :param text: input string
+    :return: frozenset with the words
+    """
+    return frozenset(text.lower().split())
+
+
+def token_jaccard_similarity(tokens, reference_tokens):
+    """jaccard_similarity of two sets of words that are already split and lowercased with token_set
+    :param tokens: set of words of the input
+    :param reference_tokens: set of words of the reference
+    :return: percentage of words that match
+    """
+    # Sets of interned integer word ids are not faster than sets of strings, see tests/benchmark/jaccard_benchmark.py
+    # Most names have no word in common, that is known without making a new set
+    if tokens.isdisjoint(reference_tokens):
+        return 0
+    intersection = len(tokens & reference_tokens)
+    return intersection / (len(tokens) + len(reference_tokens) - intersection) * 100
+
+def similarity_score(input, reference, minimum=None):
     """checks similarity based on the levenshtein distance
     :param input: input string
     :param reference: reference string
+    :param minimum: optional lowest similarity that is of interest, see lowercase_similarity_score
     :return: similarity based on levenshtein distance
     """
+    return lowercase_similarity_score(input.lower(), reference.lower(), minimum)
+
+
+def lowercase_similarity_score(input, reference, minimum=None):
+    """similarity_score of two strings that are already lowercase
+    With a minimum, the levenshtein distance stops as soon as the similarity can not reach the minimum anymore.
+    (The length difference alone can already be enough)
+    :param input: lowercase input string
+    :param reference: lowercase reference string
+    :param minimum: optional lowest similarity that is of interest
+    :return: similarity based on levenshtein distance, or 0 when it is lower than the minimum
+    """
     max_len = max(len(input), len(reference))
     if max_len == 0:
         return 100
-    return (1 - levenshtein_distance(input.lower(), reference.lower()) / max_len) * 100
+    if minimum is None or minimum <= 0:
+        return (1 - levenshtein_distance(input, reference) / max_len) * 100
+
+    # similarity >= minimum is distance <= (1 - minimum / 100) * max_len, with a little room for rounding
+    max_distance = int((1 - minimum / 100) * max_len + 1e-9)
+    distance = levenshtein_distance(input, reference, max_distance)
+    if distance > max_distance:
+        return 0
+    return (1 - distance / max_len) * 100
+
+
+def encode_names(names):
+    """encodes lowercase names for batch_similarity_scores, as one padded array with the unicode code point of every character
+    :param names: list of strings
+    :return: (codes, lengths) array of shape (amount of names, longest length) and array with the length of every name
+    """
+    names = [name.lower() for name in names]
+    lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+    codes = np.zeros((len(names), int(lengths.max(initial=0))), dtype=np.uint32)
+    codes[np.arange(codes.shape[1]) < lengths[:, None]] = np.frombuffer("".join(names).encode("utf-32-le"), dtype=np.uint32)
+    return codes, lengths
+
+
+def batch_similarity_scores(input, codes, lengths):
+    """similarity_score of one input against many names at once, computed with NumPy
+    The levenshtein matrix is computed one row (character of the input) at a time for all names together.
+    The dependency on the cell to the left is solved with a cumulative minimum over the row, so no loop per cell is needed.
+    :param input: input string
+    :param codes: encoded names, see encode_names
+    :param lengths: lengths of the names, see encode_names
+    :return: array with the similarity of every name, the same values as similarity_score
+    """
+    input = input.lower()
+    distances = np.empty(len(lengths), dtype=np.int64)
+
+    # Names of about the same length together, so there is little padding
+    order = np.argsort(lengths, kind="stable")
+    for start in range(0, len(order), BATCH_CHUNK_SIZE):
+        chunk = order[start:start + BATCH_CHUNK_SIZE]
+        chunk_lengths = lengths[chunk]
+        width = int(chunk_lengths.max(initial=0))
+        # One column per name, so every step of the cumulative minimum is one vector operation over all names
+        chunk_codes = np.ascontiguousarray(codes[chunk, :width].T)
+
+        columns = np.arange(width + 1, dtype=np.int32)[:, None]
+        row = np.repeat(columns, len(chunk), axis=1)
+        candidate = np.empty_like(row)
+        for i, character in enumerate(input, start=1):
+            # Without insertions (from the left): the best of a deletion (from above) and a substitution
+            candidate[0] = i
+            np.minimum(row[1:] + 1, row[:-1] + (chunk_codes != ord(character)), out=candidate[1:])
+            # With insertions: row[j] = min over k <= j of candidate[k] + (j - k)
+            candidate -= columns
+            np.minimum.accumulate(candidate, axis=0, out=row)
+            row += columns
+
+        distances[chunk] = row[chunk_lengths, np.arange(len(chunk))]
+
+    max_lengths = np.maximum(lengths, len(input))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(max_lengths == 0, 100, (1 - distances / max_lengths) * 100)
+
+
+def batch_most_similar(target_name, target_tokens, codes, lengths, token_sets):
+    """finds the most similar name with batch_similarity_scores, with the same scores and winner as _most_similar
+    :param target_name: lowercase and stripped target name
+    :param target_tokens: set of words of the target, see token_set
+    :param codes: encoded names, see encode_names
+    :param lengths: lengths of the names, see encode_names
+    :param token_sets: list with the set of words of every name
+    :return: (index, similarity) of the first name with the highest similarity, or (None, 0) when no similarity is above 0
+    """
+    jaccard = np.fromiter((token_jaccard_similarity(target_tokens, tokens) for tokens in token_sets),
+                          dtype=np.float64, count=len(token_sets))
+    similarities = np.maximum(batch_similarity_scores(target_name, codes, lengths), jaccard)
+    if not len(similarities):
+        return None, 0
+
+    best = int(np.argmax(similarities))  # The first name with the highest similarity, like the loop in _most_similar
+    if similarities[best] > 0:
+        return best, float(similarities[best])
+    return None, 0
 
 
 def _most_similar(target_name: str, items, key: str):
     """Find the most similar item in a list based on similarity scores.
+    The levenshtein distance is only calculated as far as needed to beat the best item so far.
+    From BATCH_THRESHOLD items they are scored together, see batch_most_similar.
 
     :param target_name: The string name to compare.
     :param items: The list of items to search through.
@@ -61,9 +212,17 @@ def _most_similar(target_name: str, items, key: str):
     most_similar_item = None
     highest_similarity = 0
 
+    items = list(items)
+    if len(items) >= BATCH_THRESHOLD:
+        names = [getattr(item, key) for item in items]
+        best, similarity = batch_most_similar(target_name, token_set(target_name), *encode_names(names),
+                                              [token_set(name) for name in names])
+        return (items[best], round(similarity, 2)) if best is not None else (None, None)
+
     for item in items:
         name = getattr(item, key)
-        similarity = max(similarity_score(target_name, name), jaccard_similarity(target_name, name))
+        jaccard = jaccard_similarity(target_name, name)
+        similarity = max(similarity_score(target_name, name, minimum=max(highest_similarity, jaccard)), jaccard)
 
         if similarity > highest_similarity:
             highest_similarity = similarity
@@ -0,0 +1,315 @@
+"""
+In-memory snapshot of the app names for the fuzzy name search, with a trigram (3 character) index.
+
+Without the snapshot every search queries all app names from the database, and scores the Levenshtein and Jaccard
+similarity of every name. The snapshot keeps the lowercase names and their sets of words, so they are not normalized
+again for every search. An exact match (the same words) is found with one dictionary lookup, otherwise only the names
+that share the most trigrams with the search are scored. For the autocomplete the normalized names are also kept
+in sorted lists, so the names that start with the typed text are found with a binary search.
+The snapshot is updated incrementally, with the apps that are created, renamed or deleted since the last search.
+The searches run on many threads and read the snapshot without a lock, so it is never changed: an update changes
+a copy, which replaces the snapshot when it is done (copy-on-write). The copy shares the parts of the snapshot
+that the update does not change, see persistent.py, so an update does not copy the whole catalog.
+"""
+import copy
+import heapq
+import itertools
+import threading
+from collections import Counter, namedtuple
+
+import src.config as config
+import src.database.models as models
+from src.algoritmes.fuzzy import (BATCH_THRESHOLD, batch_most_similar, encode_names, lowercase_similarity_score,
+                                  token_jaccard_similarity, token_set)
+from src.algoritmes.cache import fuzzy_cache
+from src.algoritmes.parallel import parallel_most_similar
+from src.algoritmes.persistent import BlockList, ShardedDict
+from src.database.events import subscribe
+
+CHUNK_SIZE = 500  # Maximum amount of ids in one IN (...) query
+
+NamedApp = namedtuple("NamedApp", ["id", "name", "header_image"])
+
+
+def trigrams(name):
+    """:return: Set with the trigrams of the lowercase name, padded with spaces so the start and end of words count."""
+    padded = f"  {name.strip().lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def autocomplete_keys(lowercase_name):
+    """:return: List with the normalized name, followed by the parts of the name from its second, third, ... word."""
+    words = lowercase_name.split()
+    return [" ".join(words[i:]) for i in range(len(words))] or [""]
+
+
+class TrigramIndex:
+    """Snapshot of the app names, with an inverted index from every trigram to the ids of the apps with that trigram."""
+
+    def __init__(self, apps=(), version=None):
+        """
+        :param apps: Iterable with (app_id, name, header_image) rows.
+        :param version: The number of this snapshot of the names, the cache keys of the searches have it.
+        """
+        self.version = version
+        self.postings = ShardedDict()  # trigram -> app ids
+        self.apps = ShardedDict()  # app id -> NamedApp
+        self.lowercase_names = ShardedDict()  # app id -> lowercase name
+        self.tokens = ShardedDict()  # app id -> set of the lowercase words, see token_set()
+        self.exact = ShardedDict()  # set of words -> app ids, every app with a similarity of 100
+        self.sizes = ShardedDict()  # app id -> amount of trigrams in the name
+        # The keys of postings and exact with a set of this snapshot, None when every set is. A copy shares the sets
+        # with the original, add and remove copy a set before they change it.
+        self._own_postings = None
+        self._own_exact = None
+
+        for app_id, name, header_image in apps:
+            self._add(app_id, name, header_image)
+
+        # Sorted lists of (normalized name, app id) for the autocomplete, searched with bisect.
+        # The second list has every part of a name from its second, third, ... word, for the word prefixes.
+        name_keys, word_keys = [], []
+        for app_id, lowercase_name in self.lowercase_names.items():
+            name_key, *suffix_keys = autocomplete_keys(lowercase_name)
+            name_keys.append((name_key, app_id))
+            word_keys.extend((key, app_id) for key in suffix_keys)
+        self.sorted_names = BlockList(name_keys)
+        self.sorted_word_suffixes = BlockList(word_keys)
+
+    def copy(self):
+        """:return: Copy of the snapshot that can be changed with add and remove, without changing this snapshot.
+        Shares everything with this snapshot, the parts that a change of the copy changes are copied first."""
+        other = copy.copy(self)
+        other.postings, other.exact = self.postings.copy(), self.exact.copy()
+        other.apps, other.lowercase_names = self.apps.copy(), self.lowercase_names.copy()
+        other.tokens, other.sizes = self.tokens.copy(), self.sizes.copy()
+        other.sorted_names, other.sorted_word_suffixes = self.sorted_names.copy(), self.sorted_word_suffixes.copy()
+        other._own_postings, other._own_exact = set(), set()
+        return other
+
+    @staticmethod
+    def _writable_set(mapping, own_keys, key):
+        """:return: The set of the key in the mapping (postings or exact), copied first when it is shared."""
+        values = mapping.get(key)
+        if values is None or own_keys is not None and key not in own_keys:
+            values = mapping[key] = set(values or ())
+            if own_keys is not None:
+                own_keys.add(key)
+        return values
+
+    def add(self, app_id, name, header_image=None):
+        """Add an app, or replace the app when it is already in the snapshot."""
+        if app_id in self.apps:
+            self.remove(app_id)
+        if name is None:
+            return
+
+        self._add(app_id, name, header_image)
+        name_key, *word_keys = autocomplete_keys(self.lowercase_names[app_id])
+        self.sorted_names.insort((name_key, app_id))
+        for key in word_keys:
+            self.sorted_word_suffixes.insort((key, app_id))
+
+    def _add(self, app_id, name, header_image):
+        """Add an app to everything except the sorted lists of the autocomplete."""
+        if name is None:
+            return
+
+        app_trigrams = trigrams(name)
+        for trigram in app_trigrams:
+            self._writable_set(self.postings, self._own_postings, trigram).add(app_id)
+        self.apps[app_id] = NamedApp(app_id, name, header_image)
+        self.lowercase_names[app_id] = name.lower()
+        self.tokens[app_id] = token_set(name)
+        self._writable_set(self.exact, self._own_exact, self.tokens[app_id]).add(app_id)
+        self.sizes[app_id] = len(app_trigrams)
+
+    def remove(self, app_id):
+        app = self.apps.pop(app_id, None)
+        if app is None:
+            return
+
+        name_key, *word_keys = autocomplete_keys(self.lowercase_names.pop(app_id))
+        self.sorted_names.remove((name_key, app_id))
+        for key in word_keys:
+            self.sorted_word_suffixes.remove((key, app_id))
+
+        del self.sizes[app_id]
+        tokens = self.tokens.pop(app_id)
+        exact_app_ids = self._writable_set(self.exact, self._own_exact, tokens)
+        exact_app_ids.discard(app_id)
+        if not exact_app_ids:
+            del self.exact[tokens]
+        for trigram in trigrams(app.name):
+            posting = self._writable_set(self.postings, self._own_postings, trigram)
+            posting.discard(app_id)
+            if not posting:
+                del self.postings[trigram]
+
+    def candidates(self, query, limit=None):
+        """Find the apps with the most trigrams in common with the query, relative to the length of the names.
+
+        :param query: The searched name.
+        :param limit: The maximum amount of apps, default is FUZZY_CANDIDATES from the config.
+        :return: List of NamedApp (id, name, header_image) sorted on id, like the rows of a query on the apps table.
+        """
+        limit = limit or config.FUZZY_CANDIDATES
+        query_trigrams = trigrams(query)
+
+        common_counts = Counter()
+        for trigram in query_trigrams:
+            common_counts.update(self.postings.get(trigram, ()))
+
+        # Dice coefficient, so long names with many trigrams are not always the best candidates
+        best = heapq.nlargest(
+            limit, zip(common_counts, common_counts.values(), self.sizes.values_of(common_counts)),
+            key=lambda item: (2 * item[1] / (len(query_trigrams) + item[2]), -item[0])
+        )
+        return self.apps.values_of(sorted(app_id for app_id, _, _ in best))
+
+    def autocomplete(self, query, limit=10):
+        """Find the apps with a name that starts with the query, and after those the apps with a word that does.
+
+        :param query: The start of the name, or of one of the words of the name (case insensitive).
+        :param limit: The maximum amount of apps.
+        :return: List of NamedApp, every group sorted on name.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+
+        found = {}  # app id -> NamedApp, in the order they are found
+        for sorted_keys in (self.sorted_names, self.sorted_word_suffixes):
+            for key, app_id in sorted_keys.iter_from((query,)):
+                if len(found) >= limit or not key.startswith(query):
+                    break
+                found.setdefault(app_id, self.apps[app_id])
+
+        return list(found.values())
+
+    def levenshtein_score(self, target_name, app_id, minimum=None):
+        """The similarity_score of the target and the name of the app, with the lowercase name of the snapshot.
+
+        :param target_name: The lowercase and stripped target name.
+        :param app_id: The id of an app in the snapshot.
+        :param minimum: Optional lowest similarity that is of interest, a lower similarity is returned as 0.
+        :return: The levenshtein similarity.
+        """
+        return lowercase_similarity_score(target_name, self.lowercase_names[app_id], minimum)
+
+    def jaccard_score(self, target_tokens, app_id):
+        """The jaccard_similarity of the target and the name of the app, with the words of the snapshot.
+
+        :param target_tokens: The set of words of the target, see token_set().
+        :param app_id: The id of an app in the snapshot.
+        :return: The jaccard similarity.
+        """
+        return token_jaccard_similarity(target_tokens, self.tokens[app_id])
+
+    def most_similar(self, target_name):
+        """Find the most similar app, like _most_similar(target_name, apps, "name") over the apps in the candidates.
+        With FUZZY_PROCESSES above 1 and at least FUZZY_PARALLEL_THRESHOLD apps, over all apps in worker processes
+        when they have this snapshot (see parallel.py).
+
+        :param target_name: The name to compare.
+        :return: (NamedApp, score) The most similar app and its similarity score, or (None, None).
+        """
+        target_name = target_name.strip().lower()
+        target_tokens = token_set(target_name)
+
+        # The same words is a similarity of 100, the highest possible. The first app wins, like in _most_similar
+        exact_app_ids = self.exact.get(target_tokens) if target_tokens else None
+        if exact_app_ids:
+            candidates = [self.apps[min(exact_app_ids)]]
+        else:
+            if config.FUZZY_PROCESSES > 1 and len(self) >= config.FUZZY_PARALLEL_THRESHOLD:
+                # Score every app instead of the candidates, in the worker processes. That can find a more similar app.
+                result = parallel_most_similar(self, target_name, target_tokens, config.FUZZY_PROCESSES)
+                if result is not None:
+                    app_id, similarity = result
+                    return (self.apps[app_id], similarity) if app_id is not None else (None, None)
+            candidates = self.candidates(target_name)
+            if len(candidates) >= BATCH_THRESHOLD:
+                # Only with FUZZY_CANDIDATES at least BATCH_THRESHOLD, for fewer names the loop below is as fast
+                best, similarity = batch_most_similar(
+                    target_name, target_tokens, *encode_names(self.lowercase_names.values_of(app.id for app in candidates)),
+                    self.tokens.values_of(app.id for app in candidates)
+                )
+                return (candidates[best], round(similarity, 2)) if best is not None else (None, None)
+
+        most_similar_app, highest_similarity = None, 0
+        for app in candidates:
+            jaccard = self.jaccard_score(target_tokens, app.id)
+            similarity = max(self.levenshtein_score(target_name, app.id, max(highest_similarity, jaccard)), jaccard)
+            if similarity > highest_similarity:
+                most_similar_app, highest_similarity = app, similarity
+
+        if most_similar_app:
+            return most_similar_app, round(highest_similarity, 2)
+        return None, None
+
+    def __len__(self):
+        return len(self.apps)
+
+
+_name_index = None
+# The apps that are created, renamed or deleted since the last update of the index, None when it is unknown.
+_changed_app_ids = set()
+_name_lock = threading.Lock()
+# Every snapshot, and every update of it, gets the next number. Not the version of the apps table: that is raised
+# before the subscribers get the changed apps, so a snapshot without the changes could get the new table version.
+_snapshot_versions = itertools.count(1)
+
+
+def _on_apps_changed(primary_keys):
+    global _changed_app_ids
+
+    with _name_lock:
+        if primary_keys is None:
+            _changed_app_ids = None
+        elif _changed_app_ids is not None:
+            _changed_app_ids.update(app_id for app_id, in primary_keys)
+
+
+subscribe(models.App.__tablename__, _on_apps_changed)
+
+
+def get_name_index(db):
+    """Get the snapshot of the app names, made on the first use and updated with the changed apps after that.
+
+    :param db: The database session.
+    :return: The TrigramIndex with the names of all apps.
+    """
+    global _name_index, _changed_app_ids
+
+    columns = (models.App.id, models.App.name, models.App.header_image)
+    with _name_lock:
+        if _name_index is None or _changed_app_ids is None:
+            _name_index = TrigramIndex(db.query(*columns).all(), next(_snapshot_versions))
+        elif _changed_app_ids:
+            # The searches that are still running keep using the old snapshot
+            name_index = _name_index.copy()
+            changed_app_ids = list(_changed_app_ids)
+            for app_id in changed_app_ids:
+                name_index.remove(app_id)
+            for i in range(0, len(changed_app_ids), CHUNK_SIZE):
+                chunk = changed_app_ids[i:i + CHUNK_SIZE]
+                for app_id, name, header_image in db.query(*columns).filter(models.App.id.in_(chunk)):
+                    name_index.add(app_id, name, header_image)
+            name_index.version = next(_snapshot_versions)
+            _name_index = name_index
+
+        _changed_app_ids = set()
+        return _name_index
+
+
+def find_most_similar_app(db, target_name):
+    """The most similar named app, from the fuzzy cache when the same name was searched since the apps changed.
+
+    :param db: The database session.
+    :param target_name: The name to compare.
+    :return: (NamedApp, score) The most similar app and its similarity score, or (None, None).
+    """
+    name_index = get_name_index(db)
+    key = (target_name.strip().lower(), "app", name_index.version)
+    return fuzzy_cache.get_or_set(key, lambda: name_index.most_similar(target_name))
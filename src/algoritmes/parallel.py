@@ -0,0 +1,151 @@
+"""
+Scores the fuzzy app name search over the whole catalog in worker processes, so the search runs in parallel
+on multiple cores and does not hold the GIL of the API process.
+
+The catalog is split in one partition per worker process. Every worker gets its partition once, when it starts,
+after that a search only sends the target name to the workers and gets the best app of every partition back.
+The names are encoded once when the worker starts, and a search scores the whole partition at once with the NumPy
+Levenshtein of batch_most_similar.
+This search scores every app, not only the FUZZY_CANDIDATES apps that the search in the API process scores
+(see TrigramIndex.most_similar), so it can find a more similar app.
+
+The workers are started with a snapshot of the names, and are only used for the searches on that snapshot. After a
+change of the apps the searches use the FUZZY_CANDIDATES search in the API process, until the workers are started
+again with the new snapshot by the first search at least FUZZY_POOL_REBUILD_DELAY seconds after the last start.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import src.config as config
+from src.algoritmes.fuzzy import batch_most_similar, encode_names, token_set
+
+# The partition of the catalog in this worker process, in the order of the app ids: the ids, the sets of words
+# and the names encoded for batch_similarity_scores
+_app_ids = np.empty(0, dtype=np.int64)
+_tokens = []
+_codes, _lengths = encode_names([])
+
+
+def _init_worker(partition):
+    """:param partition: List of (app_id, lowercase name, set of words), sorted on id."""
+    global _app_ids, _tokens, _codes, _lengths
+    _app_ids = np.fromiter((app_id for app_id, _, _ in partition), dtype=np.int64, count=len(partition))
+    _tokens = [tokens for _, _, tokens in partition]
+    _codes, _lengths = encode_names([name for _, name, _ in partition])
+
+
+def _most_similar_in_partition(target_name, target_tokens):
+    """The most similar app of the partition of this worker, with the same scores as _most_similar.
+
+    :param target_name: The lowercase and stripped target name.
+    :param target_tokens: The set of words of the target, see token_set().
+    :return: (app_id, similarity) or (None, 0) when no app has a similarity above 0.
+    """
+    best, similarity = batch_most_similar(target_name, target_tokens, _codes, _lengths, _tokens)
+    if best is None:
+        return None, 0
+    return int(_app_ids[best]), similarity  # The first app (lowest id) with the highest similarity
+
+
+class FuzzyProcessPool:
+    """Worker processes with one partition of the app names each."""
+
+    def __init__(self, apps, processes, version=None):
+        """
+        :param apps: List of (app_id, lowercase name, set of words), sorted on id.
+        :param processes: The amount of worker processes (and partitions).
+        :param version: The version of the TrigramIndex snapshot the apps are from.
+        """
+        self.version = version
+        self.processes = processes
+        self.started = time.monotonic()
+        partition_size = -(-len(apps) // processes) or 1
+        # Spawn instead of fork, forking a process with the threads of the API is not safe
+        context = multiprocessing.get_context("spawn")
+        self.workers = [
+            ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker, initargs=(apps[i:i + partition_size],))
+            for i in range(0, len(apps), partition_size)
+        ]
+
+    def submit(self, target_name, target_tokens):
+        """:return: List with the Future of the most similar app of every partition, in the order of the partitions."""
+        return [worker.submit(_most_similar_in_partition, target_name, target_tokens) for worker in self.workers]
+
+    @staticmethod
+    def merge(futures):
+        """The most similar app in all partitions, the first app (lowest id) wins a tie like in _most_similar.
+
+        :param futures: The Futures of submit.
+        :return: (app_id, similarity) with the similarity not rounded, or (None, 0).
+        """
+        # The partitions are in id order, so only a higher similarity of a later partition wins
+        most_similar_app_id, highest_similarity = None, 0
+        for future in futures:
+            app_id, similarity = future.result()
+            if similarity > highest_similarity:
+                most_similar_app_id, highest_similarity = app_id, similarity
+
+        return most_similar_app_id, highest_similarity
+
+    def most_similar(self, target_name, target_tokens=None):
+        """Find the most similar app in all partitions.
+
+        :param target_name: The name to compare.
+        :param target_tokens: Optional set of words of the target, see token_set().
+        :return: (app_id, score) The id of the most similar app and its similarity score, or (None, None).
+        """
+        target_name = target_name.strip().lower()
+        if target_tokens is None:
+            target_tokens = token_set(target_name)
+
+        app_id, similarity = self.merge(self.submit(target_name, target_tokens))
+        if app_id is None:
+            return None, None
+        return app_id, round(similarity, 2)
+
+    def close(self):
+        """Stop the worker processes after the searches that are already submitted, those still get their result."""
+        for worker in self.workers:
+            worker.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _start_pool(name_index, processes):
+    apps = [(app_id, name_index.lowercase_names[app_id], name_index.tokens[app_id]) for app_id in sorted(name_index.apps)]
+    return FuzzyProcessPool(apps, processes, name_index.version)
+
+
+def parallel_most_similar(name_index, target_name, target_tokens, processes):
+    """Find the most similar app of the snapshot, scoring every app in the worker processes.
+
+    :param name_index: The TrigramIndex snapshot of the app names.
+    :param target_name: The lowercase and stripped target name.
+    :param target_tokens: The set of words of the target, see token_set().
+    :param processes: The amount of worker processes.
+    :return: (app_id, score) The id of the most similar app and its similarity score, (None, None) when no app is
+        similar, or None when the workers do not have this snapshot and are not started again yet.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.processes != processes or \
+                _pool.version < name_index.version and time.monotonic() - _pool.started >= config.FUZZY_POOL_REBUILD_DELAY:
+            if _pool is not None:
+                _pool.close()
+            _pool = _start_pool(name_index, processes)
+        if _pool.version != name_index.version:
+            return None
+        # Submitted with the lock, so the pool is not closed before the searches are submitted
+        futures = _pool.submit(target_name, target_tokens)
+
+    most_similar_app_id, highest_similarity = FuzzyProcessPool.merge(futures)
+    if most_similar_app_id is None:
+        return None, None
+    return most_similar_app_id, round(highest_similarity, 2)
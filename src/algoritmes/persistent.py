@@ -0,0 +1,170 @@
+"""
+Containers for snapshots that are changed with copy-on-write, see TrigramIndex in ngram.py.
+
+A copy of a dict or list copies every item, for a snapshot of the whole catalog that is too slow for every change.
+These containers are split in parts, a copy only copies the list of the parts and shares the parts themselves.
+A part is copied the first time the copy changes it, so a change costs the size of a part instead of the whole
+container. The original must not be changed after it is copied, the searches still read it.
+"""
+import bisect
+import itertools
+
+SHARDS = 256  # The amount of dictionaries of a ShardedDict
+BLOCK_SIZE = 512  # The size of a block of a BlockList, a block is split when it has twice as many items
+
+
+class ShardedDict:
+    """Dictionary split in SHARDS dictionaries on the hash of the key."""
+
+    def __init__(self, items=()):
+        """:param items: Iterable with (key, value) pairs."""
+        self._shards = [{} for _ in range(SHARDS)]
+        self._owned = None  # For every shard if it is not shared with the original, None when no shard is shared
+        self._len = 0
+        for key, value in items:
+            self[key] = value
+
+    def copy(self):
+        """:return: Copy that shares the shards with this dictionary, which must not be changed after this."""
+        other = ShardedDict()
+        other._shards = list(self._shards)
+        other._owned = [False] * SHARDS
+        other._len = self._len
+        return other
+
+    def _writable_shard(self, key):
+        i = hash(key) % SHARDS
+        if self._owned is not None and not self._owned[i]:
+            self._shards[i] = dict(self._shards[i])
+            self._owned[i] = True
+        return self._shards[i]
+
+    def __getitem__(self, key):
+        return self._shards[hash(key) % SHARDS][key]
+
+    def get(self, key, default=None):
+        return self._shards[hash(key) % SHARDS].get(key, default)
+
+    def values_of(self, keys):
+        """:return: List with the values of the keys, faster than looking up the keys one by one."""
+        shards = self._shards
+        return [shards[hash(key) % SHARDS][key] for key in keys]
+
+    def __contains__(self, key):
+        return key in self._shards[hash(key) % SHARDS]
+
+    def __setitem__(self, key, value):
+        shard = self._writable_shard(key)
+        if key not in shard:
+            self._len += 1
+        shard[key] = value
+
+    def __delitem__(self, key):
+        del self._writable_shard(key)[key]
+        self._len -= 1
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        self._len -= 1
+        return self._writable_shard(key).pop(key)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._shards)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return itertools.chain.from_iterable(shard.values() for shard in self._shards)
+
+    def items(self):
+        return itertools.chain.from_iterable(shard.items() for shard in self._shards)
+
+
+class BlockList:
+    """Sorted list split in blocks of sorted lists, with the first item of every block to find a block with bisect."""
+
+    def __init__(self, items=()):
+        """:param items: Iterable with the items, in any order."""
+        items = sorted(items)
+        self._blocks = [items[i:i + BLOCK_SIZE] for i in range(0, len(items), BLOCK_SIZE)]
+        self._firsts = [block[0] for block in self._blocks]
+        self._owned = None  # For every block if it is not shared with the original, None when no block is shared
+        self._len = len(items)
+
+    def copy(self):
+        """:return: Copy that shares the blocks with this list, which must not be changed after this."""
+        other = BlockList()
+        other._blocks, other._firsts = list(self._blocks), list(self._firsts)
+        other._owned = [False] * len(self._blocks)
+        other._len = self._len
+        return other
+
+    def _block_index(self, value):
+        """:return: The index of the block where the value is, or has to be inserted."""
+        return max(bisect.bisect_right(self._firsts, value) - 1, 0)
+
+    def _writable_block(self, i):
+        if self._owned is not None and not self._owned[i]:
+            self._blocks[i] = list(self._blocks[i])
+            self._owned[i] = True
+        return self._blocks[i]
+
+    def insort(self, value):
+        """Insert the value, after the items that are equal to it."""
+        self._len += 1
+        if not self._blocks:
+            self._blocks, self._firsts = [[value]], [value]
+            if self._owned is not None:
+                self._owned = [True]
+            return
+
+        i = self._block_index(value)
+        block = self._writable_block(i)
+        bisect.insort(block, value)
+        self._firsts[i] = block[0]
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[i:i + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self._firsts.insert(i + 1, block[BLOCK_SIZE])
+            if self._owned is not None:
+                self._owned.insert(i + 1, True)
+
+    def remove(self, value):
+        """Remove one item that is equal to the value, if there is one."""
+        if not self._blocks:
+            return
+
+        i = self._block_index(value)
+        j = bisect.bisect_left(self._blocks[i], value)
+        if j == len(self._blocks[i]) or self._blocks[i][j] != value:
+            return
+
+        self._len -= 1
+        block = self._writable_block(i)
+        del block[j]
+        if block:
+            self._firsts[i] = block[0]
+        else:
+            del self._blocks[i], self._firsts[i]
+            if self._owned is not None:
+                del self._owned[i]
+
+    def iter_from(self, value):
+        """:return: Iterator over the items from the first item that is not lower than the value."""
+        i = self._block_index(value)
+        if i < len(self._blocks):
+            yield from itertools.islice(self._blocks[i], bisect.bisect_left(self._blocks[i], value), None)
+            for block in itertools.islice(self._blocks, i + 1, None):
+                yield from block
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._blocks)
@@ -0,0 +1,436 @@
+# All functions in this file are for finding the games with the most similar tags to a selected game.
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+import src.config as config
+import src.database.models as models
+from src.database.events import table_version
+
+
+class TagIndex:
+    """Inverted index from a tag to the (sorted) list of apps that have that tag, a so called posting list.
+
+    Only the apps that share at least one tag with the selected app are scored,
+    so the cost of a recommendation depends on the length of the posting lists and not on the size of the catalog.
+    """
+
+    def __init__(self, relations):
+        """
+        :param relations: Iterable of (app_id, tag_id) pairs, the rows of the app_tags table.
+        """
+        self.postings = defaultdict(list)
+        self.app_tags = defaultdict(set)
+
+        for app_id, tag_id in relations:
+            self.postings[tag_id].append(app_id)
+            self.app_tags[app_id].add(tag_id)
+
+        for posting in self.postings.values():
+            posting.sort()
+
+    def common_tag_counts(self, tag_ids, exclude=None):
+        """Merge the posting lists of the given tags.
+
+        :param tag_ids: The tag ids of the selected app.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: Dictionary {app_id: number of common tags} for every app with at least one common tag.
+        """
+        counts = defaultdict(int)
+        for tag_id in set(tag_ids):
+            for app_id in self.postings.get(tag_id, ()):
+                counts[app_id] += 1
+
+        counts.pop(exclude, None)
+        return counts
+
+    def similar(self, tag_ids, amount, exclude=None):
+        """Find the apps with the most tags in common with the given tags.
+
+        :param tag_ids: The tag ids of the selected app.
+        :param amount: The maximum amount of apps to return.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+        """
+        total_tags = len(set(tag_ids))
+        if total_tags == 0 or amount <= 0:
+            return []
+
+        scores = [
+            (app_id, similarity_percentage(count, total_tags))
+            for app_id, count in self.common_tag_counts(tag_ids, exclude).items()
+        ]
+        return heapq.nsmallest(amount, (score for score in scores if score[1] > 0), key=lambda x: (-x[1], x[0]))
+
+    def tags_of(self, app_id):
+        """:return: Set with the tag ids of the given app."""
+        return self.app_tags.get(app_id, set())
+
+
+class TagMatrix:
+    """Sparse app×tag incidence matrix, scored with NumPy.
+
+    The common tag counts against every app are calculated in one sparse matrix-vector product,
+    and the best apps are picked with a partial sort (argpartition) instead of sorting all apps.
+    """
+
+    def __init__(self, relations):
+        """
+        :param relations: Iterable of (app_id, tag_id) pairs, the rows of the app_tags table.
+        """
+        if not isinstance(relations, np.ndarray):
+            relations = np.array(list(relations), dtype=np.int64)
+        relations = relations.astype(np.int64, copy=False).reshape(-1, 2)
+
+        # The unique, sorted app and tag ids. The matrix uses their positions in these arrays as row and column.
+        self.app_ids, rows = np.unique(relations[:, 0], return_inverse=True)
+        self.tag_ids, cols = np.unique(relations[:, 1], return_inverse=True)
+
+        # Sorted on row (app), so the tags of an app are one slice of self.cols (CSR layout)
+        order = np.lexsort((cols, rows))
+        self.rows = rows[order]
+        self.cols = cols[order]
+        self.indptr = np.searchsorted(self.rows, np.arange(len(self.app_ids) + 1))
+
+    def common_tag_counts(self, tag_ids, exclude=None):
+        """Count the common tags with every app, like TagIndex.common_tag_counts.
+
+        :param tag_ids: The tag ids of the selected app.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: Dictionary {app_id: number of common tags} for every app with at least one common tag.
+        """
+        counts = self._count_vector(tag_ids)
+        positions = np.flatnonzero(counts)
+        counts = dict(zip(self.app_ids[positions].tolist(), counts[positions].astype(np.int64).tolist()))
+
+        counts.pop(exclude, None)
+        return counts
+
+    def _count_vector(self, tag_ids):
+        """The matrix-vector product of the app×tag matrix with the tags of the selected app.
+
+        :param tag_ids: The tag ids of the selected app.
+        :return: Array with the number of common tags for every app in self.app_ids.
+        """
+        query = np.zeros(len(self.tag_ids), dtype=np.float64)
+        query[self._tag_positions(tag_ids)] = 1
+
+        return np.bincount(self.rows, weights=query[self.cols], minlength=len(self.app_ids))
+
+    def similar(self, tag_ids, amount, exclude=None):
+        """Find the apps with the most tags in common with the given tags.
+
+        :param tag_ids: The tag ids of the selected app.
+        :param amount: The maximum amount of apps to return.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+        """
+        total_tags = len(set(tag_ids))
+        if total_tags == 0 or amount <= 0 or len(self.app_ids) == 0:
+            return []
+
+        scores = np.round((self._count_vector(tag_ids) / total_tags) * 100).astype(np.int64)
+        return self._top(np.arange(len(self.app_ids)), scores, amount, exclude)
+
+    def _top(self, positions, scores, amount, exclude=None):
+        """Pick the best apps with a partial sort.
+
+        :param positions: Array with the positions of the scored apps in self.app_ids, sorted.
+        :param scores: Array with the similarity score of every app in positions.
+        :param amount: The maximum amount of apps to return.
+        :param exclude: An app id to leave out.
+        :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+        """
+        keep = (scores > 0) & (self.app_ids[positions] != exclude)
+        positions, scores = positions[keep], scores[keep]
+        if len(positions) == 0:
+            return []
+
+        # One unique key per app: the highest score first, and on equal scores the lowest app id (position) first.
+        keys = scores * len(self.app_ids) + (len(self.app_ids) - 1 - positions)
+        amount = min(amount, len(positions))
+        best = np.argpartition(-keys, amount - 1)[:amount]
+        best = best[np.argsort(-keys[best])]
+
+        return [(int(self.app_ids[positions[i]]), int(scores[i])) for i in best]
+
+    def _tag_positions(self, tag_ids):
+        """:return: Array with the (column) positions of the given tag ids, unknown tags are left out."""
+        tag_ids = np.unique(np.array(list(tag_ids), dtype=np.int64))
+        positions = np.searchsorted(self.tag_ids, tag_ids)
+        known = positions < len(self.tag_ids)
+        return positions[known][self.tag_ids[positions[known]] == tag_ids[known]]
+
+    def tags_of(self, app_id):
+        """:return: Set with the tag ids of the given app."""
+        position = np.searchsorted(self.app_ids, app_id)
+        if position == len(self.app_ids) or self.app_ids[position] != app_id:
+            return set()
+        return set(self.tag_ids[self.cols[self.indptr[position]:self.indptr[position + 1]]].tolist())
+
+
+class TagMinHash(TagMatrix):
+    """Approximate recommendations for huge catalogs, with MinHash signatures and locality-sensitive hashing (LSH).
+
+    Every app gets a MinHash signature of its tags, which is split into bands of rows. Apps with an equal band
+    land in the same bucket. A query only scores the apps in the buckets of its own bands, with the exact score
+    of TagMatrix. More bands find more of the similar apps, more rows per band make the buckets smaller (and faster).
+    """
+
+    PRIME = (1 << 31) - 1
+    CHUNK_SIZE = 10000  # Apps per chunk when calculating the signatures, to limit the memory use
+
+    def __init__(self, relations, bands=None, rows=None, seed=1):
+        """
+        :param relations: Iterable or array of (app_id, tag_id) pairs, the rows of the app_tags table.
+        :param bands: The amount of bands, default is LSH_BANDS from the config.
+        :param rows: The amount of rows (hashes) per band, default is LSH_ROWS from the config.
+        :param seed: The seed for the random hash functions.
+        """
+        super().__init__(relations)
+        self.bands = bands or config.LSH_BANDS
+        self.band_rows = rows or config.LSH_ROWS  # Not self.rows, that is the CSR row array of TagMatrix
+
+        # Hash function i of tag (column) c is (a[i] * c + b[i]) % PRIME, calculated once for every tag.
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, self.PRIME, self.bands * self.band_rows, dtype=np.int64)
+        b = rng.integers(0, self.PRIME, self.bands * self.band_rows, dtype=np.int64)
+        self.tag_hashes = (np.arange(len(self.tag_ids), dtype=np.int64)[:, None] * a + b) % self.PRIME
+
+        band_keys = np.empty((len(self.app_ids), self.bands), dtype=np.uint64)
+        for start in range(0, len(self.app_ids), self.CHUNK_SIZE):
+            end = min(start + self.CHUNK_SIZE, len(self.app_ids))
+            offsets = self.indptr[start:end + 1]
+            hashes = self.tag_hashes[self.cols[offsets[0]:offsets[-1]]]
+            signatures = np.minimum.reduceat(hashes, offsets[:-1] - offsets[0], axis=0)
+            band_keys[start:end] = self._band_keys(signatures)
+
+        # Per band the apps sorted on their key, so a bucket is found with a binary search.
+        self.buckets = [np.argsort(band_keys[:, band], kind="stable") for band in range(self.bands)]
+        self.bucket_keys = [band_keys[bucket, band] for band, bucket in enumerate(self.buckets)]
+
+    def _band_keys(self, signatures):
+        """Combine the rows of every band of the signatures into one key.
+
+        :param signatures: Array with a MinHash signature per row.
+        :return: Array with a key per band per row.
+        """
+        bands = signatures.reshape(len(signatures), self.bands, self.band_rows).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for row in range(self.band_rows):
+            keys = keys * np.uint64(1000003) + bands[:, :, row]  # Overflow is fine, it only has to mix the rows
+        return keys
+
+    def candidates(self, tag_ids):
+        """Find the apps that share a bucket with the given tags in at least one band.
+
+        :param tag_ids: The tag ids of the selected app.
+        :return: Sorted array with the positions of the candidate apps in self.app_ids.
+        """
+        tag_positions = self._tag_positions(tag_ids)
+        if len(tag_positions) == 0 or len(self.app_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        query_keys = self._band_keys(self.tag_hashes[tag_positions].min(axis=0, keepdims=True))[0]
+        found = []
+        for band, key in enumerate(query_keys):
+            start = np.searchsorted(self.bucket_keys[band], key, side="left")
+            end = np.searchsorted(self.bucket_keys[band], key, side="right")
+            found.append(self.buckets[band][start:end])
+
+        return np.unique(np.concatenate(found))
+
+    def similar(self, tag_ids, amount, exclude=None):
+        """Find the apps with the most tags in common with the given tags, among the apps in the same buckets.
+
+        :param tag_ids: The tag ids of the selected app.
+        :param amount: The maximum amount of apps to return.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+        """
+        total_tags = len(set(tag_ids))
+        if total_tags == 0 or amount <= 0:
+            return []
+
+        positions = self.candidates(tag_ids)
+        if len(positions) == 0:
+            return []
+
+        # Gather the tags of the candidates (their slices of self.cols) and count the tags that are in the query
+        query = np.zeros(len(self.tag_ids), dtype=np.int64)
+        query[self._tag_positions(tag_ids)] = 1
+        starts, ends = self.indptr[positions], self.indptr[positions + 1]
+        lengths = ends - starts
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        gathered = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        counts = np.add.reduceat(query[self.cols[gathered]], offsets)
+
+        scores = np.round((counts / total_tags) * 100).astype(np.int64)
+        return self._top(positions, scores, amount, exclude)
+
+
+class FeatureIndex:
+    """Inverted index over the tags, genres and categories (the features) of the apps, scored with IDF weights.
+
+    Common features like "Single-Player" weigh little and rare features weigh a lot (BM25 style IDF).
+    The document frequencies and weights are calculated once when the index is built.
+    A feature is a tuple like ("tag", 1), ("genre", 3) or ("category", 2).
+    """
+
+    def __init__(self, relations):
+        """
+        :param relations: Iterable of (app_id, feature) pairs.
+        """
+        self.postings = defaultdict(list)
+        self.app_features = defaultdict(set)
+
+        for app_id, feature in relations:
+            self.postings[feature].append(app_id)
+            self.app_features[app_id].add(feature)
+
+        self.amount_apps = len(self.app_features)
+        self.weights = {feature: self.weight(len(posting)) for feature, posting in self.postings.items()}
+
+    def weight(self, document_frequency):
+        """The IDF weight of a feature that the given amount of apps have."""
+        return math.log(1 + (self.amount_apps - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def similar(self, features, amount, exclude=None):
+        """Find the apps with the highest weight of features in common with the given features.
+
+        The features are processed from the rarest (shortest posting list) to the most common.
+        As soon as no unseen app can reach the current top, the long posting lists of the common features are not
+        scanned anymore: only the apps already found are checked, and the ones that can't reach the top are dropped.
+
+        :param features: The features of the selected app.
+        :param amount: The maximum amount of apps to return.
+        :param exclude: An app id to leave out, normally the selected app itself.
+        :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+            The score is the percentage of the total weight of the given features.
+        """
+        features = sorted(set(features), key=lambda feature: (-self.weights.get(feature, self.weight(0)), feature))
+        weights = [self.weights.get(feature, self.weight(0)) for feature in features]
+        total_weight = sum(weights)
+        if not features or amount <= 0:
+            return []
+
+        # The weight of the features after the current one, the most an unseen app can still score.
+        remaining_weights = [sum(weights[i + 1:]) for i in range(len(weights))]
+
+        scores = {}
+        pruning = False
+        for feature, weight, remaining_weight in zip(features, weights, remaining_weights):
+            if pruning:
+                for app_id in scores:
+                    if feature in self.app_features[app_id]:
+                        scores[app_id] += weight
+            else:
+                for app_id in self.postings.get(feature, ()):
+                    if app_id != exclude:
+                        scores[app_id] = scores.get(app_id, 0) + weight
+
+            if len(scores) >= amount:
+                lowest_top_score = heapq.nlargest(amount, scores.values())[-1]
+                pruning = pruning or lowest_top_score > remaining_weight
+                if pruning:
+                    scores = {app_id: score for app_id, score in scores.items() if score + remaining_weight >= lowest_top_score}
+
+        best = heapq.nsmallest(amount, scores.items(), key=lambda x: (-x[1], x[0]))
+        return [(app_id, round(score / total_weight * 100)) for app_id, score in best if score > 0]
+
+    def features_of(self, app_id):
+        """:return: Set with the features of the given app."""
+        return self.app_features.get(app_id, set())
+
+
+def features_of_app(app):
+    """:return: List with the features of an app object with loaded tags, genres and categories."""
+    return (
+        [("tag", tag.id) for tag in app.tags]
+        + [("genre", genre.id) for genre in app.genres]
+        + [("category", category.id) for category in app.categories]
+    )
+
+
+def similarity_percentage(common_tags, total_tags):
+    """The similarity score of an app: the percentage of the tags of the selected app it also has, rounded."""
+    return round((common_tags / total_tags) * 100)
+
+
+def combined_similar(index, tag_id_lists, amount, exclude=()):
+    """Find the apps that are the most similar to all selected apps together. ("Because you liked all of these")
+
+    The combined score is the average of the similarity scores for every selected app.
+
+    :param index: The TagIndex or TagMatrix.
+    :param tag_id_lists: List with the tag ids of every selected app.
+    :param amount: The maximum amount of apps to return.
+    :param exclude: The app ids to leave out, normally the selected apps themselves.
+    :return: List of (app_id, similarity_score) sorted on the highest score first, ties on the lowest app id.
+    """
+    if not tag_id_lists or amount <= 0:
+        return []
+
+    totals = defaultdict(int)
+    for tag_ids in tag_id_lists:
+        total_tags = len(set(tag_ids))
+        for app_id, count in index.common_tag_counts(tag_ids).items():
+            totals[app_id] += similarity_percentage(count, total_tags)
+
+    for app_id in exclude:
+        totals.pop(app_id, None)
+
+    scores = ((app_id, round(total / len(tag_id_lists))) for app_id, total in totals.items())
+    return heapq.nsmallest(amount, (score for score in scores if score[1] > 0), key=lambda x: (-x[1], x[0]))
+
+
+BACKENDS = {"index": TagIndex, "matrix": TagMatrix, "lsh": TagMinHash}
+
+_indexes = {}  # backend name or "features" -> (table version, index)
+_index_lock = threading.Lock()
+
+
+def get_tag_index(db, backend=None):
+    """Get the tag index, (re)build it from the database when the app_tags table changed since the last build.
+
+    :param db: The database session.
+    :param backend: The name of the backend in BACKENDS, default is RECOMMENDATION_BACKEND from the config.
+    :return: The TagIndex or TagMatrix with all app and tag relations.
+    """
+    backend = backend or config.RECOMMENDATION_BACKEND
+
+    with _index_lock:
+        version = table_version(models.AppTags.__tablename__)
+        built_version, index = _indexes.get(backend, (None, None))
+        if index is None or built_version != version:
+            index = BACKENDS[backend](db.query(models.AppTags.app_id, models.AppTags.tag_id).all())
+            _indexes[backend] = (version, index)
+
+        return index
+
+
+def get_feature_index(db):
+    """Get the FeatureIndex, (re)build it from the database when the tags, genres or categories of the apps changed.
+
+    :param db: The database session.
+    :return: The FeatureIndex with all app relations and the cached IDF weights.
+    """
+    with _index_lock:
+        version = table_version(
+            models.AppTags.__tablename__, models.AppGenre.__tablename__, models.AppCategory.__tablename__
+        )
+        built_version, index = _indexes.get("features", (None, None))
+        if index is None or built_version != version:
+            relations = (
+                [(row.app_id, ("tag", row.tag_id)) for row in db.query(models.AppTags.app_id, models.AppTags.tag_id)]
+                + [(row.app_id, ("genre", row.genre_id)) for row in db.query(models.AppGenre.app_id, models.AppGenre.genre_id)]
+                + [(row.app_id, ("category", row.category_id))
+                   for row in db.query(models.AppCategory.app_id, models.AppCategory.category_id)]
+            )
+            index = FeatureIndex(relations)
+            _indexes["features"] = (version, index)
+
+        return index
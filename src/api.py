@@ -1,7 +1,7 @@
 import os
 
 import sqlalchemy
-from fastapi import FastAPI, Depends, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, BackgroundTasks, Query
 import uvicorn
 
 from fastapi.templating import Jinja2Templates
@@ -11,10 +11,11 @@ from fastapi.responses import Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import PlainTextResponse
 
-from .algoritmes.fuzzy import similarity_score, jaccard_similarity, _most_similar
+from .algoritmes.ngram import find_most_similar_app, get_name_index
+from .algoritmes.bktree import find_most_similar_developer, find_most_similar_tag
 from .config import API_HOST_URL, API_HOST_PORT, BLOCKED_CONTENT_TAGS, check_key
 
-from src.routes.development.apps import router as apps_router
+from src.routes.development.apps import router as apps_router, find_similar_named_apps, include_options, id_and_name_options
 from .routes.frontend import router as frontend_router, root
 from src.routes.development.categories import router_development as categories_router_development
 from src.routes.categories import router as categories_router
@@ -22,7 +23,8 @@ from src.routes.categories import router as categories_router
 import src.database.models as models
 from tests.integration.fill_database import fill_database
 
-from src.database.database import Engine, get_db, SessionLocal
+from src.database.database import Engine, SessionLocal
+from src.executors import get_async_db, run_in, db_executor, cpu_executor
 from prometheus_client import Counter, generate_latest, REGISTRY, start_http_server
 
 http_requests_total = Counter(
@@ -54,7 +56,7 @@ class API:
 
         models.Base.metadata.create_all(bind=Engine)
 
-        self.db_dependency = Depends(get_db)
+        self.db_dependency = Depends(get_async_db)
 
     def run(self):
         """"
@@ -110,26 +112,32 @@ class API:
             os._exit(1) # Force exit the server
 
         @self.app.get("/apps")
-        def read_apps(db=self.db_dependency, all_fields: bool = False, target_name: str = None, like: str = None):
+        @run_in(cpu_executor)
+        def read_apps(db=self.db_dependency, all_fields: bool = False, target_name: str = None, like: str = None, limit: int = None,
+                      include: str = None):
             """
             Get a JSON / dictionary with all the apps in the database.
 
             :param all_fields: If True, return all fields of the app, otherwise only the id and name of the app.
             :param target_name: Find the most similar named apps for this name.
+            :param limit: The maximum amount of most similar named apps for the target_name.
             :param like: Find apps with names like this, Uses %string% for SQL LIKE query.
+            :param include: Comma separated relationships to add to every app (not with target_name), for example "tags,genres,categories".
             :return: List of apps in JSON/dictionary format.
             """
             if target_name:
-                return find_similar_named_apps(target_name, db)
+                return find_similar_named_apps(target_name, db, limit)
             elif like:
                 like = like.strip().lower()
-                apps = db.query(models.App).filter(models.App.name.ilike(f"%{like}%")).all()
+                apps = db.query(models.App).options(*include_options(include)).filter(models.App.name.ilike(f"%{like}%")).all()
                 if not apps:
                     raise HTTPException(status_code=404, detail=f"No apps found with name like '{like}'")
                 return apps
             if all_fields:
-                apps = db.query(models.App).all()
+                apps = db.query(models.App).options(*include_options(include)).all()
                 return apps
+            if include:
+                return db.query(models.App).options(*id_and_name_options(include)).all()
 
             apps = db.query(models.App.id, models.App.name).all()
             return [{"id": app.id, "name": app.name} for app in apps]
@@ -168,6 +176,7 @@ class API:
             return related_data
 
         @self.app.get("/app/{appid}/categories")
+        @run_in(db_executor)
         def read_app_categories(appid: str, fuzzy: bool = True, db=self.db_dependency):
             """"
             Get all the categories for a specific app.
@@ -179,6 +188,7 @@ class API:
             return get_app_related_data(appid, db, models.Category, models.AppCategory, fuzzy)
 
         @self.app.get("/fill", include_in_schema=False)
+        @run_in(db_executor)
         def fill(db=self.db_dependency):
             """
             manually fill the database with testdata if api is hosted by pycharm
@@ -191,6 +201,7 @@ class API:
             else: raise HTTPException(status_code=401, detail=f"geen pycharm host")
 
         @self.app.get("/app/{appid}/genres")
+        @run_in(db_executor)
         def read_app_genres(appid: str, fuzzy: bool = True, db=self.db_dependency):
             """"
             Get all the genres for a specific app.
@@ -202,6 +213,7 @@ class API:
             return get_app_related_data(appid, db, models.Genre, models.AppGenre, fuzzy)
 
         @self.app.get("/app/{appid}/tags")
+        @run_in(db_executor)
         def read_app_tags(appid: str, fuzzy: bool = True, db=self.db_dependency):
             """
             Get all the tags for a specific app.
@@ -212,20 +224,23 @@ class API:
             return get_app_related_data(appid, db, models.Tags, models.AppTags, fuzzy)
 
         @self.app.get("/app/{appid}")
-        def read_app(appid: str, fuzzy: bool = True, db=self.db_dependency):
+        @run_in(db_executor)
+        def read_app(appid: str, fuzzy: bool = True, include: str = None, db=self.db_dependency):
             """
             Endpoint to get the data for a specific app.
 
             :param appid: The appid or name of the game to get the data for.
             :param fuzzy: If True, try to find the app by name even when the grammar is not correct using my fuzzy algorithm ^Seger. It skips this always when the appid is a number.
+            :param include: Comma separated relationships to add to the app, for example "tags,genres,categories".
             """
-            app = app_data_from_id_or_name(appid, db, fuzzy, False)
+            app = app_data_from_id_or_name(appid, db, fuzzy, include=include)
             print(app)
             if not app:
                 raise HTTPException(status_code=404, detail="App not found.")
             return app
 
         @self.app.get("/developers")
+        @run_in(db_executor)
         def read_developers(db=self.db_dependency, apps = False):
             """
             Get all developers in the database.
@@ -258,7 +273,7 @@ class API:
 
             return [{"name": dev.developer} for dev in developers]
 
-        def app_data_from_id_or_name(app_id_or_name: str, db, fuzzy: bool = True, categories: bool = False):
+        def app_data_from_id_or_name(app_id_or_name: str, db, fuzzy: bool = True, categories: bool = False, include: str = None):
             """"
             Helper function to get the data for a specific app. (Not a direct endpoint)
 
@@ -266,44 +281,38 @@ class API:
             :param db: The database dependency.
             :param fuzzy: If True, try to find the app by name even when the grammar is not correct using my fuzzy algorithm ^Seger. It skips this always when the appid is a number.
             :param categories: If True, also get the categories, genres and tags for the app in the App object as response.
+            :param include: Comma separated relationships to load for the app, see include_options. Ignored when categories is True.
             :return: JSON / dictionary with all the data for the app.
             """
             app = None
+            apps_query = db.query(models.App).options(*include_options("tags,genres,categories" if categories else include))
 
             if app_id_or_name.isdigit():
-                app = db.query(models.App).filter(models.App.id == int(app_id_or_name)).first()
+                app = apps_query.filter(models.App.id == int(app_id_or_name)).first()
             else:
                 if fuzzy:
-                    similar_app = most_similar_named_app(app_id_or_name, db)
+                    similar_app = most_similar_named_app.__wrapped__(app_id_or_name, db)  # Already runs in an executor
                     if similar_app and isinstance(similar_app.get("id"), int):
                         print(f"Most similar app for '{app_id_or_name}' is '{similar_app['name']}' with similarity: {similar_app['similarity']}")
-                        app = db.query(models.App).filter(models.App.id == similar_app["id"]).first()
+                        app = apps_query.filter(models.App.id == similar_app["id"]).first()
                 else:
                     app_id_or_name = app_id_or_name.strip().capitalize()
-                    app = db.query(models.App).filter(models.App.name == app_id_or_name).first()
+                    app = apps_query.filter(models.App.name == app_id_or_name).first()
                     if not app:
                         raise HTTPException(status_code=404, detail=f"App {app_id_or_name} not found")
 
-            if categories and app and app.id:
-                tags = db.query(models.Tags).join(models.AppTags).filter(models.AppTags.app_id == app.id).all()
-                genres = db.query(models.Genre).join(models.AppGenre).filter(models.AppGenre.app_id == app.id).all()
-                categories = db.query(models.Category).join(models.AppCategory).filter(
-                    models.AppCategory.app_id == app.id).all()
-
-                app.tags = tags
-                app.genres = genres
-                app.categories = categories
-
             return app
 
         @self.app.get("/apps/developer/{target_name}")
-        def get_developer_games(target_name: str, fuzzy: bool = True, all_fields: bool = False, db=self.db_dependency):
+        @run_in(cpu_executor)
+        def get_developer_games(target_name: str, fuzzy: bool = True, all_fields: bool = False, include: str = None, db=self.db_dependency):
             """"
             Function to get all games for a specific developer.
 
             :param target_name: The name of the developer to get the games for.
             :param fuzzy: When True, try to find the most similar named developer in the database. Using my fuzzy algorithm
             :param all_fields: When True, return all fields of the app, otherwise only the id and name of the app will be returned.
+            :param include: Comma separated relationships to add to every app, for example "tags,genres,categories".
             :return: JSON / dictionary with all the games for the given developer.
             """
             target_name = target_name.strip().capitalize()
@@ -316,7 +325,9 @@ class API:
                 developer = str(similar_developer)
                 try:
                     if all_fields:
-                        games = db.query(models.App).filter(models.App.developer == developer).all()
+                        games = db.query(models.App).options(*include_options(include)).filter(models.App.developer == developer).all()
+                    elif include:
+                        games = db.query(models.App).options(*id_and_name_options(include)).filter(models.App.developer == developer).all()
                     else:
                         games = db.query(models.App.id, models.App.name).filter(models.App.developer == developer).all()
                         games = [{"id": game.id, "name": game.name} for game in games]
@@ -336,8 +347,7 @@ class API:
             :param db: The database dependency.
             :return: String "name" of the most similar named developer.
             """
-            developers = db.query(models.App).with_entities(models.App.developer).distinct().all()
-            most_similar_dev, similarity = _most_similar(target_name, developers, "developer")
+            most_similar_dev, similarity = find_most_similar_developer(db, target_name)
 
             if most_similar_dev:
                 print(f"Most similar developer: {most_similar_dev} with similarity: {similarity}. For target: {target_name}")
@@ -345,10 +355,28 @@ class API:
 
             return None
 
+        @self.app.get("/apps/autocomplete")
+        @run_in(db_executor)
+        def autocomplete_apps(q: str, limit: int = Query(10, ge=1, le=100), db=self.db_dependency):
+            """
+            Get the apps with a name that starts with q, followed by the apps with a word in their name that starts with q.
+            Fast enough to call on every keystroke in the search box.
+
+            :param q: The typed (start of the) name.
+            :param limit: The maximum amount of apps.
+            :return: List of apps with their id, name and header_image.
+            """
+            return [app._asdict() for app in get_name_index(db).autocomplete(q, limit)]
+
         @self.app.get("/app/similar/{target_name}")
+        @run_in(cpu_executor)
         def most_similar_named_app(target_name: str, db=self.db_dependency):
             """
             Helper function to find the most similar named app in the database.
+            Only the apps with the most trigrams in common with the name are scored. With FUZZY_PROCESSES above 1 and
+            at least FUZZY_PARALLEL_THRESHOLD apps every app is scored in worker processes, so the result can be a
+            more similar app. Not right after a change of the apps: the worker processes are started again with the
+            new names at most once per FUZZY_POOL_REBUILD_DELAY seconds.
 
             :param target_name: The name of the app to find the most similar named app for.
             :param db: The database dependency.
@@ -361,48 +389,24 @@ class API:
                     return {"id": app.id, "name": app.name, "header_image": app.header_image, "similarity": 100}
                 return None
 
-            apps = db.query(models.App).with_entities(models.App.id, models.App.name, models.App.header_image).all()
-            most_similar_app, similarity = _most_similar(target_name, apps, "name")
+            most_similar_app, similarity = find_most_similar_app(db, target_name)
 
             if most_similar_app:
                 return {"id": most_similar_app.id, "name": most_similar_app.name, "header_image": most_similar_app.header_image, "similarity": similarity}
 
             return None
 
-        def find_similar_named_apps(target_name: str, db):
-            """
-            Helper function to find the most similar named apps in the database.
-
-            :param target_name: The name of the app to find the most similar named apps for.
-            :param db: The database dependency.
-            :return: Dictionary of multiple apps matching the target_name with their (id, name and similarity.)
-            """
-            target_name = target_name.strip().lower()
-
-            apps = db.query(models.App).with_entities(models.App.id, models.App.name).all()
-
-            similar_apps = []
-
-            TRESHOLD = 60
-            JACCARD_TRESHOLD = 25
-
-            for app in apps:
-                levenshtein_sim = similarity_score(target_name, app.name)
-                jaccard_sim = jaccard_similarity(target_name, app.name)
-
-                if levenshtein_sim >= TRESHOLD or jaccard_sim >= JACCARD_TRESHOLD:
-                    similar_apps.append({"id": app.id, "name": app.name, "similarity": round(max(levenshtein_sim, jaccard_sim), 2)})
-
-            return sorted(similar_apps, key=lambda x: x["similarity"], reverse=True)
-
         @self.app.get("/apps/tag/{target_name}")
-        def get_apps_based_on_tag_name(target_name: str, fuzzy: bool = True, all_fields: bool = False, db=self.db_dependency):
+        @run_in(cpu_executor)
+        def get_apps_based_on_tag_name(target_name: str, fuzzy: bool = True, all_fields: bool = False, include: str = None,
+                                       db=self.db_dependency):
             """
             Get all apps based on the tag name.
 
             :param target_name: The name or id of the tag to get the apps for.
             :param fuzzy: If True, try to find the most similar named tag in the database. Using my fuzzy algorithm ^Seger.
             :param all_fields: If True, return all fields of the app, otherwise only the (id, name) of the app will be returned.
+            :param include: Comma separated relationships to add to every app, for example "tags,genres,categories".
             :return: List of apps in JSON/dictionary format.
             """
             target_name = target_name.strip()
@@ -410,7 +414,10 @@ class API:
 
             def _fetch_apps(filter_condition):
                 if all_fields:
-                    apps = db.query(models.App).join(models.AppTags).join(models.Tags).filter(filter_condition).all()
+                    apps = db.query(models.App).options(*include_options(include)).join(models.AppTags).join(models.Tags).filter(filter_condition).all()
+                elif include:
+                    apps = db.query(models.App).options(*id_and_name_options(include)).join(models.AppTags).join(models.Tags).filter(
+                        filter_condition).all()
                 else:
                     apps = db.query(models.App.id, models.App.name).join(models.AppTags).join(models.Tags).filter(
                         filter_condition).all()
@@ -428,8 +435,7 @@ class API:
 
             if fuzzy:
                 print(f"Searching for similar tag name for '{target_name}'")
-                tags = db.query(models.Tags.name).all()
-                most_similar_tag, _ = _most_similar(target_name, tags, "name")
+                most_similar_tag, _ = find_most_similar_tag(db, target_name)
                 print(f"Most similar tag for '{target_name}' is '{most_similar_tag.name}'")
                 tag = most_similar_tag.name if most_similar_tag else target_name
 
@@ -14,8 +14,71 @@ APPS_LIST_CACHE_FILE = 'cache/apps_list.json'
 ADDED_GAMES_LIST_CACHE_FILE = 'cache/added_games_list.txt'
 CACHE_EXPIRATION_TIME = 604800  # Time in seconds (604800 seconds = 1 week)
 
+# The amount of apps per transaction of the importer (see src/database/importer.py)
+IMPORT_CHUNK_SIZE = 1000
+
+# The fetcher of the store app details (see src/fetcher.py): the amount of concurrent requests, the rate limit for
+# all of them together (with bursts of FETCH_BURST requests) and the retries of the 429 and 5xx responses.
+FETCH_WORKERS = 8
+FETCH_RATE_LIMIT = 0.6  # Requests per second, the store allows about 200 app details requests per 5 minutes
+FETCH_BURST = 10
+FETCH_RETRIES = 5
+FETCH_BACKOFF = 1.0  # Time in seconds before the first retry, doubled for every next retry
+FETCH_BACKOFF_MAX = 60
+FETCH_TIMEOUT = 10
+
 BLOCKED_CONTENT_TAGS = ["NSFW", "Nudity", "Mature", "Sexual Content", "Hentai"]
 
+# How the recommendations are scored: "index" (posting lists, pure Python), "matrix" (app×tag matrix with NumPy)
+# or "lsh" (approximate, only the apps in the same MinHash/LSH buckets are scored)
+RECOMMENDATION_BACKENDS = ["index", "matrix", "lsh"]
+RECOMMENDATION_BACKEND = "index"
+
+# The amount of bands and rows per band of the MinHash signatures for the "lsh" backend.
+# With 32 bands of 3 rows the recall@10 against the exact backend is 0.996 for 10000 synthetic apps and 1.0 for 100000
+# (tests/benchmark/lsh_benchmark.py). 16 bands of 4 rows is faster, but its recall@10 is 0.838 for 10000 apps.
+LSH_BANDS = 32
+LSH_ROWS = 3
+
+# The amount of most similar apps that is precomputed per app in the app_similarities table
+SIMILARITY_TOP_K = 10
+
+# The recommendations of the most recently selected games are cached, until the apps or their tags change.
+RECOMMENDATION_CACHE_SIZE = 1024
+RECOMMENDATION_CACHE_TTL = 3600  # Time in seconds
+
+# The fuzzy app name search only scores the apps with the most trigrams (3 characters) in common with the search
+FUZZY_CANDIDATES = 200
+
+# With more than 1 process, the fuzzy app name search scores every app name, in parallel worker processes.
+# That is a different search: it does not only score the FUZZY_CANDIDATES apps, so it can find a more similar app.
+# Only when there are at least FUZZY_PARALLEL_THRESHOLD apps, for fewer apps starting the processes is not worth it.
+FUZZY_PROCESSES = 0
+FUZZY_PARALLEL_THRESHOLD = 50000
+# After a change of the apps the worker processes are started again with the new names, at most once per
+# FUZZY_POOL_REBUILD_DELAY seconds. Until then the searches only score the FUZZY_CANDIDATES apps, in the API process.
+FUZZY_POOL_REBUILD_DELAY = 60  # Time in seconds
+
+# The results of the most recent fuzzy searches (app, developer and tag names) are cached, until the names change.
+FUZZY_CACHE_SIZE = 4096
+
+# The connection pool of the database engine (see make_engine in src/database/database.py):
+# "queue" keeps DB_POOL_SIZE connections open, with up to DB_MAX_OVERFLOW extra connections when they are all in use,
+# "null" opens a new connection for every session and "static" shares one connection between all sessions.
+# By default an in-memory SQLite database uses "static" (every connection would have its own empty database), others "queue".
+DB_POOL_CLASSES = ["queue", "null", "static"]
+DB_POOL_CLASS = None
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_POOL_TIMEOUT = 30  # Time in seconds to wait for a free connection
+DB_POOL_PRE_PING = True  # Test a connection before it is used, so connections closed by the database are replaced
+DB_POOL_RECYCLE = 1800  # Time in seconds after which a connection is replaced, -1 to never replace them
+
+# The amount of threads for the blocking work of the endpoints (see src/executors.py): "db" for the cheap database
+# reads and writes, "cpu" for the fuzzy searches and recommendations. Keep the db threads below the pool connections.
+DB_EXECUTOR_WORKERS = 15
+CPU_EXECUTOR_WORKERS = 4
+
 load_dotenv()
 
 def fetch_from_api(endpoint):
@@ -62,7 +125,11 @@ def set_host():
 
 def handle_specific_env_vars(key, value):
     """Handle specific environment variables with custom logic."""
-    global API_HOST_URL, API_HOST_PORT
+    global API_HOST_URL, API_HOST_PORT, RECOMMENDATION_BACKEND, LSH_BANDS, LSH_ROWS, FUZZY_PROCESSES
+    global FUZZY_POOL_REBUILD_DELAY
+    global DB_POOL_CLASS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE
+    global DB_EXECUTOR_WORKERS, CPU_EXECUTOR_WORKERS, IMPORT_CHUNK_SIZE, FETCH_WORKERS, FETCH_RATE_LIMIT, FETCH_RETRIES
+    global FETCH_BURST, FETCH_BACKOFF, FETCH_BACKOFF_MAX, FETCH_TIMEOUT
     if key == "API_HOST_URL":
         API_HOST_URL = value
     elif key == "API_HOST_PORT":
@@ -71,6 +138,128 @@ def handle_specific_env_vars(key, value):
         except ValueError:
             print(f"Invalid API_HOST_PORT value. Using default port 8000.")
             API_HOST_PORT = 8000
+    elif key == "RECOMMENDATION_BACKEND":
+        if value.lower() in RECOMMENDATION_BACKENDS:
+            RECOMMENDATION_BACKEND = value.lower()
+        else:
+            print(f"Invalid RECOMMENDATION_BACKEND value. Using default backend \"index\".")
+            RECOMMENDATION_BACKEND = "index"
+    elif key == "LSH_BANDS":
+        try:
+            LSH_BANDS = max(1, int(value))
+        except ValueError:
+            print(f"Invalid LSH_BANDS value. Using default 32 bands.")
+            LSH_BANDS = 32
+    elif key == "LSH_ROWS":
+        try:
+            LSH_ROWS = max(1, int(value))
+        except ValueError:
+            print(f"Invalid LSH_ROWS value. Using default 3 rows per band.")
+            LSH_ROWS = 3
+    elif key == "FUZZY_PROCESSES":
+        try:
+            FUZZY_PROCESSES = max(0, int(value))
+        except ValueError:
+            print(f"Invalid FUZZY_PROCESSES value. Using default 0 (no worker processes).")
+            FUZZY_PROCESSES = 0
+    elif key == "FUZZY_POOL_REBUILD_DELAY":
+        try:
+            FUZZY_POOL_REBUILD_DELAY = max(0.0, float(value))
+        except ValueError:
+            print(f"Invalid FUZZY_POOL_REBUILD_DELAY value. Using default 60 seconds.")
+            FUZZY_POOL_REBUILD_DELAY = 60
+    elif key == "DB_POOL_CLASS":
+        if value.lower() in DB_POOL_CLASSES:
+            DB_POOL_CLASS = value.lower()
+        else:
+            print(f"Invalid DB_POOL_CLASS value. Using the default pool for the database.")
+            DB_POOL_CLASS = None
+    elif key == "DB_POOL_SIZE":
+        try:
+            DB_POOL_SIZE = max(1, int(value))
+        except ValueError:
+            print(f"Invalid DB_POOL_SIZE value. Using default 5 connections.")
+            DB_POOL_SIZE = 5
+    elif key == "DB_MAX_OVERFLOW":
+        try:
+            DB_MAX_OVERFLOW = max(0, int(value))
+        except ValueError:
+            print(f"Invalid DB_MAX_OVERFLOW value. Using default 10 connections.")
+            DB_MAX_OVERFLOW = 10
+    elif key == "DB_POOL_TIMEOUT":
+        try:
+            DB_POOL_TIMEOUT = max(0.0, float(value))
+        except ValueError:
+            print(f"Invalid DB_POOL_TIMEOUT value. Using default 30 seconds.")
+            DB_POOL_TIMEOUT = 30
+    elif key == "DB_POOL_PRE_PING":
+        DB_POOL_PRE_PING = value.lower() not in ("0", "false", "no", "off")
+    elif key == "DB_POOL_RECYCLE":
+        try:
+            DB_POOL_RECYCLE = int(value)
+        except ValueError:
+            print(f"Invalid DB_POOL_RECYCLE value. Using default 1800 seconds.")
+            DB_POOL_RECYCLE = 1800
+    elif key == "DB_EXECUTOR_WORKERS":
+        try:
+            DB_EXECUTOR_WORKERS = max(1, int(value))
+        except ValueError:
+            print(f"Invalid DB_EXECUTOR_WORKERS value. Using default 15 threads.")
+            DB_EXECUTOR_WORKERS = 15
+    elif key == "CPU_EXECUTOR_WORKERS":
+        try:
+            CPU_EXECUTOR_WORKERS = max(1, int(value))
+        except ValueError:
+            print(f"Invalid CPU_EXECUTOR_WORKERS value. Using default 4 threads.")
+            CPU_EXECUTOR_WORKERS = 4
+    elif key == "IMPORT_CHUNK_SIZE":
+        try:
+            IMPORT_CHUNK_SIZE = max(1, int(value))
+        except ValueError:
+            print(f"Invalid IMPORT_CHUNK_SIZE value. Using default 1000 apps.")
+            IMPORT_CHUNK_SIZE = 1000
+    elif key == "FETCH_WORKERS":
+        try:
+            FETCH_WORKERS = max(1, int(value))
+        except ValueError:
+            print(f"Invalid FETCH_WORKERS value. Using default 8 workers.")
+            FETCH_WORKERS = 8
+    elif key == "FETCH_RATE_LIMIT":
+        try:
+            FETCH_RATE_LIMIT = max(0.01, float(value))
+        except ValueError:
+            print(f"Invalid FETCH_RATE_LIMIT value. Using default 0.6 requests per second.")
+            FETCH_RATE_LIMIT = 0.6
+    elif key == "FETCH_RETRIES":
+        try:
+            FETCH_RETRIES = max(0, int(value))
+        except ValueError:
+            print(f"Invalid FETCH_RETRIES value. Using default 5 retries.")
+            FETCH_RETRIES = 5
+    elif key == "FETCH_BURST":
+        try:
+            FETCH_BURST = max(1, int(value))
+        except ValueError:
+            print(f"Invalid FETCH_BURST value. Using default 10 requests.")
+            FETCH_BURST = 10
+    elif key == "FETCH_BACKOFF":
+        try:
+            FETCH_BACKOFF = max(0.0, float(value))
+        except ValueError:
+            print(f"Invalid FETCH_BACKOFF value. Using default 1 second.")
+            FETCH_BACKOFF = 1.0
+    elif key == "FETCH_BACKOFF_MAX":
+        try:
+            FETCH_BACKOFF_MAX = max(0.0, float(value))
+        except ValueError:
+            print(f"Invalid FETCH_BACKOFF_MAX value. Using default 60 seconds.")
+            FETCH_BACKOFF_MAX = 60
+    elif key == "FETCH_TIMEOUT":
+        try:
+            FETCH_TIMEOUT = max(0.1, float(value))
+        except ValueError:
+            print(f"Invalid FETCH_TIMEOUT value. Using default 10 seconds.")
+            FETCH_TIMEOUT = 10
 
 
 
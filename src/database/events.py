@@ -0,0 +1,85 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Every table gets a version number that is raised after a commit that changed rows in that table.
+# In-memory indexes (for example the tag index of the recommendations) store the version they were built with,
+# and rebuild themselves when the version has changed.
+_TABLE_VERSIONS = defaultdict(int)
+_SUBSCRIBERS = defaultdict(list)
+_lock = threading.Lock()
+
+
+def table_version(*tablenames):
+    """Get the combined version of the given tables.
+
+    :param tablenames: The names of the tables, for example "apps" or "app_tags".
+    :return: (int) A number that only goes up, and changes whenever one of the tables changed.
+    """
+    with _lock:
+        return sum(_TABLE_VERSIONS[tablename] for tablename in tablenames)
+
+
+def subscribe(tablename, callback):
+    """Call the callback after every commit that changed rows in the table.
+
+    :param tablename: The name of the table, for example "app_tags".
+    :param callback: Function called with the set of primary keys (tuples) of the changed rows,
+        or None when it is unknown which rows changed. Keep it cheap, it runs inside the commit of the session.
+    """
+    _SUBSCRIBERS[tablename].append(callback)
+
+
+def mark_changed(tablename, primary_keys=None):
+    """Raise the version of the table and notify the subscribers.
+    Use this after writing to the database without the ORM session.
+
+    :param tablename: The name of the changed table.
+    :param primary_keys: Set with the primary keys (tuples) of the changed rows, None when unknown.
+    """
+    with _lock:
+        _TABLE_VERSIONS[tablename] += 1
+        callbacks = list(_SUBSCRIBERS[tablename])
+
+    for callback in callbacks:
+        callback(primary_keys)
+
+
+def _pending_rows(session):
+    return session.info.setdefault("changed_rows", {})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_rows(session, flush_context):
+    """Remember which rows are touched by the flush, they are only marked as changed after the commit."""
+    pending_rows = _pending_rows(session)
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(instance, "__table__", None)
+        if table is None:
+            continue
+
+        primary_key = tuple(inspect(instance).mapper.primary_key_from_instance(instance))
+        rows = pending_rows.setdefault(table.name, set())
+        if rows is not None:
+            rows.add(primary_key)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    """Also remember the tables of insert, update and delete statements executed with session.execute().
+    The changed rows of these statements are unknown."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _pending_rows(orm_execute_state.session)[orm_execute_state.statement.table.name] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_rows(session):
+    for tablename, primary_keys in session.info.pop("changed_rows", {}).items():
+        mark_changed(tablename, primary_keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_rows(session):
+    session.info.pop("changed_rows", None)
@@ -0,0 +1,286 @@
+"""
+Imports the Steam catalog from the cache files into the database, in chunks of IMPORT_CHUNK_SIZE apps.
+
+Run `python -m src.database.importer [file]`, the file is APPS_LIST_CACHE_FILE by default. It can be:
+- The response of ISteamApps/GetAppList ({"applist": {"apps": [{"appid": ..., "name": ...}]}}), only the names.
+- A dump of store app details responses, as one JSON object ({"<appid>": {"success": true, "data": {...}}}) or as
+  JSON Lines (a .jsonl file, one response per line, read line by line). These also fill in the descriptions, prices,
+  images, genres and categories.
+
+Every chunk is one transaction, with multi-row inserts and executemany updates instead of ORM objects one at a time.
+The existing rows of a chunk are read first, so only the new and changed apps are written.
+After every chunk the ids of its apps are appended to the checkpoint of the file, an interrupted import skips those
+when it is started again. Every file has its own checkpoint (see checkpoint_path()), so the apps imported from the
+names-only apps list are not skipped by an import of the details. It expires after CACHE_EXPIRATION_TIME, or start over
+with --restart.
+Run `python -m src.database.similarities` after a big import, to rebuild the precomputed similar apps.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import and_, bindparam, delete, insert, select, update
+
+import src.config as config
+import src.database.models as models
+from src.database.events import mark_changed
+
+ImportedApp = namedtuple("ImportedApp", ["row", "genres", "categories"])
+ImportResult = namedtuple("ImportResult", ["read", "skipped", "inserted", "updated"])
+
+# The association table of the genres and categories of the apps, and the column with the id of the genre or category
+LINKS = {
+    "genres": (models.Genre, models.AppGenre, models.AppGenre.genre_id),
+    "categories": (models.Category, models.AppCategory, models.AppCategory.category_id),
+}
+
+
+def read_entries(path):
+    """Read the entries of an apps list or store app details file.
+
+    :param path: Path of a .json file, or a .jsonl file with one entry per line.
+    :return: Generator of the entries (dictionaries), in the order of the file.
+    """
+    with open(path, encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(file)
+
+    if isinstance(data, dict) and "applist" in data:
+        yield from data["applist"]["apps"]
+    elif isinstance(data, dict):
+        yield from data.values()
+    else:
+        yield from data
+
+
+def parse_entry(entry):
+    """Convert an entry of the apps list or a store app details response to the columns of the apps table.
+
+    :return: ImportedApp with the row of the app, and lists with the (id, name) of its genres and categories.
+        The genres and categories are None for the apps list, it doesn't have them. None when the entry has no app.
+    """
+    if "data" in entry or "success" in entry:
+        if not entry.get("success") or not entry.get("data"):
+            return None
+        entry = entry["data"]
+
+    if "steam_appid" not in entry:
+        # GetAppList, many apps in it have no name
+        if not entry.get("appid") or not entry.get("name"):
+            return None
+        return ImportedApp({"id": int(entry["appid"]), "name": entry["name"]}, None, None)
+
+    if entry.get("is_free"):
+        price = "Free"
+    else:
+        price = (entry.get("price_overview") or {}).get("final_formatted")
+
+    row = {
+        "id": int(entry["steam_appid"]),
+        "name": entry.get("name"),
+        "short_description": entry.get("short_description"),
+        "price": price,
+        "developer": ", ".join(entry.get("developers") or []) or None,
+        "header_image": entry.get("header_image"),
+        "background_image": entry.get("background"),
+    }
+    genres = [(int(genre["id"]), genre["description"]) for genre in entry.get("genres") or []]
+    categories = [(int(category["id"]), category["description"]) for category in entry.get("categories") or []]
+    return ImportedApp(row, genres, categories)
+
+
+def checkpoint_path(source):
+    """The path of the checkpoint of the imports from a source, ADDED_GAMES_LIST_CACHE_FILE with the name of the source.
+
+    :param source: The imported file, or another name of the source of the apps.
+    :return: The path, for example "cache/added_games_list.apps_list.txt" for "cache/apps_list.json".
+    """
+    base, extension = os.path.splitext(config.ADDED_GAMES_LIST_CACHE_FILE)
+    name = os.path.splitext(os.path.basename(source))[0]
+    return f"{base}.{name}{extension}"
+
+
+class Checkpoint:
+    """The ids of the apps that are already imported from one source, in a text file with one id per line."""
+
+    def __init__(self, path, expiration_time=None):
+        """
+        :param path: The path of the file, see checkpoint_path().
+        :param expiration_time: Time in seconds after which the file is ignored, CACHE_EXPIRATION_TIME by default.
+        """
+        self.path = path
+        self.expiration_time = expiration_time or config.CACHE_EXPIRATION_TIME
+        self._lock = threading.Lock()  # The fetcher adds ids from two threads
+
+    def load(self):
+        """:return: Set with the ids in the file, empty when there is no file or it is expired."""
+        try:
+            if time.time() - os.path.getmtime(self.path) > self.expiration_time:
+                return set()
+            with open(self.path, encoding="utf-8") as file:
+                return {int(line) for line in file if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def add(self, app_ids):
+        """Append the ids to the file."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.writelines(f"{app_id}\n" for app_id in app_ids)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _import_links(connection, apps, name, changed):
+    """Add the missing genres (or categories) and make the links of the apps the same as in the import."""
+    model, link_model, column = LINKS[name]
+    link_table = link_model.__table__
+    apps = [app for app in apps if getattr(app, name) is not None]
+    if not apps:
+        return
+
+    names = {item_id: item_name for app in apps for item_id, item_name in getattr(app, name)}
+    existing_ids = set(connection.scalars(select(model.id).where(model.id.in_(names))))
+    new_items = [{"id": item_id, "name": item_name} for item_id, item_name in names.items() if item_id not in existing_ids]
+    if new_items:
+        connection.execute(insert(model), new_items)
+        changed.setdefault(model.__tablename__, set()).update((item["id"],) for item in new_items)
+
+    app_ids = [app.row["id"] for app in apps]
+    existing_links = set(connection.execute(
+        select(link_table.c.app_id, column).where(link_table.c.app_id.in_(app_ids))
+    ).tuples())
+    links = {(app.row["id"], item_id) for app in apps for item_id, _ in getattr(app, name)}
+
+    removed, added = existing_links - links, links - existing_links
+    if removed:
+        connection.execute(
+            delete(link_table).where(and_(link_table.c.app_id == bindparam("b_app_id"), column == bindparam("b_id"))),
+            [{"b_app_id": app_id, "b_id": item_id} for app_id, item_id in removed]
+        )
+    if added:
+        connection.execute(insert(link_table), [{"app_id": app_id, column.key: item_id} for app_id, item_id in added])
+    if removed or added:
+        changed.setdefault(link_table.name, set()).update(removed | added)
+
+
+def import_chunk(connection, apps):
+    """Write the new and changed apps of the chunk, the apps that are the same in the database are not touched.
+
+    :param connection: The connection, in the transaction of the chunk.
+    :param apps: List of ImportedApp with different ids, from the apps list and store app details mixed.
+    :return: (inserted, updated, changed) The amount of inserted and updated apps, and a dictionary with the name
+        of every changed table -> set with the primary keys of its changed rows, for mark_changed().
+    """
+    table = models.App.__table__
+    # An app without a name (in the store app details) keeps the name it has in the database, it isn't set to NULL
+    rows = [{key: value for key, value in app.row.items() if key != "name" or value is not None} for app in apps]
+    columns = [table.c[key] for key in dict.fromkeys(key for row in rows for key in row)]
+    existing = {row["id"]: row for row in connection.execute(
+        select(*columns).where(table.c.id.in_([row["id"] for row in rows]))
+    ).mappings()}
+
+    # The apps list only has the names, so the rows are written in groups with the same columns
+    new_rows, changed_rows = defaultdict(list), defaultdict(list)
+    for row in rows:
+        stored = existing.get(row["id"])
+        if stored is None:
+            new_rows[tuple(row)].append(row)
+        elif any(stored[key] != value for key, value in row.items()):
+            changed_rows[tuple(row)].append({"b_id": row["id"], **{key: value for key, value in row.items() if key != "id"}})
+
+    for group in new_rows.values():
+        connection.execute(insert(table), group)
+    for group in changed_rows.values():
+        # Without values(), the SET clause has the columns of the parameters
+        connection.execute(update(table).where(table.c.id == bindparam("b_id")), group)
+
+    inserted = [(row["id"],) for group in new_rows.values() for row in group]
+    updated = [(row["b_id"],) for group in changed_rows.values() for row in group]
+    changed = {}
+    if inserted or updated:
+        changed[table.name] = set(inserted) | set(updated)
+    for name in LINKS:
+        _import_links(connection, apps, name, changed)
+    return len(inserted), len(updated), changed
+
+
+def import_apps(engine, entries, checkpoint=None, chunk_size=None):
+    """Import the entries into the database, one transaction per chunk.
+
+    :param engine: The engine of the database.
+    :param entries: Iterable with the entries of an apps list or store app details file, see read_entries().
+    :param checkpoint: Optional Checkpoint, the apps in it are skipped and the imported apps are added to it.
+    :param chunk_size: The amount of apps per transaction, IMPORT_CHUNK_SIZE by default.
+    :return: ImportResult with the amount of read, skipped (in the checkpoint), inserted and updated apps.
+    """
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    done = checkpoint.load() if checkpoint else set()
+    read = skipped = inserted = updated = 0
+
+    def write(chunk):
+        nonlocal inserted, updated
+        with engine.begin() as connection:
+            chunk_inserted, chunk_updated, changed = import_chunk(connection, list(chunk.values()))
+        inserted, updated = inserted + chunk_inserted, updated + chunk_updated
+        if checkpoint:
+            checkpoint.add(chunk)
+        done.update(chunk)
+        # Written without the ORM session, so the in-memory indexes have to be told which rows changed
+        for tablename, primary_keys in changed.items():
+            mark_changed(tablename, primary_keys)
+
+    chunk = {}  # app id -> ImportedApp, the last entry of an app in the chunk wins
+    for entry in entries:
+        app = parse_entry(entry)
+        if app is None:
+            continue
+        read += 1
+        if app.row["id"] in done:
+            skipped += 1
+            continue
+
+        chunk[app.row["id"]] = app
+        if len(chunk) >= chunk_size:
+            write(chunk)
+            chunk = {}
+    if chunk:
+        write(chunk)
+
+    return ImportResult(read, skipped, inserted, updated)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Import the Steam apps list or store app details into the database.")
+    parser.add_argument("file", nargs="?", default=config.APPS_LIST_CACHE_FILE,
+                        help="The apps list or store app details file (.json or .jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=config.IMPORT_CHUNK_SIZE, help="Apps per transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore the apps that are already imported from the file")
+    args = parser.parse_args(args)
+
+    from src.database.database import Engine
+
+    models.Base.metadata.create_all(bind=Engine)
+
+    checkpoint = Checkpoint(checkpoint_path(args.file))
+    if args.restart:
+        checkpoint.clear()
+
+    result = import_apps(Engine, read_entries(args.file), checkpoint, args.chunk_size)
+    print(f"Imported {result.read} apps from {args.file}: {result.inserted} new, {result.updated} changed, "
+          f"{result.skipped} skipped (already imported).")
+
+
+if __name__ == "__main__":
+    main()
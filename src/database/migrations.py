@@ -0,0 +1,49 @@
+"""
+Changes to the schema of an existing database that create_all can't make, it only creates missing tables (with their
+indexes), not the missing indexes of existing tables.
+
+The migration is an explicit step, it does not run when the API starts. Run it once after deploying a new version:
+
+    python -m src.database.migrations
+
+Every statement can run again on a migrated or new database without changing anything.
+"""
+from sqlalchemy import text
+
+import src.database.models as models
+
+# The indexes that no query uses (see tests/benchmark/query_plans.py), they only make inserts and updates slower.
+# ix_*_id: the integer primary key is already the index of the rowid.
+# ix_app_*_app_id: the composite primary key (app_id, ...) is already an index on app_id.
+# The indexes on genre_id and category_id are kept for the reverse lookups (the apps of a genre or category), the
+# plans of the small seeded database say nothing about those on the full catalog.
+DROPPED_INDEXES = [
+    "ix_apps_id", "ix_apps_short_description", "ix_apps_price", "ix_apps_header_image", "ix_apps_background_image",
+    "ix_categories_id", "ix_genres_id", "ix_tags_id",
+    "ix_app_categories_app_id", "ix_app_genres_app_id", "ix_app_tags_app_id",
+]
+
+
+def migrate(engine):
+    """Migrate the schema of the database to the models: drop the unused indexes and create the missing ones.
+
+    :param engine: The engine of the database.
+    """
+    with engine.begin() as connection:
+        for index in DROPPED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def main():
+    from src.database.database import Engine
+
+    models.Base.metadata.create_all(bind=Engine)
+    migrate(Engine)
+    print(f"Migrated the database, dropped the unused indexes: {', '.join(DROPPED_INDEXES)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,39 @@
 from sqlalchemy import Column, ForeignKey, Integer, String, PrimaryKeyConstraint
+from sqlalchemy.orm import relationship
 from src.database.database import Base
 
+# Only the indexes the queries use, the composite primary keys are already indexes on their first column.
+# The indexes that are dropped from existing databases are in src/database/migrations.py.
 class App(Base):
     __tablename__ = "apps"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
 
-    short_description = Column(String, index=True)
-    price = Column(String, index=True)
+    short_description = Column(String)
+    price = Column(String)
     developer = Column(String, index=True)
-    header_image = Column(String, index=True)
-    background_image = Column(String, index=True)
+    header_image = Column(String)
+    background_image = Column(String)
+
+    # Read-only, the links are still added and removed with the AppTags, AppGenre and AppCategory rows.
+    # Not loaded by default, load them for many apps at once with query.options(selectinload(App.tags)).
+    tags = relationship("Tags", secondary="app_tags", order_by="Tags.id", viewonly=True)
+    genres = relationship("Genre", secondary="app_genres", order_by="Genre.id", viewonly=True)
+    categories = relationship("Category", secondary="app_categories", order_by="Category.id", viewonly=True)
 
 class Category(Base):
     __tablename__ = "categories"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
 
 
 class AppCategory(Base):
     __tablename__ = "app_categories"
 
-    app_id = Column(Integer, ForeignKey("apps.id"), index=True)
-    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
+    app_id = Column(Integer, ForeignKey("apps.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)  # The apps of a category
 
     __table_args__ = (
         PrimaryKeyConstraint("app_id", "category_id"),  # Composite primary key
@@ -33,14 +42,14 @@ class AppCategory(Base):
 class Genre(Base):
     __tablename__ = "genres"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
 
 class AppGenre(Base):
     __tablename__ = "app_genres"
 
-    app_id = Column(Integer, ForeignKey("apps.id"), index=True)
-    genre_id = Column(Integer, ForeignKey("genres.id"), index=True)
+    app_id = Column(Integer, ForeignKey("apps.id"))
+    genre_id = Column(Integer, ForeignKey("genres.id"), index=True)  # The apps of a genre
 
     __table_args__ = (
         PrimaryKeyConstraint("app_id", "genre_id"),  # Composite primary key
@@ -49,15 +58,28 @@ class AppGenre(Base):
 class Tags(Base):
     __tablename__ = "tags"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
 
 class AppTags(Base):
     __tablename__ = "app_tags"
 
-    app_id = Column(Integer, ForeignKey("apps.id"), index=True)
+    app_id = Column(Integer, ForeignKey("apps.id"))
     tag_id = Column(Integer, ForeignKey("tags.id"), index=True)
 
     __table_args__ = (
         PrimaryKeyConstraint("app_id", "tag_id"),  # Composite primary key
-    )
\ No newline at end of file
+    )
+
+class AppSimilarity(Base):
+    """The precomputed most similar apps of every app, filled by src/database/similarities.py"""
+    __tablename__ = "app_similarities"
+
+    app_id = Column(Integer, ForeignKey("apps.id"))
+    rank = Column(Integer)
+    similar_app_id = Column(Integer, ForeignKey("apps.id"), index=True)
+    score = Column(Integer)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("app_id", "rank"),  # Composite primary key, also the index to look up the ranking
+    )
@@ -0,0 +1,225 @@
+"""
+Precomputes the most similar apps of every app into the app_similarities table, so a recommendation is one lookup.
+
+Run `python -m src.database.similarities` to (re)build the whole table, for example after an import.
+After that, only the apps affected by changes in the app_tags table are recomputed, in a background thread with its
+own database session. The recommendations keep serving the stored rows until the refresh is done.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, insert
+
+import src.config as config
+import src.database.models as models
+from src.algoritmes.recommendations import get_tag_index, similarity_percentage
+from src.database.database import SessionLocal
+from src.database.events import subscribe
+
+CHUNK_SIZE = 500  # Maximum amount of ids in one IN (...) query
+
+# The apps with changed tags since the last refresh, None when it is unknown which apps changed.
+_stale_app_ids = set()
+_refresh_scheduled = False
+_stale_lock = threading.Lock()
+# One thread, so the refreshes run one after the other
+_refresh_executor = ThreadPoolExecutor(1, thread_name_prefix="similarities-refresh")
+
+
+def _on_app_tags_changed(primary_keys):
+    """Remember the apps of the changed app_tags rows, the primary key of app_tags is (app_id, tag_id)."""
+    global _stale_app_ids
+
+    with _stale_lock:
+        if primary_keys is None:
+            _stale_app_ids = None
+        elif _stale_app_ids is not None:
+            _stale_app_ids.update(app_id for app_id, _ in primary_keys)
+    schedule_refresh()
+
+
+subscribe(models.AppTags.__tablename__, _on_app_tags_changed)
+
+
+def schedule_refresh():
+    """Run refresh_stale_similarities in the background, one refresh for all changes made before it starts.
+
+    :return: The Future of the refresh, or None when a refresh is already waiting to start.
+    """
+    global _refresh_scheduled
+
+    with _stale_lock:
+        if _refresh_scheduled:
+            return None
+        _refresh_scheduled = True
+    return _refresh_executor.submit(_refresh_in_background)
+
+
+def _refresh_in_background():
+    global _refresh_scheduled
+
+    with _stale_lock:
+        _refresh_scheduled = False  # The changes from now on schedule the next refresh
+
+    db = SessionLocal()
+    try:
+        refresh_stale_similarities(db)
+    except Exception as error:
+        print(f"Error recomputing the similar apps, trying again after the next change: {error!r}")
+    finally:
+        db.close()
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def build_similarities(db, app_ids=None, top_k=None):
+    """(Re)compute the most similar apps for the given apps and store them in the app_similarities table.
+
+    :param db: The database session.
+    :param app_ids: The apps to compute, None for every app with tags.
+    :param top_k: The amount of similar apps to store per app, default is SIMILARITY_TOP_K from the config.
+    :return: (int) The amount of computed apps.
+    """
+    top_k = top_k or config.SIMILARITY_TOP_K
+    index = get_tag_index(db)
+
+    if app_ids is None:
+        app_ids = [row.app_id for row in db.query(models.AppTags.app_id).distinct()]
+        db.query(models.AppSimilarity).delete(synchronize_session=False)
+    else:
+        for chunk in _chunks(app_ids):
+            db.query(models.AppSimilarity).filter(models.AppSimilarity.app_id.in_(chunk)).delete(synchronize_session=False)
+
+    for chunk in _chunks(app_ids):
+        rows = [
+            {"app_id": app_id, "rank": rank, "similar_app_id": similar_app_id, "score": score}
+            for app_id in chunk
+            for rank, (similar_app_id, score) in enumerate(index.similar(index.tags_of(app_id), top_k, exclude=app_id))
+        ]
+        if rows:
+            db.execute(insert(models.AppSimilarity), rows)
+
+    db.commit()
+    return len(app_ids)
+
+
+def affected_app_ids(db, changed_app_ids, top_k=None):
+    """Find the apps whose stored similar apps can be different, after the tags of the changed apps changed.
+
+    These are the changed apps themselves, the apps that have a changed app in their stored list,
+    and the apps for which a changed app now scores high enough to enter their list.
+
+    :param db: The database session.
+    :param changed_app_ids: The apps with changed tags.
+    :param top_k: The amount of similar apps stored per app, default is SIMILARITY_TOP_K from the config.
+    :return: Set with the app ids to recompute.
+    """
+    top_k = top_k or config.SIMILARITY_TOP_K
+    index = get_tag_index(db)
+    affected = set(changed_app_ids)
+
+    for chunk in _chunks(changed_app_ids):
+        rows = db.query(models.AppSimilarity.app_id).filter(models.AppSimilarity.similar_app_id.in_(chunk)).distinct()
+        affected.update(row.app_id for row in rows)
+
+    # The new score of a changed app for every app it shares a tag with. (Relative to the tags of that other app)
+    new_scores = {}
+    for changed_app_id in changed_app_ids:
+        for app_id, count in index.common_tag_counts(index.tags_of(changed_app_id), exclude=changed_app_id).items():
+            if app_id not in affected:
+                score = similarity_percentage(count, len(index.tags_of(app_id)))
+                new_scores[app_id] = max(score, new_scores.get(app_id, 0))
+
+    for chunk in _chunks(new_scores):
+        stored = (
+            db.query(models.AppSimilarity.app_id, func.count(), func.min(models.AppSimilarity.score))
+            .filter(models.AppSimilarity.app_id.in_(chunk))
+            .group_by(models.AppSimilarity.app_id)
+        )
+        for app_id, amount, lowest_score in stored:
+            if amount < top_k or new_scores[app_id] >= lowest_score:
+                affected.add(app_id)
+
+    return affected
+
+
+def refresh_stale_similarities(db):
+    """Recompute the stored similar apps that are affected by the app_tags changes since the last refresh.
+    Runs in the background after the changes, see schedule_refresh.
+
+    Nothing is computed when the table was never built, the recommendations are then computed live.
+    When it is unknown which apps changed, the table is emptied until it is built again.
+
+    :param db: The database session.
+    """
+    global _stale_app_ids
+
+    with _stale_lock:
+        changed_app_ids, _stale_app_ids = _stale_app_ids, set()
+
+    if changed_app_ids is not None and not changed_app_ids:
+        return
+
+    try:
+        if db.query(models.AppSimilarity.app_id).first() is None:
+            return
+
+        if changed_app_ids is None:
+            print("Unknown changes in the app tags, clearing the precomputed similar apps.")
+            db.query(models.AppSimilarity).delete(synchronize_session=False)
+            db.commit()
+            return
+
+        amount = build_similarities(db, affected_app_ids(db, changed_app_ids))
+        print(f"Recomputed the similar apps of {amount} apps after tag changes in {len(changed_app_ids)} apps.")
+    except Exception:
+        # Try again on the next refresh
+        db.rollback()
+        with _stale_lock:
+            if changed_app_ids is None or _stale_app_ids is None:
+                _stale_app_ids = None
+            else:
+                _stale_app_ids |= changed_app_ids
+        raise
+
+
+def stored_similar_apps(db, app_id, amount):
+    """Get the most similar apps of an app from the app_similarities table.
+    Only reads, while a refresh after tag changes runs in the background these are the last stored similar apps.
+
+    :param db: The database session.
+    :param app_id: The id of the selected app.
+    :param amount: The amount of similar apps.
+    :return: List of (app_id, similarity_score) like TagIndex.similar, or None when they are not stored.
+    """
+    if amount > config.SIMILARITY_TOP_K:
+        return None
+
+    rows = (
+        db.query(models.AppSimilarity.similar_app_id, models.AppSimilarity.score)
+        .filter(models.AppSimilarity.app_id == app_id)
+        .order_by(models.AppSimilarity.rank)
+        .limit(amount)
+        .all()
+    )
+    return [(row.similar_app_id, row.score) for row in rows] or None
+
+
+def main():
+    from src.database.database import Engine, SessionLocal
+
+    models.Base.metadata.create_all(bind=Engine)
+    db = SessionLocal()
+    try:
+        amount = build_similarities(db)
+        print(f"Stored the {config.SIMILARITY_TOP_K} most similar apps of {amount} apps.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Thread pools for the blocking work of the endpoints, instead of the one shared threadpool of FastAPI (AnyIO).
+
+The endpoints are async and run their (sync) body in one of two executors: "db" for cheap database reads and writes
+and "cpu" for the fuzzy searches and recommendations, which score many apps. The executors are sized separately,
+so a few slow searches can not take every thread from the cheap requests like /tags.
+The amount of waiting and running tasks of every executor is reported to Prometheus.
+get_async_db is the database session dependency of these endpoints.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Gauge, Histogram
+from starlette.responses import Response
+
+import src.config as config
+from src.database.database import SessionLocal
+
+executor_queue_depth = Gauge("executor_queue_depth", "Tasks waiting for a thread of the executor", ["executor"])
+executor_active = Gauge("executor_active", "Tasks running in a thread of the executor", ["executor"])
+executor_wait_seconds = Histogram("executor_wait_seconds", "Time a task waited for a thread of the executor", ["executor"])
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor with a fixed amount of threads, that reports its queue depth to Prometheus."""
+
+    def __init__(self, name, max_workers):
+        """
+        :param name: The name of the executor in the metrics, for example "db".
+        :param max_workers: The amount of threads, more tasks wait in the queue.
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f"{name}-executor")
+        self._queue_depth = executor_queue_depth.labels(executor=name)
+        self._active = executor_active.labels(executor=name)
+        self._wait_seconds = executor_wait_seconds.labels(executor=name)
+
+    async def run(self, function, *args, **kwargs):
+        """Run the blocking function in a thread of the executor, without blocking the event loop.
+
+        :return: The return value of the function.
+        """
+        submitted = time.perf_counter()
+        self._queue_depth.inc()
+
+        def call():
+            self._queue_depth.dec()
+            self._wait_seconds.observe(time.perf_counter() - submitted)
+            self._active.inc()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._active.dec()
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def iterate(self, iterator):
+        """Async iterator over a blocking iterator (for example a generator of a StreamingResponse),
+        every next item is made in the executor."""
+        done = object()
+        try:
+            while (item := await self.run(next, iterator, done)) is not done:
+                yield item
+        finally:
+            if hasattr(iterator, "close"):
+                await self.run(iterator.close)
+
+
+db_executor = BoundedExecutor("db", config.DB_EXECUTOR_WORKERS)
+cpu_executor = BoundedExecutor("cpu", config.CPU_EXECUTOR_WORKERS)
+
+
+def run_in(executor):
+    """Decorator that makes a sync endpoint async, its body runs in the executor.
+    The result is also converted to JSON data in the executor, so big responses don't block the event loop.
+    The sync function stays available as endpoint.__wrapped__.
+
+    :param executor: The BoundedExecutor, db_executor or cpu_executor.
+    """
+
+    def decorator(function):
+        def call(*args, **kwargs):
+            result = function(*args, **kwargs)
+            return result if isinstance(result, Response) else jsonable_encoder(result)
+
+        @functools.wraps(function)
+        async def endpoint(*args, **kwargs):
+            return await executor.run(call, *args, **kwargs)
+
+        return endpoint
+
+    return decorator
+
+
+async def get_async_db():
+    """Async version of get_db, for the async endpoints that run their work in an executor.
+    Making the session doesn't connect yet, closing it (and returning its connection to the pool) runs in the db executor.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await db_executor.run(db.close)
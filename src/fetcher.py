@@ -0,0 +1,279 @@
+"""
+Fetches the store app details of many Steam apps concurrently, and streams them into the database with the importer.
+
+config.fetch_from_api makes one request at a time, each with a new connection. Here FETCH_WORKERS requests run at the
+same time on one httpx.AsyncClient, which keeps the connections to the store open. A token bucket limits the rate to
+FETCH_RATE_LIMIT requests per second for all workers together, and the 429 (too many requests) and 5xx responses are
+retried with exponential backoff. A 429 also pauses the other workers.
+The fetched details go through a bounded queue to a writer thread, which imports them in chunks with import_apps().
+When the database is slower than the store, the fetching waits for the writer.
+
+Run `python -m src.fetcher` to fetch the details of the apps in APPS_LIST_CACHE_FILE (fetched from the Steam API when
+it is missing or older than CACHE_EXPIRATION_TIME). The fetcher has its own checkpoint, STORE_APP_DETAILS_SOURCE, with
+the imported apps and the apps the store has no details of ({"success": false}), those are skipped the next time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import src.config as config
+from src.database.importer import Checkpoint, checkpoint_path, import_apps, parse_entry, read_entries
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+STORE_APP_DETAILS_SOURCE = "store_app_details"  # The name of the checkpoint of the fetcher, see checkpoint_path()
+
+FetchResult = namedtuple("FetchResult", ["imported", "failed", "unavailable"])
+
+_DONE = object()
+
+
+class TokenBucket:
+    """Rate limiter for the requests of all workers: a request takes a token, the tokens come back at a fixed rate."""
+
+    def __init__(self, rate=None, capacity=None):
+        """
+        :param rate: The amount of tokens per second, FETCH_RATE_LIMIT by default.
+        :param capacity: The maximum amount of tokens, so the amount of requests in a burst. FETCH_BURST by default.
+        """
+        self.rate = rate or config.FETCH_RATE_LIMIT
+        self.capacity = capacity or config.FETCH_BURST
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until there is a token, and take it. The waiting requests get their token in order."""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def pause(self, seconds):
+        """Give no tokens for the amount of seconds, for example after a 429 response."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+def backoff(attempt):
+    """:return: The time in seconds to wait before the retry, FETCH_BACKOFF doubled for every attempt, with jitter."""
+    return min(config.FETCH_BACKOFF_MAX, config.FETCH_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+def retry_after(response):
+    """:return: The seconds of the Retry-After header of the response, or None."""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+async def fetch_json(client, url, bucket, params=None, retries=None):
+    """Make a GET request, with the rate limit of the bucket and retries on 429 and 5xx responses and network errors.
+
+    :param client: The httpx.AsyncClient.
+    :param url: The URL.
+    :param bucket: The TokenBucket of the requests.
+    :param params: Optional dictionary with the query parameters.
+    :param retries: The maximum amount of retries, FETCH_RETRIES by default.
+    :return: JSON data of the response, or None when it failed.
+    """
+    retries = config.FETCH_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            response = await client.get(url, params=params)
+        except httpx.TransportError as error:
+            reason, delay = repr(error), backoff(attempt)
+        else:
+            if response.status_code not in RETRY_STATUS_CODES:
+                try:
+                    if response.is_success:
+                        return response.json()
+                    reason = f"status {response.status_code}"
+                except ValueError:
+                    reason = "no JSON in the response"
+                print(f"Error fetching {url} {params or ''}: {reason}")
+                return None
+
+            reason, delay = f"status {response.status_code}", retry_after(response) or backoff(attempt)
+            if response.status_code == 429:
+                bucket.pause(delay)
+
+        if attempt < retries:
+            await asyncio.sleep(delay)
+
+    print(f"Error fetching {url} {params or ''}: {reason}, after {retries} retries.")
+    return None
+
+
+def make_client(workers):
+    """:return: httpx.AsyncClient that keeps a connection open for every worker."""
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    return httpx.AsyncClient(timeout=config.FETCH_TIMEOUT, limits=limits)
+
+
+async def fetch_app_details(app_ids, workers=None, bucket=None, store_url=None):
+    """Fetch the store app details of the apps, with concurrent workers.
+
+    :param app_ids: Iterable with the ids of the apps.
+    :param workers: The amount of concurrent requests, FETCH_WORKERS by default.
+    :param bucket: The TokenBucket, by default one with FETCH_RATE_LIMIT and FETCH_BURST.
+    :param store_url: The base URL of the store API, STEAMSTORE_BASE_URL by default.
+    :return: Async generator of (app id, response), the response is the {"success": ..., "data": ...} of the app
+        or None when fetching failed. In the order the responses arrive.
+    """
+    workers = workers or config.FETCH_WORKERS
+    bucket = bucket or TokenBucket()
+    url = f"{store_url or config.STEAMSTORE_BASE_URL}appdetails"
+
+    pending = asyncio.Queue()
+    for app_id in app_ids:
+        pending.put_nowait(app_id)
+    results = asyncio.Queue(maxsize=workers)
+
+    async def worker(client):
+        try:
+            while not pending.empty():
+                app_id = pending.get_nowait()
+                data = await fetch_json(client, url, bucket, {"appids": app_id})
+                await results.put((app_id, data.get(str(app_id)) if isinstance(data, dict) else None))
+        except Exception as error:
+            await results.put(error)
+        await results.put(_DONE)
+
+    async with make_client(workers) as client:
+        tasks = [asyncio.create_task(worker(client)) for _ in range(workers)]
+        try:
+            finished = 0
+            while finished < len(tasks):
+                item = await results.get()
+                if item is _DONE:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def fetch_into_database(engine, app_ids, checkpoint=None, workers=None, bucket=None, store_url=None, chunk_size=None):
+    """Fetch the store app details of the apps, and import them into the database while they are fetched.
+
+    :param engine: The engine of the database.
+    :param app_ids: Iterable with the ids of the apps.
+    :param checkpoint: Optional Checkpoint, the imported and unavailable apps are added to it.
+    :param workers: The amount of concurrent requests, FETCH_WORKERS by default.
+    :param bucket: The TokenBucket, by default one with FETCH_RATE_LIMIT and FETCH_BURST.
+    :param store_url: The base URL of the store API, STEAMSTORE_BASE_URL by default.
+    :param chunk_size: The amount of apps per transaction, IMPORT_CHUNK_SIZE by default.
+    :return: FetchResult with the ImportResult of import_apps(), and lists with the ids of the apps that failed
+        (they are fetched again the next time) and the apps the store has no details of.
+    """
+    chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+    handoff = queue.Queue(maxsize=chunk_size)
+    failed, unavailable = [], []
+
+    with ThreadPoolExecutor(1, thread_name_prefix="import-writer") as executor:
+        writing = executor.submit(import_apps, engine, iter(handoff.get, _DONE), checkpoint, chunk_size)
+
+        def put(item):
+            """Put the item in the queue of the writer, raise the error of the writer when it stopped."""
+            while True:
+                if writing.done():
+                    writing.result()
+                    raise RuntimeError("The writer stopped before the end of the fetched apps.")
+                try:
+                    return handoff.put(item, timeout=0.1)
+                except queue.Full:
+                    pass
+
+        async def produce():
+            async for app_id, response in fetch_app_details(app_ids, workers, bucket, store_url):
+                if response is None:
+                    failed.append(app_id)
+                elif not response.get("success") or not response.get("data"):
+                    # Nothing to import, but done: the store has no details of the app (removed or not in the region)
+                    unavailable.append(app_id)
+                    if checkpoint:
+                        checkpoint.add([app_id])
+                else:
+                    await asyncio.to_thread(put, response)
+
+        try:
+            asyncio.run(produce())
+        finally:
+            if not writing.done():
+                handoff.put(_DONE)
+        return FetchResult(writing.result(), failed, unavailable)
+
+
+def load_apps_list(path=None, api_url=None):
+    """Get the apps list from the cache file, or from the Steam API when it is missing or expired.
+
+    :param path: The cache file, APPS_LIST_CACHE_FILE by default.
+    :param api_url: The base URL of the Steam API, STEAMAPI_BASE_URL by default.
+    :return: Generator of the entries of the apps list, see read_entries().
+    """
+    path = path or config.APPS_LIST_CACHE_FILE
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > config.CACHE_EXPIRATION_TIME:
+        async def fetch():
+            async with make_client(1) as client:
+                url = f"{api_url or config.STEAMAPI_BASE_URL}ISteamApps/GetAppList/v2/"
+                return await fetch_json(client, url, TokenBucket())
+
+        data = asyncio.run(fetch())
+        if data is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+
+    return read_entries(path)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Fetch the store app details of the Steam apps into the database.")
+    parser.add_argument("--workers", type=int, default=config.FETCH_WORKERS, help="Concurrent requests")
+    parser.add_argument("--rate", type=float, default=config.FETCH_RATE_LIMIT, help="Requests per second")
+    parser.add_argument("--limit", type=int, help="Fetch at most this amount of apps")
+    parser.add_argument("--restart", action="store_true", help="Also fetch the apps that are already fetched before")
+    args = parser.parse_args(args)
+
+    from src.database.database import Engine
+    import src.database.models as models
+
+    models.Base.metadata.create_all(bind=Engine)
+
+    checkpoint = Checkpoint(checkpoint_path(STORE_APP_DETAILS_SOURCE))
+    if args.restart:
+        checkpoint.clear()
+
+    done = checkpoint.load()
+    app_ids = [app.row["id"] for app in map(parse_entry, load_apps_list()) if app and app.row["id"] not in done]
+    app_ids = list(dict.fromkeys(app_ids))[:args.limit]
+    print(f"Fetching the details of {len(app_ids)} apps, {len(done)} are already fetched.")
+
+    imported, failed, unavailable = fetch_into_database(Engine, app_ids, checkpoint, args.workers, TokenBucket(args.rate))
+    print(f"Imported {imported.read} apps: {imported.inserted} new, {imported.updated} changed, "
+          f"{len(unavailable)} without details in the store, {len(failed)} failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,14 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 import src.database.models as models
 
-from src.database.database import get_db
+from src.executors import get_async_db, run_in, db_executor
 
-db_dependency = Depends(get_db)
+db_dependency = Depends(get_async_db)
 
 router = APIRouter()
 
 @router.get("/tags")
+@run_in(db_executor)
 def read_tags(db: Session = db_dependency):
     """"
     Get all existing tags in the database.
@@ -20,6 +21,7 @@ def read_tags(db: Session = db_dependency):
 
 
 @router.get("/categories")
+@run_in(db_executor)
 def read_categories(db: Session = db_dependency):
     """"
     Get all existing categories in the database.
@@ -30,6 +32,7 @@ def read_categories(db: Session = db_dependency):
 
 
 @router.get("/genres")
+@run_in(db_executor)
 def read_genres(db: Session = db_dependency):
     """
     Get all existing genres in the database.
@@ -40,6 +43,7 @@ def read_genres(db: Session = db_dependency):
 
 
 @router.get("/cats")
+@run_in(db_executor)
 def read_cats(db: Session = db_dependency):
     """
     Get all categories, genres and tags in one request.
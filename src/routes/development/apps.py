@@ -1,10 +1,13 @@
+import heapq
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, selectinload
 
-from src.algoritmes.fuzzy import _most_similar
+from src.algoritmes.fuzzy import token_set
+from src.algoritmes.ngram import find_most_similar_app, get_name_index
 from src.database import crud
 import src.database.models as models
-from src.database.database import get_db
+from src.executors import get_async_db, run_in, db_executor
 
 router = APIRouter()
 
@@ -12,6 +15,7 @@ router = APIRouter()
 # (E.g Executed in PyCharm)
 
 @router.put("/app/", response_model=dict)
+@run_in(db_executor)
 def update_app(
     item_id: int,
     name: str = Query(None),
@@ -20,7 +24,7 @@ def update_app(
     header_image: str = Query(None),
     background_image: str = Query(None),
     price: str = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_async_db)
 ):
     item = crud.update(db, models.App, item_id, name=name, description=description, developer=developer, header_image=header_image, background_image=background_image, price=price)
     if item is None:
@@ -28,13 +32,15 @@ def update_app(
     return item
 
 @router.delete("/app/{item_id}", response_model=dict)
-def delete_app(item_id: int, db: Session = Depends(get_db)):
+@run_in(db_executor)
+def delete_app(item_id: int, db: Session = Depends(get_async_db)):
     app = crud.delete(db, models.App, item_id)
     if app is None:
         raise HTTPException(status_code=404, detail=f"App {app} not found")
     return {"message": "App deleted successfully"}
 
 @router.post("/app/")
+@run_in(db_executor)
 def create_app(
     name: str,
     description: str,
@@ -42,7 +48,7 @@ def create_app(
     header_image: str,
     background_image: str,
     price: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_async_db)
     ):
     return crud.create(db, models.App, name=name, description=description, developer=developer, header_image=header_image, background_image=background_image, price=price)
 
@@ -54,14 +60,87 @@ def most_similar_named_app(target_name: str, db):
     :param db: The database dependency.
     :return: Dictionary / JSON with the (id, name and similarity) of the app.
     """
-    apps = db.query(models.App).with_entities(models.App.id, models.App.name).all()
-    most_similar_app, similarity = _most_similar(target_name, apps, "name")
+    most_similar_app, similarity = find_most_similar_app(db, target_name)
 
     if most_similar_app:
         return {"id": most_similar_app.id, "name": most_similar_app.name, "similarity": similarity}
 
     return None
 
+def find_similar_named_apps(target_name: str, db, limit: int = None):
+    """
+    Helper function to find the most similar named apps in the database.
+
+    :param target_name: The name of the app to find the most similar named apps for.
+    :param db: The database dependency.
+    :param limit: The maximum amount of apps, None for all apps above the thresholds.
+    :return: Dictionary of multiple apps matching the target_name with their (id, name and similarity.)
+    """
+    target_name = target_name.strip().lower()
+    target_tokens = token_set(target_name)
+
+    name_index = get_name_index(db)
+
+    similar_apps = []  # With a limit: min-heap of (similarity, -id, app), the worst of the best apps first
+
+    TRESHOLD = 60
+    JACCARD_TRESHOLD = 25
+
+    for app in name_index.candidates(target_name):
+        jaccard_sim = name_index.jaccard_score(target_tokens, app.id)
+
+        # The levenshtein similarity only matters when it reaches the threshold, or is higher than the jaccard similarity
+        minimum = jaccard_sim if jaccard_sim >= JACCARD_TRESHOLD else TRESHOLD
+        if limit and len(similar_apps) >= limit:
+            # And when it can beat the worst app in the top, that app has a lower id so the same similarity is not enough
+            minimum = max(minimum, similar_apps[0][0])
+        levenshtein_sim = name_index.levenshtein_score(target_name, app.id, minimum)
+
+        if levenshtein_sim >= TRESHOLD or jaccard_sim >= JACCARD_TRESHOLD:
+            similar_app = {"id": app.id, "name": app.name, "similarity": round(max(levenshtein_sim, jaccard_sim), 2)}
+            if not limit:
+                similar_apps.append(similar_app)
+            elif len(similar_apps) < limit:
+                heapq.heappush(similar_apps, (similar_app["similarity"], -app.id, similar_app))
+            elif (similar_app["similarity"], -app.id) > similar_apps[0][:2]:
+                heapq.heapreplace(similar_apps, (similar_app["similarity"], -app.id, similar_app))
+
+    if limit:
+        return [similar_app for _, _, similar_app in sorted(similar_apps, key=lambda x: x[:2], reverse=True)]
+    return sorted(similar_apps, key=lambda x: x["similarity"], reverse=True)
+
+# The relationships of the apps that the endpoints can include in their response, with the include parameter
+INCLUDE_RELATIONSHIPS = {"tags": models.App.tags, "genres": models.App.genres, "categories": models.App.categories}
+
+
+def include_options(include: str = None):
+    """
+    Helper function to get the loader options for the include parameter of the endpoints. (Not a direct endpoint)
+    Every included relationship is loaded for all apps of the query together with one extra query (selectinload),
+    so the amount of queries doesn't grow with the amount of apps.
+
+    :param include: Comma separated names of the relationships, for example "tags,genres,categories". None for none.
+    :return: List with the options for query.options().
+    """
+    names = {name.strip().lower() for name in (include or "").split(",") if name.strip()}
+    unknown = names - INCLUDE_RELATIONSHIPS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Can't include {', '.join(sorted(unknown))}, choose from {', '.join(INCLUDE_RELATIONSHIPS)}")
+
+    return [selectinload(relationship) for name, relationship in INCLUDE_RELATIONSHIPS.items() if name in names]
+
+
+def id_and_name_options(include: str = None):
+    """
+    Helper function to get the options to query App objects with only the id, name and the included relationships.
+    These are returned as {"id": ..., "name": ..., "tags": [...], ...}, like the queries on the id and name columns.
+
+    :param include: See include_options.
+    :return: List with the options for query.options().
+    """
+    return [load_only(models.App.id, models.App.name), *include_options(include)]
+
+
 def app_data_from_id_or_name(app_id_or_name: str, db, fuzzy: bool = True, categories: bool = False):
     """"
     Helper function to get the data for a specific app. (Not a direct endpoint)
@@ -73,33 +152,57 @@ def app_data_from_id_or_name(app_id_or_name: str, db, fuzzy: bool = True, catego
     :return: JSON / dictionary with all the data for the app.
     """
     app = None
+    apps_query = db.query(models.App).options(*include_options(",".join(INCLUDE_RELATIONSHIPS) if categories else None))
 
     if app_id_or_name.isdigit():
-        app = db.query(models.App).filter(models.App.id == int(app_id_or_name)).first()
+        app = apps_query.filter(models.App.id == int(app_id_or_name)).first()
     else:
         if fuzzy:
             similar_app = most_similar_named_app(app_id_or_name, db)
             if similar_app and isinstance(similar_app.get("id"), int):
                 print(
                     f"Most similar app for '{app_id_or_name}' is '{similar_app['name']}' with similarity: {similar_app['similarity']}")
-                app = db.query(models.App).filter(models.App.id == similar_app["id"]).first()
+                app = apps_query.filter(models.App.id == similar_app["id"]).first()
         else:
             app_id_or_name = app_id_or_name.strip().capitalize()
-            app = db.query(models.App).filter(models.App.name == app_id_or_name).first()
+            app = apps_query.filter(models.App.name == app_id_or_name).first()
             if not app:
                 raise HTTPException(status_code=404, detail=f"App {app_id_or_name} not found")
 
-    if categories and app and app.id:
-        tags = db.query(models.Tags).join(models.AppTags).filter(models.AppTags.app_id == app.id).all()
-        genres = db.query(models.Genre).join(models.AppGenre).filter(models.AppGenre.app_id == app.id).all()
-        categories = db.query(models.Category).join(models.AppCategory).filter(
-            models.AppCategory.app_id == app.id).all()
-
-        app.tags = tags
-        app.genres = genres
-        app.categories = categories
-
     if not app:
         raise HTTPException(status_code=404, detail=f"App {app_id_or_name} not found")
 
-    return app
\ No newline at end of file
+    return app
+
+def apps_data_from_ids_or_names(apps_ids_or_names, db, categories: bool = False):
+    """"
+    Helper function to get the data for multiple apps at once, with a fixed amount of queries. (Not a direct endpoint)
+    The names are always matched with the fuzzy algorithm, like app_data_from_id_or_name does.
+
+    :param apps_ids_or_names: List with the appids or names of the games to get the data for.
+    :param db: The database dependency.
+    :param categories: If True, also get the categories, genres and tags for the apps in the App objects as response.
+    :return: List with the App objects in the same order as apps_ids_or_names, None for the apps that are not found.
+    """
+    app_ids = [int(value) if value.isdigit() else None for value in apps_ids_or_names]
+
+    names = [value for value in apps_ids_or_names if not value.isdigit()]
+    if names:
+        similar_apps = {}
+        for name in set(names):
+            most_similar_app, similarity = find_most_similar_app(db, name)
+            if most_similar_app:
+                print(f"Most similar app for '{name}' is '{most_similar_app.name}' with similarity: {similarity}")
+                similar_apps[name] = most_similar_app.id
+
+        app_ids = [similar_apps.get(value) if app_id is None else app_id for value, app_id in zip(apps_ids_or_names, app_ids)]
+
+    found_apps = (
+        db.query(models.App)
+        .options(*include_options(",".join(INCLUDE_RELATIONSHIPS) if categories else None))
+        .filter(models.App.id.in_({app_id for app_id in app_ids if app_id is not None}))
+        .all()
+    )
+    apps_by_id = {app.id: app for app in found_apps}
+
+    return [apps_by_id.get(app_id) for app_id in app_ids]
@@ -1,29 +1,50 @@
+import json
 import os
 import re
 
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
 from sqlalchemy.sql import exists
 from sqlalchemy.sql.expression import func
 
+import src.config as config
 import src.database.models as models
+from src.algoritmes.cache import LRUCache
+from src.algoritmes.recommendations import get_tag_index, get_feature_index, features_of_app, combined_similar
 from src.algoritmes.logger import LOG_BUFFER, convert_ansi_to_html
 from src.config import BLOCKED_CONTENT_TAGS, check_key
-from src.database.database import get_db
-from src.routes.development.apps import app_data_from_id_or_name
+from src.database.similarities import stored_similar_apps
+from src.routes.development.apps import apps_data_from_ids_or_names
+from src.executors import get_async_db, run_in, db_executor, cpu_executor
 
 templates = Jinja2Templates(directory="src/templates")
 
 router = APIRouter()
 
-db_dependency = Depends(get_db)
+db_dependency = Depends(get_async_db)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The rankings of the selected games. Cleared after every commit that changes the apps or their tags, genres or categories,
+# and after a refresh of the precomputed similar apps.
+recommendation_cache = LRUCache(
+    "recommendations",
+    maxsize=config.RECOMMENDATION_CACHE_SIZE,
+    ttl=config.RECOMMENDATION_CACHE_TTL,
+    tables=[
+        models.App.__tablename__, models.Tags.__tablename__, models.AppTags.__tablename__,
+        models.AppGenre.__tablename__, models.AppCategory.__tablename__, models.AppSimilarity.__tablename__,
+    ],
+)
 
 # The endpoints defined in this file are accessible for everyone.
 # Not only in development mode. Unlike the other routers in app.py and categories.py
 
 @router.get("/", response_class=HTMLResponse, include_in_schema=False)
+@run_in(db_executor)
 def root(request: Request, db=db_dependency):
     """"
     The root endpoint of the API when visiting the website.
@@ -56,6 +77,7 @@ def root(request: Request, db=db_dependency):
 
 
 @router.get("/recommend", response_class=HTMLResponse, include_in_schema=False)
+@run_in(cpu_executor)
 def handle_form(request: Request, games: str = "", amount: int = 5, db=db_dependency):
     """"
     Handle the GET request for the HTML <form> to search for a game.
@@ -64,54 +86,96 @@ def handle_form(request: Request, games: str = "", amount: int = 5, db=db_depend
     :param games: The name or id of the game to search for. Always uses fuzzy search.
     :return: The HTML response with the results in the context.
     """
+    # This already runs in the executor, so the sync versions of the other endpoints are called
     if not games:
-        return root(request, db)
+        return root.__wrapped__(request, db)
 
     # limit amount by min 1 and max 10
     amount = max(1, min(amount, 10))
 
     return templates.TemplateResponse(
-        request=request, name="game_output.html", context=get_recommendations_games(games, db, amount)
+        request=request, name="game_output.html", context=get_recommendations_games.__wrapped__(games, db, amount)
     )
 
 @router.get("/recommendations")
-def get_recommendations_games(games: str = "", db=db_dependency, amount: int = 5):
+@run_in(cpu_executor)
+def get_recommendations_games(games: str = "", db=db_dependency, amount: int = 5, combined: bool = False, weighted: bool = False,
+                              approximate: bool = False, stream: bool = False, request: Request = None):
     """"
     Get all the recommendations for the selected games.
+    All selected games are looked up together and scored in the same pass, so more games barely cost more time.
+
     :param games: The selected games to get recommendations for. Can be a comma separated string of id's or names.
     :param db: The database object.
+    :param combined: If True, also return the games that are the most similar to all selected games together.
+    :param weighted: If True, score on IDF weighted tags, genres and categories instead of on the amount of common tags.
+    :param approximate: If True, only score the games in the same MinHash/LSH buckets. Faster for huge catalogs, but
+        approximate: with the default LSH_BANDS and LSH_ROWS about 99.6% of the exact top 10 is found for 10000 games.
+    :param stream: If True (or with the header "Accept: application/x-ndjson"), stream one JSON line per selected game
+        as soon as its recommendations are found. See stream_recommendations_games.
     :return: A list of recommended games.
     """
-    selected_apps = []
     recommended_apps = {}
     nsfw = False
 
     if type(games) == str:
         games = games.split(",")
+    games = [str(gameid.strip()) for gameid in games]
 
-    for gameid in games:
-        gameid = str(gameid.strip())
-
-        selected_app = app_data_from_id_or_name(gameid, db, True, True)
-        if not selected_app:
+    selected_apps = apps_data_from_ids_or_names(games, db, categories=True)
+    for gameid, selected_app in zip(games, selected_apps):
+        if not selected_app or not selected_app.id:
             raise HTTPException(status_code=404, detail=f"Game {gameid} not found.")
 
-        selected_apps.append(selected_app.__dict__)
+    if stream or (request is not None and NDJSON_MEDIA_TYPE in request.headers.get("accept", "")):
+        return StreamingResponse(
+            cpu_executor.iterate(stream_recommendations_games(selected_apps, db, amount, combined, weighted, approximate)),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
 
-        apps = find_similar_games(selected_app, db, amount)
+    for selected_app, apps in zip(selected_apps, find_similar_games_for_all(selected_apps, db, amount, weighted, approximate)):
+        nsfw = nsfw or is_blocked_content(selected_app)
+        recommended_apps[re.sub(r'[^a-zA-Z0-9 ]', '', selected_app.name)] = apps
 
-        if not selected_app.id:
-            raise HTTPException(status_code=404, detail=f"Game {selected_app.id} not found.")
+    result = {"selected_games": [app.__dict__ for app in selected_apps], "all_apps": recommended_apps, "nsfw": nsfw}
 
-        for tag in selected_app.tags:
-            if tag.name in BLOCKED_CONTENT_TAGS:
-                nsfw = True
-                break
+    if combined:
+        result["combined"] = find_combined_similar_games(selected_apps, db, amount)
 
-        recommended_apps[re.sub(r'[^a-zA-Z0-9 ]', '', selected_app.name)] = apps
+    return result
 
 
-    return {"selected_games": selected_apps, "all_apps": recommended_apps, "nsfw": nsfw}
+def stream_recommendations_games(selected_apps, db, amount, combined, weighted, approximate):
+    """
+    Generator for the streaming (NDJSON) version of /recommendations, it yields one JSON line per selected game:
+    {"name": ..., "selected_game": {...}, "apps": [...], "nsfw": bool}
+    And when combined is True, a last line with the games similar to all selected games: {"combined": [...]}
+
+    :param selected_apps: The app objects from the DB, with their tags, genres and categories.
+    :return: Generator with the lines (str) of the response.
+    """
+    try:
+        for selected_app in selected_apps:
+            apps = find_similar_games_for_all([selected_app], db, amount, weighted, approximate)[0]
+            line = {
+                "name": re.sub(r'[^a-zA-Z0-9 ]', '', selected_app.name),
+                "selected_game": selected_app.__dict__,
+                "apps": apps,
+                "nsfw": is_blocked_content(selected_app),
+            }
+            yield json.dumps(jsonable_encoder(line)) + "\n"
+
+        if combined:
+            yield json.dumps(jsonable_encoder({"combined": find_combined_similar_games(selected_apps, db, amount)})) + "\n"
+    finally:
+        # The response is streamed after the get_async_db dependency is finished, so close the session here again.
+        db.close()
+
+
+def is_blocked_content(app):
+    """:return: True when the app (with its tags) has one of the BLOCKED_CONTENT_TAGS."""
+    return any(tag.name in BLOCKED_CONTENT_TAGS for tag in app.tags)
+
 
 def find_similar_games(selected_app, db, amount):
     """Finds games with the most similar tags to the given game.
@@ -120,47 +184,108 @@ def find_similar_games(selected_app, db, amount):
     :param db: The database object
     :return: The matching games filtered on matching tags of the input "selected_app"
     """
-    gameid = str(selected_app.id)
-    gamename = selected_app.name
+    return find_similar_games_for_all([selected_app], db, amount)[0]
 
-    tags = selected_app.tags
-    genres = selected_app.genres
-    categories = selected_app.categories
 
-    # get all games that are in the database except the selected game
-    games = db.query(models.App).filter(models.App.id != selected_app.id).all()
-    game_tags_relation = db.query(models.AppTags.app_id, models.AppTags.tag_id).all()
+def find_similar_games_for_all(selected_apps, db, amount, weighted: bool = False, approximate: bool = False):
+    """Finds the games with the most similar tags for every given game, in one pass.
 
-    if not games:
-        raise HTTPException(status_code=404, detail="No games found in the database.")
+    The rankings are cached per (game, amount, scoring mode). Without a cached ranking the precomputed similar games
+    are used when they are stored in the app_similarities table. Otherwise only the games sharing at least one tag
+    with the selected game are scored, using the tag index of the RECOMMENDATION_BACKEND from the config.
+    All matching games are loaded together afterward.
 
-    matching_games = []
+    :param selected_apps: The app objects from the DB, with their tags (and genres and categories when weighted).
+    :param db: The database object
+    :param weighted: If True, score with the IDF weighted FeatureIndex over the tags, genres and categories.
+    :param approximate: If True, score with the "lsh" backend (TagMinHash), only the games in the same buckets.
+    :return: List with the matching games for every selected app, in the same order as selected_apps.
+    """
+    index = None
+    rankings = []
+
+    for selected_app in selected_apps:
+        cache_key = (selected_app.id, amount, "weighted" if weighted else "lsh" if approximate else config.RECOMMENDATION_BACKEND)
+        cache_generation = recommendation_cache.generation
+        ranking = recommendation_cache.get(cache_key)
+
+        if ranking is None:
+            if weighted:
+                ranking = get_feature_index(db).similar(features_of_app(selected_app), amount, exclude=selected_app.id)
+            elif approximate:
+                ranking = get_tag_index(db, "lsh").similar([tag.id for tag in selected_app.tags], amount, exclude=selected_app.id)
+            else:
+                ranking = stored_similar_apps(db, selected_app.id, amount)
+
+            if ranking is None:
+                index = index or get_tag_index(db)
+                ranking = index.similar([tag.id for tag in selected_app.tags], amount, exclude=selected_app.id)
+
+            recommendation_cache.set(cache_key, ranking, cache_generation)
+
+        if not ranking and not db.query(exists().where(models.App.id != selected_app.id)).scalar():
+            raise HTTPException(status_code=404, detail="No games found in the database.")
+
+        rankings.append(ranking)
+
+    return _load_matching_games(db, rankings, [selected_app.tags for selected_app in selected_apps])
 
-    # Compare with every other game must be (O(n²)) (two for loops in this)
-    for game in games:
 
-        # Convert game_tags_relation to a set for faster lookups
-        game_tags_relation_set = set(game_tags_relation)
+def find_combined_similar_games(selected_apps, db, amount):
+    """Finds the games with the most similar tags to all given games together. ("Because you liked all of these")
 
-        # Get tags for the current game
-        game.tags = [tag for tag in tags if (game.id, tag.id) in game_tags_relation_set]
+    :param selected_apps: The app objects from the DB, with their tags.
+    :param db: The database object
+    :return: The matching games, the similarity score is the average score over the selected games.
+    """
+    ranking = combined_similar(
+        get_tag_index(db),
+        [[tag.id for tag in selected_app.tags] for selected_app in selected_apps],
+        amount,
+        exclude={selected_app.id for selected_app in selected_apps},
+    )
+
+    all_tags = {tag.id: tag for selected_app in selected_apps for tag in selected_app.tags}
+    return _load_matching_games(db, [ranking], [list(all_tags.values())])[0]
 
-        # Calculate the similarity score based on common tags
-        common_tags = set(selected_app.tags).intersection(set(game.tags))
-        total_tags = len(selected_app.tags)
-        try:
-            game.similarity_score = ((len(common_tags) / total_tags) * 100).__round__()  # Convert to percentage
-        except ZeroDivisionError:
-            game.similarity_score = 0
 
-        if game.similarity_score > 0:
-            matching_games.append((game.__dict__, game.similarity_score))
+def _load_matching_games(db, rankings, tag_lists):
+    """Load the app objects for the rankings and add the shared tags and similarity score to them.
 
-    # Sort matching games by similarity score in descending order
-    matching_games.sort(key=lambda x: x[1], reverse=True)
+    :param rankings: List of rankings, every ranking is a list of (app_id, similarity_score) in the order to return them.
+    :param tag_lists: List with the tag objects of the selected app, for every ranking.
+    :return: List with a list of app dictionaries in the order of the ranking, for every ranking.
+    """
+    app_ids = {app_id for ranking in rankings for app_id, _ in ranking}
+    if not app_ids:
+        return [[] for _ in rankings]
+
+    games = db.query(models.App).filter(models.App.id.in_(app_ids)).all()
+    games_by_id = {game.id: game for game in games}
+
+    shared_tags = set(
+        db.query(models.AppTags.app_id, models.AppTags.tag_id)
+        .filter(models.AppTags.app_id.in_(app_ids), models.AppTags.tag_id.in_({tag.id for tags in tag_lists for tag in tags}))
+        .all()
+    )
 
-    # Return the top 5 matching games.
-    return [game for game, _ in matching_games[:amount]]
+    all_matching_games = []
+    for ranking, tags in zip(rankings, tag_lists):
+        matching_games = []
+        for app_id, score in ranking:
+            game = games_by_id.get(app_id)
+            if game is None:
+                continue
+
+            # A copy, the same game can be recommended for multiple selected games with other shared tags.
+            matching_games.append({
+                **game.__dict__,
+                "tags": [tag for tag in tags if (app_id, tag.id) in shared_tags],  # Only the tags of the selected game that this game also has
+                "similarity_score": score,
+            })
+        all_matching_games.append(matching_games)
+
+    return all_matching_games
 
 
 @router.get("/logs", response_class=HTMLResponse, include_in_schema=False)
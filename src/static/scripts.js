@@ -1,6 +1,7 @@
 document.addEventListener("DOMContentLoaded", function() {
     const form = document.querySelector('form[action="/recommend"]');
     const gameInput = document.getElementById("game");
+    const gameSuggestions = document.getElementById("game_suggestions");
     const selectedGamesElement = document.getElementById("selected_games");
     const recommendButton = document.getElementById("recommend");
     const games = [];
@@ -8,6 +9,8 @@ document.addEventListener("DOMContentLoaded", function() {
 
     form.addEventListener("submit", handleFormSubmit);
 
+    gameInput.addEventListener("input", suggestGames);
+
     recommendButton.addEventListener("click", recommendGames);
 
     loadGames();
@@ -57,6 +60,29 @@ document.addEventListener("DOMContentLoaded", function() {
             .catch(handleError);
     }
 
+    function suggestGames() {
+        const typed = gameInput.value.trim();
+        if (!typed) {
+            gameSuggestions.innerHTML = "";
+            return;
+        }
+
+        fetch(`apps/autocomplete?q=${encodeURIComponent(typed)}&limit=8`)
+            .then(response => response.ok ? response.json() : [])
+            .then(apps => {
+                // Ignore the answer when the user typed more in the meantime
+                if (gameInput.value.trim() !== typed) { return; }
+
+                gameSuggestions.innerHTML = "";
+                apps.forEach(app => {
+                    const option = document.createElement("option");
+                    option.value = app.name;
+                    gameSuggestions.appendChild(option);
+                });
+            })
+            .catch(error => console.error("Error: ", error));
+    }
+
     function fetchGameData(gameName) {
         return fetch(`app/similar/${encodeURIComponent(gameName)}`)
             .then(response => {
@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks of the fuzzy search and recommendation hot paths, at several catalog sizes.
+
+Every benchmark first warms up, then times single calls and reports the ops/sec, the p50 and p99 latency and the
+peak memory allocated per call. The results are saved as JSON, so runs can be compared over time.
+Run it from the root of the project:
+
+    python -m tests.benchmark.benchmark --sizes 1000 10000
+    python -m tests.benchmark.benchmark --sizes 1000 10000 --compare benchmark_results/<older run>.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import src.algoritmes.ngram as ngram
+import src.algoritmes.recommendations as recommendations
+import src.database.models as models
+from src.algoritmes.fuzzy import levenshtein_distance, similarity_score, jaccard_similarity, _most_similar, \
+    token_set, token_jaccard_similarity
+from src.routes.development.apps import find_similar_named_apps, apps_data_from_ids_or_names
+from src.routes.frontend import find_similar_games, recommendation_cache
+
+WORDS = [
+    "space", "adventure", "quest", "legend", "dark", "souls", "hollow", "knight", "puzzle", "racing", "champions",
+    "tactics", "empire", "city", "builder", "simulator", "farm", "story", "dungeon", "hero", "war", "galaxy",
+    "zombie", "survival", "island", "pixel", "dragon", "ninja", "tower", "defense", "kingdom", "rogue", "star",
+    "fleet", "mystery", "manor", "cooking", "master", "pro", "deluxe", "online", "arena", "legends", "chronicles",
+]
+AMOUNT_TAGS = 300
+QUERIES = ["hollow kngiht", "space advnture game", "pzzl qqwetst", "dragon quest", "citty builder simulater"]
+
+
+def synthetic_name(rng):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+
+
+class Named:
+    """Row-like object with a name, like the rows _most_similar gets from the database."""
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+def make_database(amount_apps, seed=0):
+    """Make an in-memory SQLite database with random app names and tags.
+
+    :return: The database session.
+    """
+    rng = random.Random(seed)
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    db.add_all([models.Tags(id=tag_id, name=f"Tag {tag_id}") for tag_id in range(1, AMOUNT_TAGS + 1)])
+    db.flush()
+    db.execute(models.App.__table__.insert(), [
+        {"id": app_id, "name": synthetic_name(rng), "developer": f"Studio {app_id % 500}"}
+        for app_id in range(1, amount_apps + 1)
+    ])
+    db.execute(models.AppTags.__table__.insert(), [
+        {"app_id": app_id, "tag_id": tag_id}
+        for app_id in range(1, amount_apps + 1)
+        for tag_id in rng.sample(range(1, AMOUNT_TAGS + 1), rng.randint(3, 15))
+    ])
+    db.commit()
+    return db
+
+
+def measure(function, warmup_time=0.2, measure_time=1.0, max_iterations=10000):
+    """Time single calls of the function, after a warm-up.
+
+    :return: Dictionary with the iterations, ops/sec, p50 and p99 in microseconds and peak allocated bytes per call.
+    """
+    end = time.perf_counter() + warmup_time
+    while time.perf_counter() < end:
+        function()
+
+    timings = []
+    end = time.perf_counter() + measure_time
+    while time.perf_counter() < end and len(timings) < max_iterations:
+        start = time.perf_counter_ns()
+        function()
+        timings.append(time.perf_counter_ns() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "ops_per_sec": round(len(timings) / (sum(timings) / 1e9), 2),
+        "p50_us": round(timings[len(timings) // 2] / 1000, 2),
+        "p99_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] / 1000, 2),
+        "alloc_peak_bytes": peak,
+    }
+
+
+def string_benchmarks():
+    """The benchmarks of the string functions, these don't depend on the catalog size."""
+    short, short_reference = "pzzl qqwetst", "Puzzle Quest"
+    long, long_reference = "the elder scrolls v skyrim special edition", "The Elder Scrolls IV: Oblivion Game of the Year"
+
+    return {
+        "levenshtein_distance[short]": lambda: levenshtein_distance(short, short_reference),
+        "levenshtein_distance[long]": lambda: levenshtein_distance(long, long_reference),
+        "similarity_score[short]": lambda: similarity_score(short, short_reference),
+        "similarity_score[long]": lambda: similarity_score(long, long_reference),
+        "jaccard_similarity[short]": lambda: jaccard_similarity(short, short_reference),
+        "jaccard_similarity[long]": lambda: jaccard_similarity(long, long_reference),
+    }
+
+
+def jaccard_scores(query_tokens, token_sets):
+    return [token_jaccard_similarity(query_tokens, tokens) for tokens in token_sets]
+
+
+def catalog_benchmarks(db, amount_apps):
+    """The benchmarks that search through the whole catalog of the given database."""
+    rng = random.Random(1)
+    names = [Named(row.id, row.name) for row in db.query(models.App.id, models.App.name)]
+    queries = iter(lambda: rng.choice(QUERIES), None)
+    # The Jaccard similarity of a query with every name, with the sets of words of the snapshot
+    word_sets = list(ngram.get_name_index(db).tokens.values())
+    selected_apps = apps_data_from_ids_or_names([str(rng.randint(1, amount_apps)) for _ in range(20)], db, True)
+    selected = iter(lambda: rng.choice(selected_apps), None)
+
+    return {
+        "_most_similar": lambda: _most_similar(next(queries), names, "name"),
+        "jaccard_scores[words]": lambda: jaccard_scores(token_set(next(queries)), word_sets),
+        "find_similar_named_apps": lambda: find_similar_named_apps(next(queries), db),
+        "find_similar_named_apps[limit=10]": lambda: find_similar_named_apps(next(queries), db, 10),
+        "find_similar_games": lambda: find_similar_games(next(selected), db, 5),
+        "autocomplete": lambda: ngram.get_name_index(db).autocomplete(next(queries)[:rng.randint(1, 8)]),
+    }
+
+
+def run(sizes, measure_time):
+    results = {"string": {}, "catalog": {}}
+
+    for name, function in string_benchmarks().items():
+        results["string"][name] = measure(function, measure_time=measure_time)
+        print(f"{name:<48} {format_result(results['string'][name])}")
+
+    for amount_apps in sizes:
+        db = make_database(amount_apps)
+        results["catalog"][str(amount_apps)] = {}
+
+        # The in-memory indexes belong to one database, and the cache would skip the scoring.
+        with patch.object(recommendations, "_indexes", {}), patch.object(ngram, "_name_index", None), \
+                patch.object(recommendation_cache, "get", return_value=None):
+            for name, function in catalog_benchmarks(db, amount_apps).items():
+                result = measure(function, measure_time=measure_time, max_iterations=2000)
+                results["catalog"][str(amount_apps)][name] = result
+                print(f"{name + f'[{amount_apps} apps]':<48} {format_result(result)}")
+
+        db.close()
+
+    return results
+
+
+def format_result(result):
+    return (f"{result['ops_per_sec']:>12.1f} ops/s  p50 {result['p50_us']:>10.1f}us  p99 {result['p99_us']:>10.1f}us  "
+            f"peak {result['alloc_peak_bytes'] / 1024:>9.1f}KiB")
+
+
+def compare(results, old_results):
+    """Print the change in ops/sec against an older run."""
+    print(f"\nCompared with {old_results['metadata']['date']} ({old_results['metadata'].get('commit')}):")
+    pairs = [(name, result, old_results["string"].get(name)) for name, result in results["string"].items()]
+    for size, benchmarks in results["catalog"].items():
+        pairs += [(f"{name}[{size} apps]", result, old_results["catalog"].get(size, {}).get(name))
+                  for name, result in benchmarks.items()]
+
+    for name, result, old_result in pairs:
+        if old_result:
+            print(f"{name:<48} {result['ops_per_sec'] / old_result['ops_per_sec']:>6.2f}x ops/s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="The catalog sizes (amount of apps)")
+    parser.add_argument("--time", type=float, default=1.0, help="Seconds to measure every benchmark")
+    parser.add_argument("--output", help="JSON file for the results, default is benchmark_results/<date>.json")
+    parser.add_argument("--compare", help="JSON file of an older run to compare with")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.time)
+    results["metadata"] = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    output = args.output or os.path.join("benchmark_results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nSaved the results to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of the Jaccard similarity of one query against every name of a catalog, with the words of the names
+as frozensets of strings (token_set, what the searches use) and as interned integer word ids: frozensets of ids,
+sorted array('I') with a merge, and bitsets (Python ints) with a popcount.
+
+Checks that every representation gives the same percentages as token_jaccard_similarity, and reports the time per
+query and the memory of the word sets. Run it from the root of the project:
+
+    python -m tests.benchmark.jaccard_benchmark --sizes 10000 100000
+"""
+import argparse
+import random
+import sys
+import time
+from array import array
+
+from src.algoritmes.fuzzy import token_jaccard_similarity, token_set
+from tests.benchmark.benchmark import QUERIES, synthetic_name
+
+
+def merge_jaccard(ids, reference_ids):
+    """Jaccard similarity of two sorted arrays of word ids, the intersection is counted with a merge."""
+    i = j = intersection = 0
+    while i < len(ids) and j < len(reference_ids):
+        if ids[i] == reference_ids[j]:
+            intersection += 1
+            i += 1
+            j += 1
+        elif ids[i] < reference_ids[j]:
+            i += 1
+        else:
+            j += 1
+    if not intersection:
+        return 0
+    return intersection / (len(ids) + len(reference_ids) - intersection) * 100
+
+
+def bitset_jaccard(bits, reference_bits):
+    """Jaccard similarity of two bitsets of word ids, the sizes are counted with a popcount."""
+    intersection = (bits & reference_bits).bit_count()
+    if not intersection:
+        return 0
+    return intersection / (bits | reference_bits).bit_count() * 100
+
+
+class Vocabulary:
+    """The interned word ids, every new word gets the next id."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def word_ids(self, tokens):
+        return [self.ids.setdefault(word, len(self.ids)) for word in tokens]
+
+
+def representations(names):
+    """:return: Dictionary name -> (function that makes the word set of a name, similarity function, word sets)."""
+    vocabulary = Vocabulary()
+    to_frozen_ids = lambda name: frozenset(vocabulary.word_ids(token_set(name)))
+    to_array = lambda name: array("I", sorted(vocabulary.word_ids(token_set(name))))
+    to_bits = lambda name: sum(1 << word_id for word_id in set(vocabulary.word_ids(token_set(name))))
+
+    result = {}
+    for label, convert, similarity in [
+        ("frozenset[str] (token_set)", token_set, token_jaccard_similarity),
+        ("frozenset[int]", to_frozen_ids, token_jaccard_similarity),
+        ("array('I') merge", to_array, merge_jaccard),
+        ("bitset popcount", to_bits, bitset_jaccard),
+    ]:
+        result[label] = (convert, similarity, [convert(name) for name in names])
+    return result
+
+
+def size_of(word_sets):
+    """The memory of the word sets in bytes, without the strings that are shared with the names."""
+    return sum(sys.getsizeof(word_set) for word_set in word_sets)
+
+
+def benchmark(amount_apps, amount_queries, vocabulary_size):
+    rng = random.Random(0)
+    # Real names have many rare words (titles, numbers, made-up names), every name gets one of vocabulary_size words
+    names = [f"{synthetic_name(rng)} Word{rng.randrange(vocabulary_size)}" for _ in range(amount_apps)]
+    queries = [rng.choice(QUERIES + names) for _ in range(amount_queries)]
+
+    expected = None
+    for label, (convert, similarity, word_sets) in representations(names).items():
+        start = time.perf_counter()
+        scores = [[similarity(query_set, word_set) for word_set in word_sets]
+                  for query_set in (convert(query) for query in queries)]
+        per_query = (time.perf_counter() - start) / amount_queries
+
+        expected = expected or scores
+        print(f"{amount_apps:>8} apps | {label:<28} {per_query * 1000:8.2f}ms per query | "
+              f"{size_of(word_sets) / 2 ** 20:7.1f} MiB | same results {scores == expected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--vocabulary", type=int, nargs="+", default=[100, 50000],
+                        help="The amounts of rare words, the vocabulary of the interned ids grows with it")
+    args = parser.parse_args()
+
+    for vocabulary_size in args.vocabulary:
+        print(f"{vocabulary_size} rare words")
+        for amount_apps in args.sizes:
+            benchmark(amount_apps, args.queries, vocabulary_size)
+
+
+if __name__ == "__main__":
+    main()
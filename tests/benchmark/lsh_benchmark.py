@@ -0,0 +1,99 @@
+"""
+Benchmark of the approximate "lsh" recommendation backend against the exact "matrix" backend.
+
+Reports the recall@k and the speedup per query on synthetic catalogs. Run it from the root of the project:
+
+    python -m tests.benchmark.lsh_benchmark --sizes 10000 100000 1000000 --bands 32 --rows 3
+"""
+import argparse
+import time
+
+import numpy as np
+
+import src.config as config
+from src.algoritmes.recommendations import TagMatrix, TagMinHash
+
+AMOUNT_TAGS = 400
+AMOUNT_GROUPS = 300  # Apps in the same group share most of their tags, like games of the same kind on Steam
+GROUP_TAGS = 12
+
+
+def synthetic_relations(amount_apps, seed=0):
+    """Make (app_id, tag_id) relations: every app gets most tags of its group, plus a few popular tags.
+
+    :return: Array of shape (relations, 2).
+    """
+    rng = np.random.default_rng(seed)
+    group_tags = rng.choice(AMOUNT_TAGS, size=(AMOUNT_GROUPS, GROUP_TAGS))
+    popular_tags = np.arange(1, 11)  # Tags like "Single-Player" that many apps have
+
+    app_groups = rng.integers(0, AMOUNT_GROUPS, amount_apps)
+    app_ids = np.repeat(np.arange(1, amount_apps + 1), GROUP_TAGS)
+    tags = group_tags[app_groups].ravel()
+    keep = rng.random(len(tags)) < 0.7
+
+    popular_app_ids = np.repeat(np.arange(1, amount_apps + 1), 3)
+    popular = rng.choice(popular_tags, size=len(popular_app_ids))
+
+    relations = np.stack([np.concatenate([app_ids[keep], popular_app_ids]), np.concatenate([tags[keep], popular])], axis=1)
+    return np.unique(relations, axis=0)
+
+
+def recall_at_k(exact, approximate):
+    """The part of the exact top k that the approximate top k also found.
+    Apps are compared on their score, an app with the same score as an app of the exact top counts as found.
+    """
+    if not exact:
+        return 1.0
+    lowest_exact_score = exact[-1][1]
+    found = sum(1 for _, score in approximate if score >= lowest_exact_score)
+    return min(found, len(exact)) / len(exact)
+
+
+def time_queries(index, queries, k):
+    results = []
+    start = time.perf_counter()
+    for app_id, tag_ids in queries:
+        results.append(index.similar(tag_ids, k, exclude=app_id))
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def benchmark(amount_apps, bands, rows, k=10, amount_queries=200):
+    relations = synthetic_relations(amount_apps)
+
+    start = time.perf_counter()
+    exact_index = TagMatrix(relations)
+    exact_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lsh_index = TagMinHash(relations, bands=bands, rows=rows)
+    lsh_build = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    query_ids = rng.choice(exact_index.app_ids, size=amount_queries, replace=False)
+    queries = [(int(app_id), exact_index.tags_of(int(app_id))) for app_id in query_ids]
+
+    exact_time, exact_results = time_queries(exact_index, queries, k)
+    lsh_time, lsh_results = time_queries(lsh_index, queries, k)
+    recall = np.mean([recall_at_k(exact, approximate) for exact, approximate in zip(exact_results, lsh_results)])
+
+    print(f"{amount_apps:>9} apps | build exact {exact_build:6.2f}s lsh {lsh_build:6.2f}s | "
+          f"query exact {exact_time * 1000:8.3f}ms lsh {lsh_time * 1000:8.3f}ms | "
+          f"speedup {exact_time / lsh_time:6.1f}x | recall@{k} {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--bands", type=int, default=config.LSH_BANDS)
+    parser.add_argument("--rows", type=int, default=config.LSH_ROWS)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"MinHash/LSH with {args.bands} bands of {args.rows} rows")
+    for amount_apps in args.sizes:
+        benchmark(amount_apps, args.bands, args.rows, args.k)
+
+
+if __name__ == "__main__":
+    main()
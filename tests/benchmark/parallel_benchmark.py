@@ -0,0 +1,90 @@
+"""
+Benchmark of the fuzzy app name search over the whole catalog in worker processes, against one process.
+
+Reports the time per search for every amount of worker processes, and the catalog size from which the worker
+processes are faster than scoring in the API process (a hint for FUZZY_PARALLEL_THRESHOLD in the config).
+Run it from the root of the project:
+
+    python -m tests.benchmark.parallel_benchmark --sizes 10000 50000 200000 --processes 1 2 4 8
+"""
+import argparse
+import os
+import random
+import time
+
+import src.algoritmes.parallel as parallel
+from src.algoritmes.fuzzy import token_set
+from src.algoritmes.parallel import FuzzyProcessPool
+from tests.benchmark.benchmark import QUERIES, synthetic_name
+
+
+def synthetic_apps(amount_apps, seed=0):
+    rng = random.Random(seed)
+    apps = []
+    for app_id in range(1, amount_apps + 1):
+        name = synthetic_name(rng).lower()
+        apps.append((app_id, name, token_set(name)))
+    return apps
+
+
+def time_searches(most_similar, amount_queries):
+    rng = random.Random(1)
+    queries = [rng.choice(QUERIES) for _ in range(amount_queries)]
+    most_similar(queries[0])  # Warm up
+
+    start = time.perf_counter()
+    results = [most_similar(query) for query in queries]
+    return (time.perf_counter() - start) / amount_queries, results
+
+
+def benchmark(amount_apps, processes_list, amount_queries):
+    apps = synthetic_apps(amount_apps)
+
+    # Scoring in this process, with the same function the workers use
+    parallel._init_worker(apps)
+    serial_time, serial_results = time_searches(
+        lambda query: parallel._most_similar_in_partition(query.strip().lower(), token_set(query)), amount_queries
+    )
+    print(f"{amount_apps:>8} apps | 1 process (serial) {serial_time * 1000:9.2f}ms")
+
+    faster = False
+    for processes in processes_list:
+        start = time.perf_counter()
+        pool = FuzzyProcessPool(apps, processes)
+        pool.most_similar("start")  # Wait until every worker has started
+        start_time = time.perf_counter() - start
+
+        pool_time, pool_results = time_searches(pool.most_similar, amount_queries)
+        pool.close()
+
+        same = all(app_id == serial[0] for (app_id, _), serial in zip(pool_results, serial_results))
+        faster |= processes > 1 and pool_time < serial_time * 0.9
+        print(f"{'':>8}      | {processes} processes {pool_time * 1000:14.2f}ms | speedup {serial_time / pool_time:5.2f}x | "
+              f"start {start_time:5.2f}s | same results {same}")
+
+    return faster
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--processes", type=int, nargs="+", default=sorted({2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cores")
+    if (os.cpu_count() or 1) < 2:
+        print("The scaling with the amount of processes can only be measured on a host with multiple cores.")
+    threshold = None
+    for amount_apps in sorted(args.sizes):
+        if benchmark(amount_apps, args.processes, args.queries) and threshold is None:
+            threshold = amount_apps
+
+    if threshold:
+        print(f"\nThe worker processes are faster from {threshold} apps, use this as FUZZY_PARALLEL_THRESHOLD.")
+    else:
+        print("\nThe worker processes were not faster for these sizes, keep FUZZY_PROCESSES at 0.")
+
+
+if __name__ == "__main__":
+    main()
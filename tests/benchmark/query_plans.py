@@ -0,0 +1,147 @@
+"""
+Query plans of the SQL that the endpoints send to the database, with EXPLAIN QUERY PLAN on a seeded SQLite database.
+
+Every endpoint is called with the test client of the integration tests, the executed statements are captured and
+explained with their parameters. The report flags the full table scans (a "SCAN <table>" without an index) and lists
+the indexes that no query uses, those only make every insert and update slower.
+Run it from the root of the project, with the in-memory database:
+
+    URL_DATABASE="sqlite:///:memory:" python -m tests.benchmark.query_plans
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import event, inspect
+
+# The endpoints of the website and the API, with the parameters the frontend uses
+ENDPOINTS = [
+    "/", "/recommend?games=Puzzle Quest", "/recommendations?games=3,6", "/recommendations?games=3&weighted=true",
+    "/recommendations?games=3&combined=true", "/apps", "/apps?all_fields=true", "/apps?like=puzzle",
+    "/apps?target_name=puzzle&limit=5", "/apps?include=tags,genres,categories", "/apps/autocomplete?q=pu",
+    "/app/1", "/app/Puzzle Quest", "/app/1?include=tags", "/app/1/tags", "/app/1/genres", "/app/1/categories",
+    "/app/similar/puzzle", "/apps/developer/Game Studio X", "/apps/developer/Game Studio X?all_fields=true",
+    "/apps/tag/Multi-player", "/developers", "/developers?apps=true", "/tags", "/genres", "/categories", "/cats",
+]
+
+QueryPlan = namedtuple("QueryPlan", ["endpoint", "statement", "details"])
+
+# "SCAN <table> USING INDEX" also reads the whole table, in the order of the index
+SCAN = re.compile(r"^SCAN (\w+)\b")
+USING_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+def capture_statements(engine, function):
+    """Call the function and capture the statements it executes on the engine.
+
+    :return: List of (statement, parameters).
+    """
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if not executemany and not statement.lstrip().upper().startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        function()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def explain(engine, statement, parameters):
+    """:return: List with the detail lines of the EXPLAIN QUERY PLAN of the statement, for example "SCAN apps"."""
+    with engine.connect() as connection:
+        return [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+def full_scans(details):
+    """:return: Set with the tables that are read completely, without an index."""
+    return {match.group(1) for detail in details if (match := SCAN.match(detail))}
+
+
+def used_indexes(details):
+    """:return: Set with the names of the indexes the plan uses."""
+    return {index for detail in details for index in USING_INDEX.findall(detail)}
+
+
+def query_plans(engine, label, function):
+    """Call the function and explain every SELECT it executes.
+
+    :param label: The name of the function in the QueryPlans, for example the endpoint.
+    :return: List of QueryPlan.
+    """
+    return [
+        QueryPlan(label, statement, explain(engine, statement, parameters))
+        for statement, parameters in capture_statements(engine, function)
+        if statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    ]
+
+
+def endpoint_query_plans(client, engine, endpoints=ENDPOINTS):
+    """Call the endpoints and explain every SELECT they execute.
+
+    :param client: The TestClient of the API.
+    :param engine: The engine of the database the API uses.
+    :return: List of QueryPlan.
+    """
+    return [plan for endpoint in endpoints for plan in query_plans(engine, endpoint, lambda: client.get(endpoint))]
+
+
+def invalidation_query_plans(engine, app_ids=(1, 2, 3)):
+    """Explain the queries that find the stale precomputed similarities, after the tags of the apps changed.
+    These run on every change of the app_tags table, not in an endpoint.
+
+    :return: List of QueryPlan.
+    """
+    from src.database.database import SessionLocal
+    from src.database.similarities import affected_app_ids
+
+    db = SessionLocal()
+    try:
+        return query_plans(engine, "affected_app_ids", lambda: affected_app_ids(db, list(app_ids)))
+    finally:
+        db.close()
+
+
+def declared_indexes(engine, unique=False):
+    """:param unique: If False, skip the unique indexes, those are needed for the unique constraint.
+    :return: Dictionary with the name of every index in the database -> its table."""
+    inspector = inspect(engine)
+    return {
+        index["name"]: table
+        for table in inspector.get_table_names()
+        for index in inspector.get_indexes(table)
+        if unique or not index["unique"]
+    }
+
+
+def unused_indexes(engine, plans):
+    """:return: Dictionary with the (not unique) indexes that none of the plans uses -> their table."""
+    used = set().union(*(used_indexes(plan.details) for plan in plans))
+    return {index: table for index, table in declared_indexes(engine).items() if index not in used}
+
+
+def print_report(plans, unused):
+    print("Full table scans:")
+    for plan in plans:
+        scans = full_scans(plan.details)
+        if scans:
+            statement = " ".join(plan.statement.split())
+            print(f"  {plan.endpoint:<45} {', '.join(sorted(scans)):<18} {statement[:120]}")
+
+    print("\nUnused indexes (only write cost):")
+    for index, table in sorted(unused.items(), key=lambda item: (item[1], item[0])):
+        print(f"  {table:<18} {index}")
+
+
+def main():
+    from src.database.database import Engine
+    from tests.integration.integration_helpers import client
+
+    plans = endpoint_query_plans(client, Engine) + invalidation_query_plans(Engine)
+    print_report(plans, unused_indexes(Engine, plans))
+
+
+if __name__ == "__main__":
+    main()
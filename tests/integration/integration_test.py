@@ -38,6 +38,65 @@ def test_apps_all_fields():
     response = client.get("/apps?all_fields=true")
     assert_common_app_tests(response, ALL_APP_FIELDS, entries_count_min=9)
 
+def test_apps_include():
+    """
+    Test the include parameter of the GET "/apps" and "/app/{appid}" endpoints, it loads the relationships of all apps
+    with one extra query per relationship.
+    """
+    from sqlalchemy import event
+    from src.database.database import Engine
+
+    queries = []
+    count_query = lambda *args: queries.append(args[2])
+
+    event.listen(Engine, "before_cursor_execute", count_query)
+    try:
+        response = client.get("/apps?include=tags,genres")
+        assert len(queries) == 3
+        assert_common_app_tests(response, ["id", "name", "tags", "genres"], entries_count_min=9)
+
+        queries.clear()
+        response = client.get("/apps?all_fields=true&include=tags,genres,categories")
+        assert len(queries) == 4
+        assert_common_app_tests(response, ALL_APP_FIELDS + ["tags", "genres", "categories"], entries_count_min=9)
+    finally:
+        event.remove(Engine, "before_cursor_execute", count_query)
+
+    app = client.get("/app/1?include=categories").json()
+    assert app["categories"] == client.get("/app/1/categories").json()
+    assert "tags" not in app and "tags" not in client.get("/app/1").json()
+
+    assert check_response(client.get("/apps?include=tags,price"), 400)
+
+def test_apps_target_name():
+    """
+    Test the GET "/apps" endpoint with a target_name for the most similar named apps, with and without a limit.
+    """
+    response = client.get("/apps?target_name=Puzzle Quest")
+    assert check_response(response, 200) and is_json(response)
+    apps = response.json()
+    assert apps[0] == {"id": 6, "name": "Puzzle Quest", "similarity": 100}
+    assert [app["similarity"] for app in apps] == sorted([app["similarity"] for app in apps], reverse=True)
+
+    for limit in range(1, len(apps) + 2):
+        response = client.get(f"/apps?target_name=Puzzle Quest&limit={limit}")
+        assert response.json() == apps[:limit]
+
+def test_apps_autocomplete():
+    """
+    Test the GET "/apps/autocomplete" endpoint for the apps with a name or word that starts with the typed text.
+    """
+    response = client.get("/apps/autocomplete?q=puz")
+    assert check_response(response, 200) and is_json(response)
+    assert [app["name"] for app in response.json()] == ["Puzzle Quest"]
+    assert set(response.json()[0]) == {"id", "name", "header_image"}
+
+    response = client.get("/apps/autocomplete?q=pro&limit=1")
+    assert [app["name"] for app in response.json()] == ["Task Master Pro"]
+
+    assert client.get("/apps/autocomplete?q=xyzxyz").json() == []
+    assert check_response(client.get("/apps/autocomplete?q=a&limit=0"), 422)
+
 def test_cats():
     """
     Test the GET endpoints for valid categories, tags, and genres.
@@ -221,3 +280,110 @@ def test_developers():
     # Test if the response contains a list of developers with the expected fields
     assert all(key in response.json()[0] for key in ["name", "apps"])
     assert all(key in response.json()[0]["apps"][0] for key in ["id", "name"])
+
+
+def test_recommendations_multiple_games():
+    """
+    Test the GET "/recommendations" endpoint with multiple games, by id and by (misspelled) name.
+    """
+    response = client.get("/recommendations?games=12,pzzl qqwetst&combined=true")
+    assert check_response(response, 200) and is_json(response)
+
+    result = response.json()
+    assert [app["name"] for app in result["selected_games"]] == ["Expense Manager", "Puzzle Quest"]
+    assert [app["name"] for app in result["all_apps"]["Expense Manager"]] == ["Task Master Pro", "Daily Planner"]
+    assert all(app["similarity_score"] == 100 for app in result["all_apps"]["Puzzle Quest"])
+
+    # The combined recommendations never contain the selected games themselves
+    assert result["combined"]
+    assert all(app["id"] not in [12, 6] for app in result["combined"])
+    assert all(app["similarity_score"] == 50 for app in result["combined"])
+
+    response = client.get("/recommendations?games=12,0")
+    assert check_response(response, 404)
+    assert response.json()["detail"] == "Game 0 not found."
+
+
+def test_recommendations_weighted():
+    """
+    Test the GET "/recommendations" endpoint with the IDF weighted score on tags, genres and categories.
+    """
+    response = client.get("/recommendations?games=12&weighted=true&amount=3")
+    assert check_response(response, 200) and is_json(response)
+
+    apps = response.json()["all_apps"]["Expense Manager"]
+    assert 0 < len(apps) <= 3
+    assert all(0 < app["similarity_score"] <= 100 for app in apps)
+    assert [app["similarity_score"] for app in apps] == sorted([app["similarity_score"] for app in apps], reverse=True)
+
+
+def test_recommendations_approximate():
+    """
+    Test the GET "/recommendations" endpoint with the approximate MinHash/LSH mode.
+    Games with exactly the same tags are always found.
+    """
+    exact = client.get("/recommendations?games=12").json()
+    response = client.get("/recommendations?games=12&approximate=true")
+    assert check_response(response, 200) and is_json(response)
+    assert response.json()["all_apps"] == exact["all_apps"]
+
+
+def test_recommendations_cache_metrics():
+    """
+    Test if repeated recommendations are served from the cache, and the cache counters are in "/metrics".
+    """
+    first = client.get("/recommendations?games=3")
+    second = client.get("/recommendations?games=3")
+    assert first.json() == second.json()
+
+    response = client.get("/metrics")
+    assert 'cache_hits_total{cache="recommendations"}' in response.text
+    assert 'cache_misses_total{cache="recommendations"}' in response.text
+
+
+def test_fuzzy_cache_metrics():
+    """
+    Test if a repeated fuzzy name search is served from the fuzzy cache, and its counters are in "/metrics".
+    """
+    first = client.get("/app/similar/Portl")
+    second = client.get("/app/similar/portl ")
+    assert first.json() == second.json()
+
+    response = client.get("/metrics")
+    assert 'cache_hits_total{cache="fuzzy"}' in response.text
+    assert 'cache_misses_total{cache="fuzzy"}' in response.text
+
+
+def test_executor_metrics():
+    """
+    Test if the endpoints run in the db and cpu executors, and their queue depth is in "/metrics".
+    """
+    assert check_response(client.get("/tags"), 200)
+    assert check_response(client.get("/app/similar/Portl"), 200)
+
+    response = client.get("/metrics")
+    for executor in ["db", "cpu"]:
+        assert f'executor_queue_depth{{executor="{executor}"}} 0.0' in response.text
+        assert f'executor_wait_seconds_count{{executor="{executor}"}}' in response.text
+
+
+def test_recommendations_stream():
+    """
+    Test the streaming (NDJSON) version of the GET "/recommendations" endpoint, one JSON line per selected game.
+    """
+    import json
+
+    expected = client.get("/recommendations?games=12,1").json()
+
+    for response in [client.get("/recommendations?games=12,1&stream=true"),
+                     client.get("/recommendations?games=12,1", headers={"Accept": "application/x-ndjson"})]:
+        assert check_response(response, 200)
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["name"] for line in lines] == ["Expense Manager", "Space Adventure Game"]
+        assert all(line["apps"] == expected["all_apps"][line["name"]] for line in lines)
+        assert [line["selected_game"] for line in lines] == expected["selected_games"]
+
+    response = client.get("/recommendations?games=12&stream=true&combined=true")
+    assert "combined" in json.loads(response.text.splitlines()[-1])
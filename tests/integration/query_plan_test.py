@@ -0,0 +1,46 @@
+from tests.integration.integration_helpers import *
+from tests.benchmark.query_plans import endpoint_query_plans, invalidation_query_plans, full_scans, unused_indexes, declared_indexes
+from src.database.database import Engine
+from src.database.migrations import DROPPED_INDEXES, migrate
+
+# Full table scans that can't use an index: the random background image of the homepage and the LIKE '%...%' search
+ALLOWED_SCANS = {("/", "apps"), ("/apps?like=puzzle", "apps")}
+# The reverse lookups of the apps of a genre or category, kept until plans on the full catalog show they are unused
+KEPT_INDEXES = {"ix_app_genres_genre_id", "ix_app_categories_category_id"}
+plans = endpoint_query_plans(client, Engine) + invalidation_query_plans(Engine)
+
+
+def test_no_unexpected_full_table_scans():
+    """Every full table scan reads a whole table on purpose (a query without WHERE), or is in ALLOWED_SCANS."""
+    assert plans
+    for plan in plans:
+        for table in full_scans(plan.details):
+            if " WHERE " in " ".join(plan.statement.split()).upper():
+                assert (plan.endpoint, table) in ALLOWED_SCANS, f"{plan.endpoint} scans {table}: {plan.statement}"
+
+
+def test_invalidation_uses_index():
+    """The stale similarities are found on every change of the tags, that may not read the whole table."""
+    invalidation_plans = [plan for plan in plans if plan.endpoint == "affected_app_ids"]
+    assert invalidation_plans
+    for plan in invalidation_plans:
+        assert not full_scans(plan.details), f"{plan.statement}: {plan.details}"
+
+
+def test_no_unused_indexes():
+    assert set(unused_indexes(Engine, plans)) <= KEPT_INDEXES
+    assert KEPT_INDEXES <= set(declared_indexes(Engine))
+
+
+def test_migrate_drops_indexes():
+    with Engine.begin() as connection:
+        connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_apps_price ON apps (price)")
+    assert "ix_apps_price" in declared_indexes(Engine)
+
+    with Engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_app_genres_genre_id")  # Dropped by an earlier version of migrate
+
+    migrate(Engine)
+    migrate(Engine)  # Again, nothing to drop
+    assert not set(DROPPED_INDEXES) & set(declared_indexes(Engine))
+    assert "ix_app_genres_genre_id" in declared_indexes(Engine)
@@ -0,0 +1,85 @@
+import random
+import string
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+from src.algoritmes.bktree import BKTree, get_developer_tree, get_tag_tree
+from src.algoritmes.fuzzy import levenshtein_distance, _most_similar
+
+
+class MockData:
+    def __init__(self, name):
+        self.name = name
+
+
+def random_names(amount, seed=0):
+    rng = random.Random(seed)
+    words = ["valve", "games", "studio", "interactive", "software", "entertainment", "team", "digital", "red", "bit"]
+    names = []
+    for _ in range(amount):
+        if rng.random() < 0.5:
+            names.append(" ".join(rng.choice(words).capitalize() for _ in range(rng.randint(1, 3))))
+        else:
+            names.append("".join(rng.choice(string.ascii_lowercase + " ") for _ in range(rng.randint(1, 15))).strip() or "x")
+    return names
+
+
+def test_search_same_as_brute_force():
+    names = random_names(300)
+    tree = BKTree([MockData(name) for name in names], "name")
+
+    for query in ["valve", "Red Bit Studio", "gmaes", "zzzzzzzzzzzz", "a"]:
+        for max_distance in (0, 1, 3, 6):
+            expected = sorted((levenshtein_distance(query.lower(), name.lower()), i) for i, name in enumerate(names)
+                              if levenshtein_distance(query.lower(), name.lower()) <= max_distance)
+            assert sorted(tree.search(query, max_distance)) == expected
+
+
+def test_nearest_distance():
+    names = random_names(300, seed=1)
+    tree = BKTree([MockData(name) for name in names], "name")
+
+    for query in ["valve", "Digital Team", "qqqq"]:
+        assert tree.nearest_distance(query) == min(levenshtein_distance(query.lower(), name.lower()) for name in names)
+
+    assert BKTree([], "name").nearest_distance("valve") is None
+
+
+def test_most_similar_same_as_most_similar():
+    items = [MockData(name) for name in random_names(400, seed=2)]
+    tree = BKTree(items, "name")
+
+    queries = ["valve", "Vaalv", "red studio", "Studio Red", "digitl entertainment", "q", "", "zzzzzzzzzzzzzzzzzzzz",
+               "Games Valve Bit Team Red"] + random_names(50, seed=3)
+    for query in queries:
+        assert tree.most_similar(query) == _most_similar(query, items, "name")
+
+
+def test_most_similar_without_names():
+    tree = BKTree([MockData(None), MockData("")], "name")
+    assert len(tree) == 0
+    assert tree.most_similar("valve") == (None, None)
+
+
+def test_trees_rebuilt_after_table_changes():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([models.App(id=1, name="Portal", developer="Valve"), models.Tags(id=1, name="Puzzle")])
+
+    with patch("src.algoritmes.bktree._trees", {}):
+        db.commit()
+        developer_tree, tag_tree = get_developer_tree(db), get_tag_tree(db)
+        assert get_developer_tree(db) is developer_tree
+
+        db.add(models.App(id=2, name="Celeste", developer="Maddy Makes Games"))
+        db.commit()
+
+        assert get_developer_tree(db) is not developer_tree
+        assert get_developer_tree(db).most_similar("maddy makes")[0].developer == "Maddy Makes Games"
+        assert get_tag_tree(db) is tag_tree
+
+    db.close()
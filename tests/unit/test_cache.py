@@ -0,0 +1,83 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from tests.unit.unit_helpers import *
+from prometheus_client import REGISTRY
+import src.database.models as models
+from src.algoritmes.cache import LRUCache
+
+
+def counter(name, cache):
+    return REGISTRY.get_sample_value(f"{name}_total", {"cache": cache}) or 0
+
+
+def test_lru_cache_hits_and_misses():
+    cache = LRUCache("test_hits", maxsize=2)
+
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    assert counter("cache_hits", "test_hits") == 1
+    assert counter("cache_misses", "test_hits") == 1
+
+
+def test_lru_cache_get_or_set():
+    cache = LRUCache("test_get_or_set")
+    calculate = MagicMock(return_value=(None, None))
+
+    assert cache.get_or_set("a", calculate) == (None, None)
+    assert cache.get_or_set("a", calculate) == (None, None)
+    calculate.assert_called_once()
+    assert counter("cache_hits", "test_get_or_set") == 1
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache("test_evictions", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+    assert counter("cache_evictions", "test_evictions") == 1
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache("test_ttl", ttl=10)
+
+    with patch("time.monotonic", return_value=100):
+        cache.set("a", 1)
+    with patch("time.monotonic", return_value=105):
+        assert cache.get("a") == 1
+    with patch("time.monotonic", return_value=111):
+        assert cache.get("a") is None
+
+    assert counter("cache_evictions", "test_ttl") == 1
+
+
+def test_lru_cache_ignores_values_from_before_clear():
+    cache = LRUCache("test_generation")
+    generation = cache.generation
+    cache.clear()
+    cache.set("a", 1, generation)
+
+    assert cache.get("a") is None
+
+
+def test_lru_cache_cleared_after_commit():
+    cache = LRUCache("test_tables", tables=["genres"])
+    cache.set("a", 1)
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.Genre(id=1, name="Action"))
+    session.flush()
+    assert cache.get("a") == 1  # Not committed yet
+
+    session.commit()
+    assert cache.get("a") is None
+    session.close()
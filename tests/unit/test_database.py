@@ -1,6 +1,15 @@
 from tests.unit.unit_helpers import *
+import os
 import sys
-from src.database.database import Engine, SessionLocal, get_db
+import tempfile
+import threading
+
+import sqlalchemy
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+from src.database.database import Engine, SessionLocal, get_db, make_engine, is_memory_sqlite
 
 
 class TestDatabaseConnection(unittest.TestCase):
@@ -56,3 +65,65 @@ class TestGetDbFunction(unittest.TestCase):
         # Zorg ervoor dat het session-object wordt gesloten na gebruik
         db = next(get_db())
         db.close.assert_called_once()
+
+
+class TestMakeEngine(unittest.TestCase):
+
+    def sample(self, name):
+        return REGISTRY.get_sample_value(name) or 0
+
+    def test_memory_sqlite_shares_one_connection(self):
+        engine = make_engine("sqlite:///:memory:")
+        self.assertIsInstance(engine.pool, StaticPool)
+
+        with engine.begin() as connection:
+            connection.execute(text("CREATE TABLE numbers (number INTEGER)"))
+            connection.execute(text("INSERT INTO numbers VALUES (1)"))
+
+        # Another thread sees the same in-memory database
+        numbers = []
+
+        def select_numbers():
+            with engine.connect() as connection:
+                numbers.extend(connection.execute(text("SELECT number FROM numbers")).scalars())
+
+        thread = threading.Thread(target=select_numbers)
+        thread.start()
+        thread.join()
+        self.assertEqual(numbers, [1])
+
+    def test_memory_sqlite_ignores_other_pool_class(self):
+        with patch("src.config.DB_POOL_CLASS", "queue"), patch("builtins.print"):
+            self.assertIsInstance(make_engine("sqlite://").pool, StaticPool)
+        self.assertTrue(is_memory_sqlite("sqlite:///file:games?mode=memory&uri=true"))
+        self.assertFalse(is_memory_sqlite("sqlite:///games.db"))
+
+    def test_queue_pool_settings_and_metrics(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch("src.config.DB_POOL_SIZE", 2), patch("src.config.DB_MAX_OVERFLOW", 1), \
+                patch("src.config.DB_POOL_TIMEOUT", 0.1), patch("src.config.DB_POOL_RECYCLE", 60):
+            engine = make_engine(f"sqlite:///{os.path.join(directory, 'games.db')}")
+            self.assertIsInstance(engine.pool, QueuePool)
+            self.assertEqual((engine.pool.size(), engine.pool._max_overflow, engine.pool._recycle), (2, 1, 60))
+
+            checked_out = self.sample("db_pool_checked_out")
+            connects = self.sample("db_pool_connect_seconds_count")
+
+            connections = [engine.connect() for _ in range(3)]
+            self.assertEqual(self.sample("db_pool_checked_out"), checked_out + 3)
+            self.assertEqual(self.sample("db_pool_overflow"), 1)
+            with self.assertRaises(sqlalchemy.exc.TimeoutError):
+                engine.connect()
+            self.assertEqual(self.sample("db_pool_connect_seconds_count"), connects + 3)
+
+            for connection in connections:
+                connection.close()
+            self.assertEqual(self.sample("db_pool_checked_out"), checked_out)
+            engine.dispose()
+
+    def test_null_pool(self):
+        with tempfile.TemporaryDirectory() as directory, patch("src.config.DB_POOL_CLASS", "null"):
+            engine = make_engine(f"sqlite:///{os.path.join(directory, 'games.db')}")
+            self.assertIsInstance(engine.pool, NullPool)
+            with engine.connect() as connection:
+                self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import threading
+
+from prometheus_client import REGISTRY
+from starlette.responses import PlainTextResponse
+
+from tests.unit.unit_helpers import *
+from src.executors import BoundedExecutor, get_async_db, run_in
+
+
+def sample(name, executor):
+    return REGISTRY.get_sample_value(name, {"executor": executor}) or 0
+
+
+def test_run():
+    executor = BoundedExecutor("test_run", 2)
+
+    async def main():
+        assert await executor.run(sum, [1, 2, 3]) == 6
+        assert await executor.run(int, "7", base=8) == 7
+        with pytest.raises(ValueError):
+            await executor.run(int, "x")
+
+    asyncio.run(main())
+    assert sample("executor_wait_seconds_count", "test_run") == 3
+
+
+def test_queue_depth_and_active_tasks():
+    executor = BoundedExecutor("test_queue", 1)
+    release = threading.Event()
+
+    async def main():
+        tasks = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert sample("executor_active", "test_queue") == 1
+        assert sample("executor_queue_depth", "test_queue") == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert sample("executor_active", "test_queue") == 0
+        assert sample("executor_queue_depth", "test_queue") == 0
+
+    asyncio.run(main())
+
+
+def test_busy_executor_does_not_block_other_executor():
+    slow_executor, fast_executor = BoundedExecutor("test_slow", 1), BoundedExecutor("test_fast", 1)
+    release = threading.Event()
+
+    async def main():
+        slow_tasks = [asyncio.ensure_future(slow_executor.run(release.wait, 5)) for _ in range(3)]
+        assert await asyncio.wait_for(fast_executor.run(lambda: "fast"), 1) == "fast"
+        release.set()
+        await asyncio.gather(*slow_tasks)
+
+    asyncio.run(main())
+
+
+def test_iterate():
+    executor = BoundedExecutor("test_iterate", 1)
+    closed = []
+
+    def generator():
+        try:
+            yield from range(5)
+        finally:
+            closed.append(True)
+
+    async def main():
+        items = []
+        async for item in executor.iterate(generator()):
+            items.append(item)
+            if item == 2:
+                break
+        return items
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert closed == [True]
+
+
+def test_run_in():
+    executor = BoundedExecutor("test_run_in", 1)
+    threads = []
+
+    def endpoint(name: str, amount: int = 1):
+        """Docstring of the endpoint."""
+        threads.append(threading.current_thread().name)
+        return {"name": name, "amounts": {amount}}
+
+    async_endpoint = run_in(executor)(endpoint)
+    assert inspect.iscoroutinefunction(async_endpoint)
+    assert inspect.signature(async_endpoint) == inspect.signature(endpoint)
+    assert async_endpoint.__doc__ == endpoint.__doc__ and async_endpoint.__wrapped__ is endpoint
+
+    # The result is converted to JSON data (the set to a list) in the executor
+    assert asyncio.run(async_endpoint("portal", amount=2)) == {"name": "portal", "amounts": [2]}
+    assert threads[0].startswith("test_run_in-executor")
+
+    response = PlainTextResponse("text")
+    assert asyncio.run(run_in(executor)(lambda: response)()) is response
+
+
+def test_get_async_db_session_close():
+    async def use_session():
+        dependency = get_async_db()
+        db = await dependency.__anext__()
+        db.close.assert_not_called()
+        with pytest.raises(StopAsyncIteration):
+            await dependency.__anext__()
+        return db
+
+    with patch("src.executors.SessionLocal") as mock_sessionmaker:
+        db = asyncio.run(use_session())
+    assert db == mock_sessionmaker.return_value
+    db.close.assert_called_once()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+import src.config as config
+from src.database.importer import Checkpoint, checkpoint_path
+from src.fetcher import STORE_APP_DETAILS_SOURCE, TokenBucket, fetch_app_details, fetch_into_database, fetch_json, load_apps_list, make_client
+
+
+class SteamStub(BaseHTTPRequestHandler):
+    """Mimics the app details of the store API and GetAppList of the Steam API.
+    The first requests of the apps in `errors` get the status codes in that list."""
+    errors = {}
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests.append(self.path)
+
+        if url.path == "/ISteamApps/GetAppList/v2/":
+            return self.send_json(200, {"applist": {"apps": [{"appid": i, "name": f"App {i}"} for i in range(1, 6)]}})
+        if url.path != "/api/appdetails":
+            return self.send_json(404, {})
+
+        app_id = int(query["appids"][0])
+        if self.errors.get(app_id):
+            return self.send_json(self.errors[app_id].pop(0), {}, {"Retry-After": "0"})
+        if app_id >= 1000:
+            return self.send_json(200, {str(app_id): {"success": False}})
+        return self.send_json(200, {str(app_id): {"success": True, "data": {
+            "steam_appid": app_id, "name": f"App {app_id}", "is_free": True,
+            "genres": [{"id": "1", "description": "Action"}],
+        }}})
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        for header, value in {"Content-Type": "application/json", **(headers or {})}.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    """:return: The base URL of a local stub of the Steam APIs."""
+    SteamStub.errors, SteamStub.requests = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SteamStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with patch("src.config.FETCH_BACKOFF", 0.01):
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def engine():
+    # The apps are written by another thread, with the same connection to the in-memory database
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def test_token_bucket_rate():
+    async def main():
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # The first 2 tokens are a burst, the other 5 come at 50 per second
+    assert 0.08 <= asyncio.run(main()) < 0.5
+
+
+def test_token_bucket_pause():
+    async def main():
+        bucket = TokenBucket(rate=1000, capacity=1)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.1
+
+
+def test_fetch_json_retries(stub):
+    SteamStub.errors = {1: [429, 503], 2: [500] * 10}
+
+    async def main():
+        async with make_client(1) as client:
+            bucket = TokenBucket(rate=1000)
+            url = f"{stub}api/appdetails"
+            return [
+                await fetch_json(client, url, bucket, {"appids": 1}),
+                await fetch_json(client, url, bucket, {"appids": 2}, retries=2),
+                await fetch_json(client, f"{stub}unknown", bucket),
+            ]
+
+    first, second, unknown = asyncio.run(main())
+    assert first["1"]["data"]["name"] == "App 1"
+    assert second is None and unknown is None
+    assert len(SteamStub.requests) == 3 + 3 + 1  # No retries for the 404
+
+
+def test_fetch_app_details_concurrent(stub):
+    SteamStub.errors = {3: [429]}
+
+    async def main():
+        return [item async for item in fetch_app_details(range(1, 21), 4, TokenBucket(rate=1000, capacity=20), f"{stub}api/")]
+
+    results = dict(asyncio.run(main()))
+    assert sorted(results) == list(range(1, 21))
+    assert all(response["data"]["steam_appid"] == app_id for app_id, response in results.items())
+
+
+def test_fetch_into_database(stub, engine, tmp_path):
+    SteamStub.errors = {2: [404]}
+    checkpoint = Checkpoint(str(tmp_path / "added_games_list.txt"))
+
+    result, failed, unavailable = fetch_into_database(engine, [1, 2, 3, 4, 1000], checkpoint, 3,
+                                                      TokenBucket(rate=1000), f"{stub}api/", chunk_size=2)
+    assert failed == [2] and unavailable == [1000]
+    assert (result.read, result.inserted) == (3, 3)
+    # App 1000 is done too, the store has no details of it. App 2 is fetched again the next time
+    assert checkpoint.load() == {1, 3, 4, 1000}
+
+    session = sessionmaker(bind=engine)()
+    assert [name for name, in session.query(models.App.name).order_by(models.App.id)] == ["App 1", "App 3", "App 4"]
+    assert session.query(models.AppGenre).count() == 3
+
+
+def test_load_apps_list(stub, tmp_path):
+    path = str(tmp_path / "cache" / "apps_list.json")
+    assert len(list(load_apps_list(path, stub))) == 5
+    assert len(list(load_apps_list(path, stub))) == 5
+    assert SteamStub.requests == ["/ISteamApps/GetAppList/v2/"]  # The second time from the cache file
+
+
+def test_own_checkpoint():
+    """An import of the names-only apps list doesn't mark the apps as fetched."""
+    assert checkpoint_path(STORE_APP_DETAILS_SOURCE) != checkpoint_path(config.APPS_LIST_CACHE_FILE)
@@ -1,5 +1,9 @@
+import random
+import string
+
 from tests.unit.unit_helpers import *
-from src.algoritmes.fuzzy import levenshtein_distance, jaccard_similarity, similarity_score, _most_similar
+from src.algoritmes.fuzzy import levenshtein_distance, jaccard_similarity, similarity_score, _most_similar, \
+    token_set, token_jaccard_similarity, lowercase_similarity_score, encode_names, batch_similarity_scores
 
 
 class MockData:
@@ -14,8 +18,60 @@ class MockData:
 #     return text, appid, apps
 
 
+def reference_levenshtein_distance(input, reference):
+    """The textbook dynamic programming version, to compare the bit-parallel version with."""
+    previous_row = list(range(len(reference) + 1))
+    for i, c1 in enumerate(input):
+        current_row = [i + 1]
+        for j, c2 in enumerate(reference):
+            current_row.append(min(previous_row[j + 1] + 1, current_row[j] + 1, previous_row[j] + (c1 != c2)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def random_strings(amount, seed=0):
+    """Pairs of random strings, from a small alphabet so they share characters, and typo versions of each other."""
+    rng = random.Random(seed)
+    alphabets = ["ab", "abc ", string.ascii_lowercase + " ", "äöü€漢字"]
+
+    for _ in range(amount):
+        alphabet = rng.choice(alphabets)
+        input = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        if rng.random() < 0.5:
+            reference = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        else:
+            reference = list(input)
+            for _ in range(rng.randint(0, 5)):
+                position = rng.randint(0, len(reference))
+                reference[position:position + rng.randint(0, 1)] = rng.choice(alphabet) * rng.randint(0, 1)
+            reference = "".join(reference)
+        yield input, reference
+
+
 def test_levenshtein_distance():
     assert levenshtein_distance('abcd', 'cba') == 3
+    assert levenshtein_distance('', '') == 0
+    assert levenshtein_distance('', 'abc') == 3
+    assert levenshtein_distance('kitten', 'sitting') == 3
+    assert levenshtein_distance('a' * 200, 'a' * 199 + 'b') == 1
+
+
+def test_levenshtein_distance_same_as_dynamic_programming():
+    for input, reference in random_strings(500):
+        expected = reference_levenshtein_distance(input, reference)
+        assert levenshtein_distance(input, reference) == expected
+        assert levenshtein_distance(reference, input) == expected
+
+
+def test_levenshtein_distance_max_distance():
+    assert levenshtein_distance('hollow knight', 'hollow knigth', max_distance=2) == 2
+    assert levenshtein_distance('hollow knight', 'portal', max_distance=2) == 3
+    assert levenshtein_distance('a', 'abcdefgh', max_distance=3) == 4
+
+    for input, reference in random_strings(500, seed=1):
+        expected = reference_levenshtein_distance(input, reference)
+        for max_distance in (0, 1, 3, 10, 40):
+            assert levenshtein_distance(input, reference, max_distance) == min(expected, max_distance + 1)
 
 
 def test_jaccard_similarity():
@@ -23,6 +79,68 @@ def test_jaccard_similarity():
     assert jaccard_similarity('hello world', 'goodbye planet') == 0
 
 
+def test_token_jaccard_similarity():
+    assert token_set(' Hello  World hello') == {'hello', 'world'}
+    for input, reference in [('hello world', 'Hello World'), ('a b c', 'b c d'), ('', ''), ('Puzzle Quest', 'quest')]:
+        assert token_jaccard_similarity(token_set(input), token_set(reference)) == jaccard_similarity(input, reference)
+
+
+def test_lowercase_similarity_score():
+    assert lowercase_similarity_score('', '') == 100
+    assert lowercase_similarity_score('kitten', 'sitting') == similarity_score('Kitten', 'SITTING')
+
+
+def test_lowercase_similarity_score_minimum():
+    for input, reference in random_strings(300, seed=2):
+        expected = lowercase_similarity_score(input, reference)
+        for minimum in (0, 25, 60, 100 / 3, 99.5, 100):
+            result = lowercase_similarity_score(input, reference, minimum)
+            assert result == (expected if expected >= minimum else 0)
+
+
+def test__most_similar_same_as_without_pruning():
+    rng = random.Random(4)
+    words = ['space', 'adventure', 'puzzle', 'quest', 'pro', 'master', 'task']
+    items = [MockData(' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))) for _ in range(200)]
+
+    for target_name in ['pzzl qqwetst', 'space', 'Task Master Pro', 'quest puzzle', 'x', '']:
+        target = target_name.strip().lower()
+        scores = [max(similarity_score(target, item.name), jaccard_similarity(target, item.name)) for item in items]
+        best = max(range(len(items)), key=lambda i: (scores[i], -i))
+        expected = (items[best], round(scores[best], 2)) if scores[best] > 0 else (None, None)
+        with patch('src.algoritmes.fuzzy.BATCH_THRESHOLD', 10 ** 9):
+            assert _most_similar(target_name, items, 'name') == expected
+
+
+def test_batch_similarity_scores_same_as_similarity_score():
+    pairs = list(random_strings(300, seed=5)) + [('', ''), ('İstanbul', 'istanbul'), ('ABC', 'abc')]
+    names = [reference for _, reference in pairs]
+    codes, lengths = encode_names(names)
+
+    for input in ['', 'a', 'Hollow Knight', 'äöü 漢字'] + [input for input, _ in pairs[:20]]:
+        expected = [similarity_score(input, name) for name in names]
+        assert batch_similarity_scores(input, codes, lengths).tolist() == expected
+
+    with patch('src.algoritmes.fuzzy.BATCH_CHUNK_SIZE', 7):
+        assert batch_similarity_scores('abc', codes, lengths).tolist() == [similarity_score('abc', name) for name in names]
+
+
+def test__most_similar_batch_same_as_loop():
+    rng = random.Random(7)
+    words = ['space', 'adventure', 'puzzle', 'quest', 'pro', 'master', 'task']
+    items = [MockData(' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))) for _ in range(500)]
+
+    for target_name in ['pzzl qqwetst', 'space', 'Task Master Pro', 'quest puzzle', 'x', '', 'zzzzzzzzzz']:
+        with patch('src.algoritmes.fuzzy.BATCH_THRESHOLD', 10 ** 9):
+            expected = _most_similar(target_name, items, 'name')
+        # 500 items is above the default threshold
+        with patch('src.algoritmes.fuzzy.batch_similarity_scores', wraps=batch_similarity_scores) as mock_batch:
+            assert _most_similar(target_name, items, 'name') == expected
+        mock_batch.assert_called_once()
+
+    assert _most_similar('space', [], 'name') == (None, None)
+
+
 def test_similarity_score():
     with patch('src.algoritmes.fuzzy.levenshtein_distance', MagicMock(return_value=0)):
         assert similarity_score('hello world', 'Hello World') == 100
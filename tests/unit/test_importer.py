@@ -0,0 +1,151 @@
+import json
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+from src.database.events import table_version
+from src.database.importer import Checkpoint, checkpoint_path, import_apps, parse_entry, read_entries
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def apps_list(*names):
+    """An apps list like GetAppList, the app ids are 1, 2, 3..."""
+    return [{"appid": app_id, "name": name} for app_id, name in enumerate(names, 1)]
+
+
+def app_details(app_id, name, genres=(), price="$9.99"):
+    return {"success": True, "data": {
+        "steam_appid": app_id, "name": name, "short_description": f"About {name}", "is_free": price is None,
+        "price_overview": {"final_formatted": price}, "developers": ["Studio A", "Studio B"],
+        "header_image": f"http://example.com/{app_id}.jpg", "background": None,
+        "genres": [{"id": str(genre_id), "description": f"Genre {genre_id}"} for genre_id in genres],
+    }}
+
+
+def app_names(engine):
+    return dict(sessionmaker(bind=engine)().query(models.App.id, models.App.name).all())
+
+
+def count_writes(engine):
+    """:return: List that gets the INSERT, UPDATE and DELETE statements executed on the engine."""
+    writes = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if statement.split()[0] in ("INSERT", "UPDATE", "DELETE"):
+            writes.append(statement)
+
+    return writes
+
+
+def test_read_entries(tmp_path):
+    path = tmp_path / "apps_list.json"
+    path.write_text(json.dumps({"applist": {"apps": apps_list("Portal", "Portal 2")}}))
+    assert [entry["name"] for entry in read_entries(str(path))] == ["Portal", "Portal 2"]
+
+    path = tmp_path / "details.json"
+    path.write_text(json.dumps({"5": app_details(5, "Portal")}))
+    assert [entry["data"]["steam_appid"] for entry in read_entries(str(path))] == [5]
+
+    path = tmp_path / "details.jsonl"
+    path.write_text(json.dumps(app_details(5, "Portal")) + "\n\n" + json.dumps(app_details(6, "Portal 2")) + "\n")
+    assert [entry["data"]["name"] for entry in read_entries(str(path))] == ["Portal", "Portal 2"]
+
+
+def test_parse_entry():
+    assert parse_entry({"appid": 5, "name": "Portal"}) == ({"id": 5, "name": "Portal"}, None, None)
+    assert parse_entry({"appid": 5, "name": ""}) is None
+    assert parse_entry({"success": False}) is None
+
+    app = parse_entry(app_details(5, "Portal", genres=[1, 2], price=None))
+    assert app.row["price"] == "Free" and app.row["developer"] == "Studio A, Studio B"
+    assert app.genres == [(1, "Genre 1"), (2, "Genre 2")] and app.categories == []
+
+
+def test_import_in_chunks(engine):
+    writes = count_writes(engine)
+    result = import_apps(engine, apps_list(*[f"App {i}" for i in range(1, 11)]), chunk_size=4)
+
+    assert result == (10, 0, 10, 0)
+    assert app_names(engine) == {i: f"App {i}" for i in range(1, 11)}
+    assert len(writes) == 3  # One multi-row insert per chunk
+
+
+def test_reimport_only_writes_changes(engine):
+    import_apps(engine, apps_list("Portal", "Portal 2", "Half-Life"))
+    version = table_version(models.App.__tablename__)
+    writes = count_writes(engine)
+
+    result = import_apps(engine, apps_list("Portal", "Portal 2: Reloaded", "Half-Life", "Half-Life 2"))
+    assert result == (4, 0, 1, 1)
+    assert app_names(engine) == {1: "Portal", 2: "Portal 2: Reloaded", 3: "Half-Life", 4: "Half-Life 2"}
+    assert len(writes) == 2
+    assert table_version(models.App.__tablename__) > version
+
+    writes.clear()
+    assert import_apps(engine, apps_list("Portal")) == (1, 0, 0, 0)
+    assert writes == []
+
+
+def test_import_details_links(engine):
+    import_apps(engine, [app_details(1, "Portal", genres=[1, 2]), app_details(2, "Portal 2", genres=[2])])
+    import_apps(engine, [app_details(1, "Portal", genres=[2, 3])])
+
+    session = sessionmaker(bind=engine)()
+    assert session.query(models.Genre.id).order_by(models.Genre.id).all() == [(1,), (2,), (3,)]
+    links = session.query(models.AppGenre.app_id, models.AppGenre.genre_id).order_by("app_id", "genre_id").all()
+    assert links == [(1, 2), (1, 3), (2, 2)]
+    assert session.get(models.App, 1).developer == "Studio A, Studio B"
+
+
+def test_import_mixed_chunk(engine):
+    import_apps(engine, [app_details(1, "Portal"), app_details(2, "Portal 2")])
+    writes = count_writes(engine)
+
+    # Names only and details in the same chunk, the first entry decides nothing about the columns of the others
+    entries = [app_details(3, "Half-Life"), {"appid": 1, "name": "Portal: Still Alive"}, app_details(2, None, price="$4.99"),
+               {"appid": 4, "name": "Half-Life 2"}]
+    assert import_apps(engine, entries) == (4, 0, 2, 2)
+    assert len(writes) == 4  # An insert and an update for the names only, and for the details
+
+    session = sessionmaker(bind=engine)()
+    portal, portal_2, half_life, half_life_2 = (session.get(models.App, app_id) for app_id in range(1, 5))
+    assert portal.name == "Portal: Still Alive" and portal.short_description == "About Portal"
+    assert portal_2.name == "Portal 2" and portal_2.price == "$4.99"  # A missing name doesn't replace the name
+    assert half_life.price == "$9.99" and half_life_2.name == "Half-Life 2" and half_life_2.price is None
+
+
+def test_resume_from_checkpoint(engine, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "cache" / "added_games_list.txt"))
+    entries = apps_list(*[f"App {i}" for i in range(1, 8)])
+
+    def interrupted():
+        for entry in entries:
+            if entry["appid"] == 6:
+                raise KeyboardInterrupt
+            yield entry
+
+    with pytest.raises(KeyboardInterrupt):
+        import_apps(engine, interrupted(), checkpoint, chunk_size=2)
+    assert checkpoint.load() == {1, 2, 3, 4}  # App 5 was in the chunk that wasn't written
+
+    assert import_apps(engine, entries, checkpoint, chunk_size=2) == (7, 4, 3, 0)
+    assert app_names(engine) == {i: f"App {i}" for i in range(1, 8)}
+
+    os.utime(checkpoint.path, (0, 0))  # Expired
+    assert checkpoint.load() == set()
+
+
+def test_checkpoint_per_source():
+    with patch("src.config.ADDED_GAMES_LIST_CACHE_FILE", "cache/added_games_list.txt"):
+        assert checkpoint_path("cache/apps_list.json") == "cache/added_games_list.apps_list.txt"
+        assert checkpoint_path("dumps/app_details.jsonl") == "cache/added_games_list.app_details.txt"
@@ -0,0 +1,207 @@
+from sqlalchemy import create_engine
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+from src.algoritmes.fuzzy import _most_similar, similarity_score, jaccard_similarity, token_set, batch_most_similar
+from src.algoritmes.cache import LRUCache
+from src.algoritmes.ngram import TrigramIndex, NamedApp, trigrams, get_name_index, find_most_similar_app, _on_apps_changed
+
+NAMES = ["Space Adventure Game", "Task Master Pro", "Puzzle Quest", "Daily Planner", "Racing Champions", "Portal 2"]
+APPS = [(app_id, name, f"{app_id}.jpg") for app_id, name in enumerate(NAMES, start=1)]
+
+
+@pytest.fixture
+def db():
+    """An in-memory database with a few apps, and an empty name index."""
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([models.App(id=app_id, name=name) for app_id, name in enumerate(NAMES, start=1)])
+
+    with patch("src.algoritmes.ngram._name_index", None), patch("src.algoritmes.ngram._changed_app_ids", set()):
+        session.commit()
+        yield session
+
+    session.close()
+
+
+def test_trigrams():
+    assert trigrams("Abc") == {"  a", " ab", "abc", "bc "}
+    assert trigrams(" ab ") == {"  a", " ab", "ab "}
+
+
+def test_candidates():
+    index = TrigramIndex(APPS)
+
+    assert [app.name for app in index.candidates("pzzl qqwetst", limit=1)] == ["Puzzle Quest"]
+    assert [app.id for app in index.candidates("game", limit=1)] == [1]
+    assert index.candidates("xyz") == []
+
+    # Sorted on id, like the rows from the database
+    candidates = index.candidates("pro planner", limit=3)
+    assert [app.id for app in candidates] == sorted(app.id for app in candidates)
+
+
+def test_candidates_find_the_most_similar_app():
+    index = TrigramIndex(APPS)
+    all_apps = [NamedApp(*app) for app in APPS]
+
+    for query in ["sp8ce @tventurefe gm", "Tks mSt Pr", "delli plainer", "racing", "portal"]:
+        assert _most_similar(query, index.candidates(query, limit=2), "name") == _most_similar(query, all_apps, "name")
+        assert index.most_similar(query) == _most_similar(query, all_apps, "name")
+
+
+def test_most_similar_batch_above_the_threshold():
+    index = TrigramIndex(APPS)
+
+    for query in ["sp8ce @tventurefe gm", "Tks mSt Pr", "delli plainer", "racing", "xyz"]:
+        expected = index.most_similar(query)
+        with patch("src.algoritmes.ngram.BATCH_THRESHOLD", 2), \
+                patch("src.algoritmes.ngram.batch_most_similar", wraps=batch_most_similar) as mock_batch:
+            assert index.most_similar(query) == expected
+        assert mock_batch.called == bool(index.candidates(query)[1:])
+
+
+def test_most_similar_exact_match():
+    index = TrigramIndex(APPS + [(7, "Quest Puzzle", None), (8, " puzzle  QUEST", None)])
+
+    with patch.object(TrigramIndex, "candidates", side_effect=AssertionError("no exact match")):
+        assert index.most_similar("  Puzzle Quest ") == (index.apps[3], 100)
+        assert index.most_similar("quest puzzle") == (index.apps[3], 100)
+
+    assert index.most_similar("") == (None, None)
+    assert index.most_similar("zzz") == (None, None)
+
+
+def test_levenshtein_and_jaccard_score():
+    index = TrigramIndex(APPS)
+    assert index.levenshtein_score("puzzle", 3) == similarity_score("puzzle", "Puzzle Quest")
+    assert index.levenshtein_score("puzzle", 3, minimum=90) == 0
+    assert index.jaccard_score(token_set("quest puzzle"), 3) == 100
+    assert index.jaccard_score(token_set("puzzle"), 3) == jaccard_similarity("puzzle", "Puzzle Quest")
+
+
+def test_autocomplete():
+    index = TrigramIndex(APPS + [(7, "Portal", None), (8, "Quest  for Glory", None), (9, "The Puzzle Quest", None)])
+
+    assert [app.id for app in index.autocomplete("port")] == [7, 6]  # "portal" before "portal 2"
+    assert [app.id for app in index.autocomplete("PUZZLE")] == [3, 9]  # The name prefix first, then the word prefix
+    assert [app.id for app in index.autocomplete("quest f")] == [8]
+    assert [app.id for app in index.autocomplete("quest")] == [8, 3, 9]
+    assert [app.id for app in index.autocomplete("quest", limit=2)] == [8, 3]
+    assert index.autocomplete("  ") == []
+    assert index.autocomplete("zzz") == []
+
+
+def test_autocomplete_after_changes():
+    index = TrigramIndex(APPS)
+    index.add(7, "Puzzle Pirates")
+    index.add(3, "Crossword Puzzle")
+    index.remove(6)
+
+    assert [app.id for app in index.autocomplete("puzzle")] == [7, 3]
+    assert index.autocomplete("portal") == []
+    assert list(index.sorted_names) == sorted(index.sorted_names)
+    assert len(index.sorted_names) == len(index)
+
+
+def test_add_and_remove():
+    index = TrigramIndex([(1, "Puzzle Quest", None)])
+    index.add(1, "Portal")
+    index.add(2, "Puzzle Quest")
+
+    assert len(index) == 2
+    assert [app.id for app in index.candidates("portal", limit=1)] == [1]
+
+    index.remove(2)
+    index.remove(3)
+    assert [app.id for app in index.candidates("puzzle")] == [1]
+    assert "zzl" not in index.postings
+    assert frozenset({"puzzle", "quest"}) not in index.exact
+
+
+def test_copy_does_not_change_the_original():
+    index = TrigramIndex(APPS)
+    postings = {trigram: set(app_ids) for trigram, app_ids in index.postings.items()}
+    exact = {tokens: set(app_ids) for tokens, app_ids in index.exact.items()}
+    sorted_names = list(index.sorted_names)
+    apps = dict(index.apps.items())
+
+    changed = index.copy()
+    changed.add(7, "Puzzle Pirates")
+    changed.add(3, "Crossword Puzzle")
+    changed.remove(6)
+    changed.add(8, "Portal 2")
+
+    assert {trigram: set(app_ids) for trigram, app_ids in index.postings.items()} == postings
+    assert {tokens: set(app_ids) for tokens, app_ids in index.exact.items()} == exact
+    assert list(index.sorted_names) == sorted_names and len(index) == len(APPS)
+    assert dict(index.apps.items()) == apps
+    assert [app.id for app in changed.autocomplete("puzzle")] == [7, 3]
+    assert changed.most_similar("portal 2") == (changed.apps[8], 100)
+    assert dict(changed.postings.items()) == dict(TrigramIndex(changed.apps.values()).postings.items())
+
+
+def test_get_name_index_updates_changed_apps(db):
+    index = get_name_index(db)
+    assert len(index) == len(NAMES)
+
+    db.add(models.App(id=7, name="Hollow Knight"))
+    db.query(models.App).filter(models.App.id == 3).first().name = "Puzzle Quest 2"
+    db.delete(db.query(models.App).filter(models.App.id == 6).first())
+    db.commit()
+
+    with patch.object(TrigramIndex, "__init__", side_effect=AssertionError("rebuilt")):
+        new_index = get_name_index(db)
+
+    assert new_index.apps[7].name == "Hollow Knight"
+    assert new_index.apps[3].name == "Puzzle Quest 2"
+    assert 6 not in new_index.apps
+    assert new_index.most_similar("puzzle quest 2") == (new_index.apps[3], 100)
+    assert new_index.version > index.version
+
+    # The old snapshot is not changed, for the searches that still use it
+    assert new_index is not index and len(index) == len(NAMES)
+    assert index.apps[3].name == "Puzzle Quest" and index.most_similar("portal 2") == (index.apps[6], 100)
+    assert 7 not in index.postings.get("hol", ()) and [app.id for app in index.autocomplete("puzzle")] == [3]
+
+
+def test_get_name_index_rebuilds_after_unknown_changes(db):
+    index = get_name_index(db)
+
+    db.query(models.App).filter(models.App.id == 1).update({"name": "Star Adventure"})
+    db.commit()
+
+    new_index = get_name_index(db)
+    assert new_index is not index
+    assert new_index.apps[1].name == "Star Adventure"
+
+
+def test_find_most_similar_app_cached_until_the_apps_change(db):
+    with patch("src.algoritmes.ngram.fuzzy_cache", LRUCache("test_fuzzy")), \
+            patch.object(TrigramIndex, "most_similar", autospec=True, side_effect=TrigramIndex.most_similar) as mock_most_similar:
+        assert find_most_similar_app(db, "puzle quest")[0].id == 3
+        assert find_most_similar_app(db, " Puzle Quest ")[0].id == 3
+        mock_most_similar.assert_called_once()
+
+        db.add(models.App(id=7, name="Puzle Quest"))
+        db.commit()
+
+        assert find_most_similar_app(db, "puzle quest") == (NamedApp(7, "Puzle Quest", None), 100)
+        assert mock_most_similar.call_count == 2
+
+
+def test_find_most_similar_app_not_cached_before_the_changed_apps_arrive(db):
+    """The table version is raised before the subscribers get the changed apps, the cache key uses the snapshot."""
+    with patch("src.algoritmes.ngram.fuzzy_cache", LRUCache("test_fuzzy")):
+        assert find_most_similar_app(db, "portal 3")[0].id == 6
+
+        # Renamed in the database, the changed app arrives later
+        db.execute(text("UPDATE apps SET name = 'Portal 3' WHERE id = 3"))
+        db.commit()
+        assert find_most_similar_app(db, "portal 3")[0].id == 6
+
+        _on_apps_changed({(3,)})
+        assert find_most_similar_app(db, "portal 3") == (NamedApp(3, "Portal 3", None), 100)
@@ -0,0 +1,116 @@
+import random
+import time
+from concurrent.futures import Future
+
+from tests.unit.unit_helpers import *
+import src.algoritmes.parallel as parallel
+from src.algoritmes.fuzzy import _most_similar, token_set
+from src.algoritmes.ngram import TrigramIndex
+from src.algoritmes.parallel import FuzzyProcessPool, parallel_most_similar
+
+WORDS = ["space", "adventure", "puzzle", "quest", "pro", "master", "task", "racing", "champions", "daily"]
+TARGET_NAMES = ["pzzl qqwetst", "Space Adventure", "daily master pro", "racing", "x", ""]
+
+
+@pytest.fixture(scope="module")
+def name_index():
+    rng = random.Random(6)
+    apps = [(app_id, " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 3))), None)
+            for app_id in range(1, 301)]
+    return TrigramIndex(apps, version=1)
+
+
+@pytest.fixture(scope="module")
+def pool(name_index):
+    pool = parallel._start_pool(name_index, 3)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def current_pool(pool):
+    """Make the pool the current pool of the module."""
+    pool.started = time.monotonic()
+    with patch("src.algoritmes.parallel._pool", pool):
+        yield pool
+
+
+def expected_most_similar(name_index, target_name):
+    apps = [name_index.apps[app_id] for app_id in sorted(name_index.apps)]
+    expected_app, expected_score = _most_similar(target_name, apps, "name")
+    return (expected_app.id, expected_score) if expected_app else (None, None)
+
+
+def search(name_index, target_name):
+    target_name = target_name.strip().lower()
+    return parallel_most_similar(name_index, target_name, token_set(target_name), 3)
+
+
+def changed_snapshot(name_index, names):
+    changed = name_index.copy()
+    for app_id, name in names.items():
+        if name is None:
+            changed.remove(app_id)
+        else:
+            changed.add(app_id, name)
+    changed.version = name_index.version + 1
+    return changed
+
+
+def test_pool_same_as_most_similar(name_index, pool):
+    assert len(pool.workers) == 3
+
+    for target_name in TARGET_NAMES:
+        assert pool.most_similar(target_name) == expected_most_similar(name_index, target_name)
+
+
+def test_parallel_most_similar_uses_the_pool_of_the_snapshot(name_index, pool, current_pool):
+    with patch.object(FuzzyProcessPool, "__init__") as mock_init:
+        for target_name in TARGET_NAMES:
+            assert search(name_index, target_name) == expected_most_similar(name_index, target_name)
+    mock_init.assert_not_called()
+
+
+def test_parallel_most_similar_after_changes(name_index, pool, current_pool):
+    changed = changed_snapshot(name_index, {5: "Pzzl Qqwetst", 7: None, 301: "Daily Master Pro Racing"})
+    new_pool = MagicMock(version=changed.version, processes=3, started=time.monotonic())
+    new_pool.submit.return_value = [Future()]
+    new_pool.submit.return_value[0].set_result((5, 100))
+
+    with patch("src.config.FUZZY_POOL_REBUILD_DELAY", 60), \
+            patch("src.algoritmes.parallel._start_pool", return_value=new_pool) as mock_start_pool:
+        # The pool has the old names and was started less than the delay ago, the search has to use the candidates
+        assert search(changed, "pzzl qqwetst") is None
+        mock_start_pool.assert_not_called()
+
+        pool.started -= 60
+        with patch.object(pool, "close") as mock_close:
+            assert search(changed, "pzzl qqwetst") == (5, 100)
+        mock_start_pool.assert_called_once_with(changed, 3)
+        mock_close.assert_called_once()
+        assert parallel._pool is new_pool
+
+        # A search with the old snapshot does not start the old names again
+        assert search(name_index, "pzzl qqwetst") is None
+        mock_start_pool.assert_called_once()
+
+
+def test_most_similar_uses_the_pool_above_the_threshold(name_index, pool, current_pool):
+    with patch("src.config.FUZZY_PROCESSES", 3), patch("src.config.FUZZY_PARALLEL_THRESHOLD", 100), \
+            patch("src.algoritmes.ngram.parallel_most_similar", wraps=parallel_most_similar) as mock_search:
+        assert name_index.most_similar("pzzl qqwetst")[0] == name_index.apps[pool.most_similar("pzzl qqwetst")[0]]
+        mock_search.assert_called_once_with(name_index, "pzzl qqwetst", token_set("pzzl qqwetst"), 3)
+
+        # An exact match does not need the pool
+        name_index.most_similar(name_index.apps[1].name)
+        mock_search.assert_called_once()
+
+    with patch("src.config.FUZZY_PROCESSES", 3), patch("src.algoritmes.ngram.parallel_most_similar") as mock_search:
+        name_index.most_similar("pzzl qqwetst")
+        mock_search.assert_not_called()
+
+    # Without a pool for the snapshot, the candidates are scored like without worker processes
+    with patch("src.config.FUZZY_PROCESSES", 3), patch("src.config.FUZZY_PARALLEL_THRESHOLD", 100), \
+            patch("src.algoritmes.ngram.parallel_most_similar", return_value=None):
+        with_fallback = name_index.most_similar("pzzl qqwetst")
+    assert with_fallback == name_index.most_similar("pzzl qqwetst")
@@ -0,0 +1,62 @@
+import random
+
+from tests.unit.unit_helpers import *
+from src.algoritmes.persistent import BlockList, ShardedDict
+
+
+def test_sharded_dict_copy_does_not_change_the_original():
+    original = ShardedDict((key, str(key)) for key in range(1000))
+    changed = original.copy()
+    changed[5] = "five"
+    changed[1000] = "1000"
+    del changed[6]
+    assert changed.pop(7) == "7" and changed.pop(7, None) is None
+
+    assert dict(original.items()) == {key: str(key) for key in range(1000)} and len(original) == 1000
+    assert changed[5] == "five" and 1000 in changed and 6 not in changed and len(changed) == 999
+    assert sorted(changed) == sorted(set(range(1001)) - {6, 7})
+    assert changed.values_of([5, 1000]) == ["five", "1000"]
+    # Only the changed shards are copied
+    assert sum(shard is not original_shard for shard, original_shard in zip(changed._shards, original._shards)) <= 4
+
+    with pytest.raises(KeyError):
+        changed.pop(6)
+
+
+@pytest.mark.parametrize("block_size", [2, 3, 512])
+def test_block_list_same_as_sorted_list(block_size):
+    rng = random.Random(block_size)
+    with patch("src.algoritmes.persistent.BLOCK_SIZE", block_size):
+        items = [rng.randint(0, 100) for _ in range(60)]
+        blocks = BlockList(items)
+        versions = [(blocks, sorted(items))]
+
+        for _ in range(10):
+            blocks, expected = blocks.copy(), list(versions[-1][1])
+            for _ in range(20):
+                value = rng.randint(-5, 105)
+                if rng.random() < 0.5:
+                    blocks.insort(value)
+                    expected.append(value)
+                elif value in expected:
+                    blocks.remove(value)
+                    expected.remove(value)
+                else:
+                    blocks.remove(value)
+            versions.append((blocks, sorted(expected)))
+
+        # Every copy has its own items, the older versions did not change
+        for blocks, expected in versions:
+            assert list(blocks) == expected and len(blocks) == len(expected)
+            for value in (-10, 0, 50, 100, 110):
+                assert list(blocks.iter_from(value)) == [item for item in expected if item >= value]
+
+
+def test_block_list_empty():
+    blocks = BlockList().copy()
+    blocks.remove(1)
+    assert list(blocks.iter_from(1)) == []
+
+    blocks.insort(1)
+    blocks.remove(1)
+    assert list(blocks) == [] and len(blocks) == 0
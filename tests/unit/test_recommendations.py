@@ -0,0 +1,227 @@
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+from src.algoritmes.recommendations import TagIndex, TagMatrix, TagMinHash, FeatureIndex, get_tag_index, similarity_percentage, combined_similar
+from src.database.events import table_version
+
+
+def random_relations(amount_apps=200, amount_tags=30, seed=42):
+    """Make random (app_id, tag_id) relations, every app gets 0 to 8 tags."""
+    rng = random.Random(seed)
+    relations = []
+    for app_id in range(1, amount_apps + 1):
+        for tag_id in rng.sample(range(1, amount_tags + 1), rng.randint(0, 8)):
+            relations.append((app_id, tag_id))
+    return relations
+
+
+def brute_force_similar(relations, app_id, amount):
+    """The original algorithm: compare the selected app with every other app in the catalog."""
+    app_tags = {}
+    for relation_app_id, tag_id in relations:
+        app_tags.setdefault(relation_app_id, set()).add(tag_id)
+
+    selected_tags = app_tags.get(app_id, set())
+    matching = []
+    for other_id in sorted(app_tags):
+        if other_id == app_id or not selected_tags:
+            continue
+        common_tags = selected_tags & app_tags[other_id]
+        score = ((len(common_tags) / len(selected_tags)) * 100).__round__()
+        if score > 0:
+            matching.append((other_id, score))
+
+    matching.sort(key=lambda x: x[1], reverse=True)
+    return matching[:amount]
+
+
+def test_similarity_percentage():
+    assert similarity_percentage(1, 3) == 33
+    assert similarity_percentage(2, 3) == 67
+    assert similarity_percentage(4, 4) == 100
+
+
+def test_tag_index_same_ranking_as_brute_force():
+    relations = random_relations()
+    index = TagIndex(relations)
+
+    for app_id in range(1, 201):
+        tag_ids = [tag_id for relation_app_id, tag_id in relations if relation_app_id == app_id]
+        assert index.similar(tag_ids, 10, exclude=app_id) == brute_force_similar(relations, app_id, 10)
+
+
+def test_tag_matrix_same_score_as_percentage():
+    """The matrix backend must give the same scores as len(common_tags) / total_tags * 100, and the same ranking."""
+    relations = random_relations(amount_apps=300, amount_tags=12, seed=7)
+    matrix = TagMatrix(relations)
+    index = TagIndex(relations)
+
+    for app_id in range(1, 301):
+        tag_ids = [tag_id for relation_app_id, tag_id in relations if relation_app_id == app_id]
+        expected = brute_force_similar(relations, app_id, 300)
+
+        assert matrix.similar(tag_ids, 300, exclude=app_id) == expected
+        assert matrix.similar(tag_ids, 5, exclude=app_id) == expected[:5]
+        assert matrix.similar(tag_ids, 5, exclude=app_id) == index.similar(tag_ids, 5, exclude=app_id)
+        assert matrix.tags_of(app_id) == index.tags_of(app_id)
+
+
+def test_tag_matrix_unknown_tags_and_empty_catalog():
+    matrix = TagMatrix([(1, 1), (2, 1), (3, 5)])
+
+    assert matrix.similar([1, 99], 5, exclude=1) == [(2, 50)]
+    assert matrix.similar([99], 5) == []
+    assert matrix.tags_of(42) == set()
+    assert TagMatrix([]).similar([1], 5) == []
+
+
+def test_tag_index_only_scores_apps_with_common_tags():
+    index = TagIndex([(1, 1), (2, 1), (3, 2), (4, 3)])
+
+    assert index.common_tag_counts([1, 2], exclude=1) == {2: 1, 3: 1}
+    assert index.similar([], 5) == []
+    assert index.similar([1], 0) == []
+
+
+def test_tag_min_hash_scores_candidates_exactly():
+    relations = random_relations(amount_apps=500, amount_tags=20, seed=5)
+    matrix = TagMatrix(relations)
+    min_hash = TagMinHash(relations, bands=32, rows=2)
+
+    for app_id in range(1, 101):
+        tag_ids = matrix.tags_of(app_id)
+        exact_scores = dict(matrix.similar(tag_ids, 500, exclude=app_id))
+        approximate = min_hash.similar(tag_ids, 10, exclude=app_id)
+
+        assert all(exact_scores[similar_app_id] == score for similar_app_id, score in approximate)
+        assert [score for _, score in approximate] == sorted([score for _, score in approximate], reverse=True)
+
+
+def test_tag_min_hash_always_finds_apps_with_the_same_tags():
+    relations = [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3), (3, 4), (4, 1)]
+    min_hash = TagMinHash(relations, bands=4, rows=8)
+
+    assert min_hash.similar([1, 2, 3], 5, exclude=1)[0] == (2, 100)
+    # App 3 has no common tags, so it never shares a bucket
+    assert 3 not in min_hash.app_ids[min_hash.candidates([1, 2, 3])]
+    assert min_hash.similar([99], 5) == []
+    assert TagMinHash([]).similar([1], 5) == []
+
+
+def test_tag_min_hash_common_tag_counts():
+    relations = random_relations(amount_apps=50, amount_tags=10, seed=7)
+    matrix, min_hash = TagMatrix(relations), TagMinHash(relations, bands=4, rows=3)
+
+    # The rows of the bands don't replace the CSR rows of the TagMatrix
+    assert len(min_hash.rows) == len(relations)
+    for tag_ids in [[1], [1, 2, 3], [4, 9]]:
+        assert min_hash.common_tag_counts(tag_ids, exclude=1) == matrix.common_tag_counts(tag_ids, exclude=1)
+
+
+def test_combined_similar():
+    relations = [(1, 1), (1, 2), (2, 3), (3, 1), (3, 3), (4, 2), (5, 4)]
+
+    for index in [TagIndex(relations), TagMatrix(relations), TagMinHash(relations, bands=4, rows=2)]:
+        # App 3 has half of the tags of app 1 and all tags of app 2: (50 + 100) / 2
+        assert combined_similar(index, [[1, 2], [3]], 5, exclude={1, 2}) == [(3, 75), (4, 25)]
+        assert combined_similar(index, [[1, 2], [3]], 1, exclude={1, 2}) == [(3, 75)]
+        assert combined_similar(index, [], 5) == []
+
+
+def random_feature_relations(amount_apps=300, seed=11):
+    """Make random (app_id, feature) relations, with a few very common and many rare features."""
+    rng = random.Random(seed)
+    features = [("tag", 1), ("tag", 2), ("genre", 1)] + [(facet, i) for facet in ["tag", "genre", "category"] for i in range(3, 25)]
+    relations = []
+    for app_id in range(1, amount_apps + 1):
+        app_features = set(rng.sample(features[3:], rng.randint(0, 6)))
+        app_features.update(feature for feature in features[:3] if rng.random() < 0.8)
+        relations.extend((app_id, feature) for feature in app_features)
+    return relations
+
+
+def brute_force_weighted(index, features, amount, exclude):
+    """Score every app with the sum of the weights of the common features, without pruning."""
+    features = sorted(set(features), key=lambda feature: (-index.weights[feature], feature))
+    total_weight = sum(index.weights[feature] for feature in features)
+    scores = []
+    for app_id, app_features in index.app_features.items():
+        score = 0
+        for feature in features:
+            if feature in app_features:
+                score += index.weights[feature]
+        if app_id != exclude and score > 0:
+            scores.append((app_id, score))
+
+    scores.sort(key=lambda x: (-x[1], x[0]))
+    return [(app_id, round(score / total_weight * 100)) for app_id, score in scores[:amount]]
+
+
+def test_feature_index_weights():
+    index = FeatureIndex([(1, ("tag", 1)), (2, ("tag", 1)), (3, ("tag", 1)), (1, ("genre", 1))])
+
+    # A rare feature weighs more than a common feature
+    assert index.weights[("genre", 1)] > index.weights[("tag", 1)] > 0
+    assert index.similar([("tag", 1), ("genre", 1)], 5, exclude=1) == [
+        (2, round(index.weights[("tag", 1)] / (index.weights[("tag", 1)] + index.weights[("genre", 1)]) * 100)),
+        (3, round(index.weights[("tag", 1)] / (index.weights[("tag", 1)] + index.weights[("genre", 1)]) * 100)),
+    ]
+
+
+def test_feature_index_same_ranking_as_brute_force():
+    index = FeatureIndex(random_feature_relations())
+
+    for app_id in range(1, 301):
+        features = index.features_of(app_id)
+        for amount in [1, 5, 20]:
+            assert index.similar(features, amount, exclude=app_id) == brute_force_weighted(index, features, amount, app_id)
+
+
+def test_feature_index_prunes_common_features():
+    """The posting lists of the common features are not scanned when the rare features decide the top."""
+    relations = [(app_id, ("tag", 1)) for app_id in range(1, 1001)] + [(1, ("genre", 7)), (2, ("genre", 7))]
+    index = FeatureIndex(relations)
+
+    with patch.object(index, "postings", wraps=index.postings) as postings:
+        assert index.similar([("tag", 1), ("genre", 7)], 1, exclude=1) == [(2, 100)]
+        postings.get.assert_called_once_with(("genre", 7), ())
+
+
+@patch("src.algoritmes.recommendations._indexes", {})
+def test_get_tag_index_rebuilds_after_commit():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    session.add_all([models.App(id=1, name="A"), models.App(id=2, name="B"), models.Tags(id=1, name="Casual")])
+    session.add_all([models.AppTags(app_id=1, tag_id=1)])
+    version = table_version("app_tags")
+    session.commit()
+
+    assert table_version("app_tags") > version
+    assert get_tag_index(session).similar([1], 5) == [(1, 100)]
+
+    session.add(models.AppTags(app_id=2, tag_id=1))
+    session.commit()
+
+    assert get_tag_index(session).similar([1], 5, exclude=1) == [(2, 100)]
+    assert get_tag_index(session, "matrix").similar([1], 5, exclude=1) == [(2, 100)]
+    session.close()
+
+
+def test_rollback_does_not_change_version():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    version = table_version("genres")
+    session.add(models.Genre(id=1, name="Action"))
+    session.flush()
+    session.rollback()
+
+    assert table_version("genres") == version
+    session.close()
@@ -0,0 +1,142 @@
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from tests.unit.unit_helpers import *
+import src.database.models as models
+import src.database.similarities as similarities
+from src.algoritmes.recommendations import get_tag_index
+from src.database.similarities import build_similarities, stored_similar_apps, affected_app_ids
+
+AMOUNT_APPS = 120
+
+
+@pytest.fixture
+def db():
+    """An in-memory database with random tags for the apps, and empty module caches.
+    The refreshes are only scheduled, run them with run_scheduled_refresh."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    session = session_factory()
+
+    rng = random.Random(3)
+    session.add_all([models.Tags(id=tag_id, name=f"Tag {tag_id}") for tag_id in range(1, 16)])
+    session.add_all([models.App(id=app_id, name=f"App {app_id}") for app_id in range(1, AMOUNT_APPS + 1)])
+    for app_id in range(1, AMOUNT_APPS + 1):
+        for tag_id in rng.sample(range(1, 16), rng.randint(1, 5)):
+            session.add(models.AppTags(app_id=app_id, tag_id=tag_id))
+
+    with patch("src.algoritmes.recommendations._indexes", {}), \
+            patch("src.database.similarities._stale_app_ids", set()), \
+            patch("src.database.similarities._refresh_scheduled", False), \
+            patch("src.database.similarities._refresh_executor"), \
+            patch("src.database.similarities.SessionLocal", session_factory):
+        session.commit()
+        run_scheduled_refresh()
+        yield session
+
+    session.close()
+
+
+def run_scheduled_refresh():
+    """Run the refresh that was submitted to the (mocked) executor, like its thread would."""
+    if similarities._refresh_scheduled:
+        similarities._refresh_executor.submit.reset_mock()
+        similarities._refresh_in_background()
+
+
+def add_tag(db, app_id):
+    """Give the app a tag it does not have yet."""
+    tag_ids = {app_tag.tag_id for app_tag in db.query(models.AppTags).filter(models.AppTags.app_id == app_id)}
+    db.add(models.AppTags(app_id=app_id, tag_id=min(set(range(1, 16)) - tag_ids)))
+    db.commit()
+
+
+def assert_stored_same_as_live(db, amount=10):
+    index = get_tag_index(db)
+    for app_id in range(1, AMOUNT_APPS + 1):
+        live = index.similar(index.tags_of(app_id), amount, exclude=app_id)
+        assert (stored_similar_apps(db, app_id, amount) or []) == live
+
+
+def test_nothing_stored_before_build(db):
+    assert stored_similar_apps(db, 1, 5) is None
+    assert db.query(models.AppSimilarity).count() == 0
+
+
+def test_build_similarities(db):
+    assert build_similarities(db) == AMOUNT_APPS
+    assert_stored_same_as_live(db)
+
+    # More than the precomputed amount is not stored
+    assert stored_similar_apps(db, 1, 11) is None
+
+
+def test_incremental_refresh_after_tag_changes(db):
+    build_similarities(db)
+
+    db.query(models.AppTags).filter(models.AppTags.app_id == 5).delete()
+    db.commit()  # Rows are unknown for a bulk delete, so the table is emptied
+    run_scheduled_refresh()
+    db.expire_all()
+    assert db.query(models.AppSimilarity).count() == 0
+
+    build_similarities(db)
+    for app_tag in db.query(models.AppTags).filter(models.AppTags.app_id == 7).all():
+        db.delete(app_tag)
+    db.add_all([models.AppTags(app_id=7, tag_id=15), models.AppTags(app_id=9, tag_id=14)])
+    db.commit()
+
+    with patch("src.database.similarities.build_similarities", wraps=build_similarities) as mock_build:
+        run_scheduled_refresh()
+        assert_stored_same_as_live(db)
+
+    # Only the affected apps are recomputed, once
+    mock_build.assert_called_once()
+    recomputed = mock_build.call_args.args[1]
+    assert {7, 9} <= recomputed
+    assert len(recomputed) < AMOUNT_APPS
+
+
+def test_affected_app_ids_contains_apps_that_listed_the_changed_app(db):
+    build_similarities(db)
+    listing_app_ids = {row.app_id for row in db.query(models.AppSimilarity).filter(models.AppSimilarity.similar_app_id == 3)}
+
+    assert listing_app_ids | {3} <= affected_app_ids(db, {3})
+
+
+def test_stale_rows_served_until_the_background_refresh(db):
+    build_similarities(db)
+    before = stored_similar_apps(db, 7, 10)
+
+    add_tag(db, 7)
+    add_tag(db, 9)
+
+    # One refresh in the background for both commits, the read does not compute or write anything
+    similarities._refresh_executor.submit.assert_called_once()
+    with patch("src.database.similarities.build_similarities") as mock_build:
+        assert stored_similar_apps(db, 7, 10) == before
+        mock_build.assert_not_called()
+    assert not db.new and not db.dirty
+
+    run_scheduled_refresh()
+    db.expire_all()
+    assert_stored_same_as_live(db)
+
+
+def test_background_refresh_error_is_retried(db):
+    build_similarities(db)
+    add_tag(db, 7)
+
+    with patch("src.database.similarities.build_similarities", side_effect=RuntimeError("locked")):
+        run_scheduled_refresh()
+    assert 7 in similarities._stale_app_ids
+
+    # The next change schedules a refresh for both
+    add_tag(db, 9)
+    run_scheduled_refresh()
+    db.expire_all()
+    assert_stored_same_as_live(db)